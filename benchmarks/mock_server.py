@@ -0,0 +1,295 @@
+"""
+Local stand-in for the Anthropic Messages and OpenAI chat-completions APIs.
+
+Serves both protocols, streaming (SSE) and not, from one port: paths ending in
+/messages get Anthropic responses, paths ending in /chat/completions get
+OpenAI ones. Latency and failures are configurable so benchmarks can model a
+real provider without the network:
+
+    python benchmarks/mock_server.py --port 8765 --first-token-ms 150 --tokens-per-second 80
+
+Point autocmd at it with ANTHROPIC_BASE_URL=http://127.0.0.1:8765 and, for the
+OpenAI-compatible providers, <PROVIDER>_BASE_URL=http://127.0.0.1:8765/v1.
+
+New connections can be delayed by --connect-ms to stand in for the TCP/TLS
+handshake to a remote endpoint. Prompt caching is modelled too: a cacheable prefix (Anthropic system blocks
+marked with cache_control, or OpenAI leading system messages) that has been
+seen before and is at least --min-cache-tokens long is not billed as fresh
+input and skips its share of the simulated prefill time
+(--prefill-ms-per-1k-tokens).
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+DEFAULT_REPLY = "ls -la"
+
+
+@dataclass
+class MockConfig:
+    first_token_ms: float = 100.0
+    tokens_per_second: float = 100.0
+    # Fraction of requests answered with error_status instead of a completion
+    error_rate: float = 0.0
+    error_status: int = 429
+    reply: str = DEFAULT_REPLY
+    seed: Optional[int] = None
+    prefill_ms_per_1k_tokens: float = 0.0
+    min_cache_tokens: int = 0
+    # Simulated TCP/TLS handshake: each new connection waits this long before its first request is read
+    connect_ms: float = 0.0
+    requests: int = field(default=0, init=False)
+    input_tokens: int = field(default=0, init=False)
+    cached_input_tokens: int = field(default=0, init=False)
+
+
+def count_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def _text(content) -> str:
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content or [])
+
+
+def split_prompt(body: dict, anthropic: bool) -> Tuple[str, str]:
+    """Return (cacheable prefix, remaining input) of a request body."""
+    if anthropic:
+        system = body.get("system")
+        blocks = system if isinstance(system, list) else []
+        cacheable = any("cache_control" in block for block in blocks)
+        prefix = _text(blocks) if cacheable else ""
+        rest = ("" if cacheable else _text(system)) + "".join(_text(m["content"]) for m in body.get("messages", []))
+        return prefix, rest
+    messages = body.get("messages", [])
+    leading = 0
+    while leading < len(messages) and messages[leading]["role"] == "system":
+        leading += 1
+    return (
+        "".join(_text(m["content"]) for m in messages[:leading]),
+        "".join(_text(m["content"]) for m in messages[leading:]),
+    )
+
+
+def _tokens(text: str) -> List[str]:
+    """Split a reply into word-sized stream chunks, keeping the spaces."""
+    tokens, start = [], 0
+    for i in range(1, len(text)):
+        if text[i] == " ":
+            tokens.append(text[start:i])
+            start = i
+    tokens.append(text[start:])
+    return tokens
+
+
+def _anthropic_usage(usage: dict) -> dict:
+    # Anthropic reports prefix tokens written to the cache apart from plain input
+    return {"input_tokens": usage["uncached"] - usage["written"], "cache_creation_input_tokens": usage["written"],
+            "cache_read_input_tokens": usage["cached"]}
+
+
+def _openai_usage(usage: dict) -> dict:
+    return {"prompt_tokens": usage["cached"] + usage["uncached"],
+            "prompt_tokens_details": {"cached_tokens": usage["cached"]}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Each SSE event is its own small write; don't let Nagle hold them back
+    disable_nagle_algorithm = True
+    server: "MockServer"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # Starts at accept time, so a client that connects early has it behind it by the first request
+        time.sleep(self.server.config.connect_ms / 1000)
+
+    def do_POST(self):
+        config = self.server.config
+        body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"{}")
+        anthropic = self.path.endswith("/messages")
+        prefix, rest = split_prompt(body, anthropic)
+        prefix_tokens = count_tokens(prefix) if prefix else 0
+        with self.server.lock:
+            config.requests += 1
+            fail = self.server.random.random() < config.error_rate
+            cacheable = prefix_tokens >= max(config.min_cache_tokens, 1)
+            cached = cacheable and prefix in self.server.prefixes
+            if cacheable:
+                self.server.prefixes.add(prefix)
+            usage = {
+                "cached": prefix_tokens if cached else 0,
+                "written": prefix_tokens if cacheable and not cached else 0,
+                "uncached": count_tokens(rest) + (0 if cached else prefix_tokens),
+            }
+            config.input_tokens += usage["uncached"]
+            config.cached_input_tokens += usage["cached"]
+
+        time.sleep((config.first_token_ms + usage["uncached"] * config.prefill_ms_per_1k_tokens / 1000) / 1000)
+        if fail:
+            self._send_error(anthropic)
+        elif body.get("stream"):
+            self._stream(anthropic, body.get("model", "mock"), usage)
+        else:
+            self._complete(anthropic, body.get("model", "mock"), usage)
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, anthropic: bool) -> None:
+        status = self.server.config.error_status
+        kind = "rate_limit_error" if status == 429 else "api_error"
+        if anthropic:
+            payload = {"type": "error", "error": {"type": kind, "message": "injected failure"}}
+        else:
+            payload = {"error": {"type": kind, "message": "injected failure"}}
+        self._send_json(status, payload, {"retry-after": "0"})
+
+    def _complete(self, anthropic: bool, model: str, usage: dict) -> None:
+        config = self.server.config
+        tokens = _tokens(config.reply)
+        time.sleep(max(len(tokens) - 1, 0) / config.tokens_per_second)
+        if anthropic:
+            payload = {
+                "id": "msg_mock", "type": "message", "role": "assistant", "model": model,
+                "content": [{"type": "text", "text": config.reply}],
+                "stop_reason": "end_turn", "stop_sequence": None,
+                "usage": dict(_anthropic_usage(usage), output_tokens=len(tokens)),
+            }
+        else:
+            payload = {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": config.reply},
+                             "finish_reason": "stop"}],
+                "usage": dict(_openai_usage(usage), completion_tokens=len(tokens),
+                              total_tokens=usage["cached"] + usage["uncached"] + len(tokens)),
+            }
+        self._send_json(200, payload)
+
+    def _write_chunk(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _stream(self, anthropic: bool, model: str, usage: dict) -> None:
+        config = self.server.config
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+
+        tokens = _tokens(config.reply)
+        if anthropic:
+            start = {"type": "message_start", "message": {
+                "id": "msg_mock", "type": "message", "role": "assistant", "model": model, "content": [],
+                "stop_reason": None, "stop_sequence": None, "usage": dict(_anthropic_usage(usage), output_tokens=1),
+            }}
+            head = [start, {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}]
+            deltas = [{"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": t}}
+                      for t in tokens]
+            tail = [
+                {"type": "content_block_stop", "index": 0},
+                {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                 "usage": {"output_tokens": len(tokens)}},
+                {"type": "message_stop"},
+            ]
+            encode = lambda event: f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        else:
+            def chunk(delta, finish=None):
+                return {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            head = [chunk({"role": "assistant", "content": ""})]
+            deltas = [chunk({"content": t}) for t in tokens]
+            tail = [dict(chunk({}, "stop"), usage=dict(_openai_usage(usage), completion_tokens=len(tokens)))]
+            encode = lambda event: f"data: {json.dumps(event)}\n\n"
+
+        try:
+            for event in head:
+                self._write_chunk(encode(event))
+            for i, event in enumerate(deltas):
+                if i:
+                    time.sleep(1 / config.tokens_per_second)
+                self._write_chunk(encode(event))
+            for event in tail:
+                self._write_chunk(encode(event))
+            if not anthropic:
+                self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading early, e.g. once it had a complete command
+            self.close_connection = True
+
+
+class MockServer(ThreadingHTTPServer):
+    """Threaded mock API server; use as a context manager to run it in the background."""
+
+    daemon_threads = True
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockConfig()
+        self.lock = threading.Lock()
+        self.random = random.Random(self.config.seed)
+        self.prefixes = set()
+        super().__init__((host, port), _Handler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "MockServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token-ms", type=float, default=100.0)
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--reply", default=DEFAULT_REPLY)
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=0.0)
+    parser.add_argument("--min-cache-tokens", type=int, default=0)
+    parser.add_argument("--connect-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    config = MockConfig(
+        args.first_token_ms, args.tokens_per_second, args.error_rate, args.error_status, args.reply,
+        prefill_ms_per_1k_tokens=args.prefill_ms_per_1k_tokens, min_cache_tokens=args.min_cache_tokens,
+        connect_ms=args.connect_ms,
+    )
+    server = MockServer(config, port=args.port)
+    print(f"Mock provider API on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Offline end-to-end benchmark against the local mock provider API.
+
+Points every built-in provider at benchmarks/mock_server.py, over both the
+SDK and the stdlib transport. It reports:
+
+  cold_start_ms  a full `autocmd` run in a fresh interpreter (median)
+  ttft_ms        time to first streamed token on a warm provider (p50/p95)
+  e2e_ms         time to the complete command on a warm provider (p50/p95)
+  batch          `autocmd --batch` throughput in items per second
+  prompt_cache   TTFT and billed input tokens with the instructions merged into
+                 the request versus sent as a cacheable system prefix, under
+                 the mock's prompt-caching model
+
+With --error-rate above 0 some requests fail by design. Failed runs are left
+out of the timings and counted instead, per measurement and in the overall
+"errors" section.
+
+The results are printed as one JSON object (also written to --output if
+given), tagged with the current commit so runs can be compared:
+
+    python benchmarks/providers.py [--runs N] [--first-token-ms MS] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from autocmd_cli import build_prompt, build_system_prompt  # noqa: E402
+from autocmd_cli.llm_providers import get_provider  # noqa: E402
+from autocmd_cli.registry import BUILTIN_PROVIDERS  # noqa: E402
+from mock_server import MockConfig, MockServer  # noqa: E402
+
+TRANSPORTS = ("sdk", "http")
+PROMPT = "list all files including hidden ones"
+SYSTEM = build_system_prompt("/bin/bash")
+
+# Every request the benchmark makes, and how many of them failed
+outcomes = {"requests": 0, "failed": 0}
+
+
+def tally(requests: int, failed: int) -> None:
+    outcomes["requests"] += requests
+    outcomes["failed"] += failed
+
+
+def count(ok: bool) -> bool:
+    """Record the outcome of one request and return it."""
+    tally(1, not ok)
+    return ok
+
+
+def run_autocmd(code: str, env: dict, cwd: str = None) -> subprocess.CompletedProcess:
+    """Run autocmd in a new interpreter, counting a non-zero exit as a failed request."""
+    result = subprocess.run([sys.executable, "-c", code], env=env, cwd=cwd,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    count(result.returncode == 0)
+    return result
+
+
+def median(samples: list):
+    return round(statistics.median(samples), 1) if samples else None
+
+
+def provider_env(server_url: str) -> dict:
+    """Environment that sends every provider to the mock server with a dummy key."""
+    env = {}
+    for name, spec in BUILTIN_PROVIDERS.items():
+        env[spec.env_var] = "mock-key"
+        path = "" if name == "anthropic" else "/v1"
+        env[spec.base_url_env_var] = server_url + path
+    return env
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {"p50": None, "p95": None}
+    ordered = sorted(samples)
+    p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+    return {"p50": round(statistics.median(ordered), 2), "p95": round(p95, 2)}
+
+
+def cold_start(env: dict, provider: str, transport: str, runs: int) -> dict:
+    """Median wall time of a complete one-shot autocmd run in a new interpreter, and the failed runs."""
+    code = (
+        f"import sys; sys.path.insert(0, {str(ROOT / 'src')!r}); import autocmd_cli; "
+        f"sys.argv = ['autocmd', '--no-cache', {PROMPT!r}]; autocmd_cli.main()"
+    )
+    samples = []
+    errors = 0
+    with tempfile.TemporaryDirectory() as home:
+        config_dir = Path(home) / ".config" / "autocmd"
+        config_dir.mkdir(parents=True)
+        (config_dir / ".shell_setup_done").touch()
+        run_env = dict(env, HOME=home, SHELL="/bin/bash", AUTOCMD_PROVIDER=provider, AUTOCMD_TRANSPORT=transport)
+        for _ in range(runs):
+            start = time.perf_counter()
+            if run_autocmd(code, run_env, cwd=home).returncode == 0:
+                samples.append((time.perf_counter() - start) * 1000)
+            else:
+                errors += 1
+    return {"cold_start_ms": median(samples), "cold_start_errors": errors}
+
+
+def warm_latency(provider_name: str, runs: int) -> dict:
+    """TTFT and end-to-end percentiles over repeated requests on one warm provider, and the failed requests."""
+    ttft, e2e = [], []
+    errors = 0
+    with get_provider(provider_name, api_key="mock-key") as provider:
+        # Warms the connection; not counted
+        time_stream(provider.generate_stream(build_prompt(PROMPT), max_tokens=64, system=SYSTEM))
+        for _ in range(runs):
+            timing = time_stream(provider.generate_stream(build_prompt(PROMPT), max_tokens=64, system=SYSTEM))
+            if count(timing is not None):
+                ttft.append(timing[0])
+                e2e.append(timing[1])
+            else:
+                errors += 1
+    return {"ttft_ms": percentiles(ttft), "e2e_ms": percentiles(e2e), "errors": errors}
+
+
+def time_stream(stream) -> tuple:
+    """Drain a stream; return (first token, end) in ms since the call, or None if it failed."""
+    start = time.perf_counter()
+    first = None
+    try:
+        for _ in stream:
+            if first is None:
+                first = time.perf_counter()
+    except Exception:
+        return None
+    end = time.perf_counter()
+    return ((first or end) - start) * 1000, (end - start) * 1000
+
+
+def prompt_cache(server: MockServer, provider_name: str, runs: int) -> dict:
+    """Compare the instructions merged into the user message with a separate cacheable system prompt."""
+    config = server.config
+    results = {}
+    for mode in ("combined", "split"):
+        server.prefixes.clear()
+        tokens_before = (config.input_tokens, config.cached_input_tokens)
+        ttft = []
+        errors = 0
+        with get_provider(provider_name, api_key="mock-key") as provider:
+            for _ in range(runs):
+                if mode == "combined":
+                    stream = provider.generate_stream(f"{SYSTEM}\n\n{build_prompt(PROMPT)}", max_tokens=64)
+                else:
+                    stream = provider.generate_stream(build_prompt(PROMPT), max_tokens=64, system=SYSTEM)
+                timing = time_stream(stream)
+                if count(timing is not None):
+                    ttft.append(timing[0])
+                else:
+                    errors += 1
+        results[mode] = {
+            "ttft_ms": percentiles(ttft),
+            "errors": errors,
+            "input_tokens": config.input_tokens - tokens_before[0],
+            "cached_input_tokens": config.cached_input_tokens - tokens_before[1],
+        }
+    return results
+
+
+def batch_throughput(env: dict, items: int, concurrency: int) -> dict:
+    """Items per second for `autocmd --batch` over a file of distinct prompts, and the items that failed."""
+    with tempfile.TemporaryDirectory() as home:
+        path = Path(home) / "prompts.jsonl"
+        path.write_text("".join(json.dumps({"prompt": f"{PROMPT} #{i}"}) + "\n" for i in range(items)))
+        code = (
+            f"import sys; sys.path.insert(0, {str(ROOT / 'src')!r}); import autocmd_cli; "
+            f"sys.argv = ['autocmd', '--batch', {str(path)!r}, '--concurrency', '{concurrency}']; autocmd_cli.main()"
+        )
+        run_env = dict(env, HOME=home, AUTOCMD_PROVIDER="anthropic")
+        start = time.perf_counter()
+        # Failed items are reported per line (and make the exit status non-zero), so count those instead
+        result = subprocess.run([sys.executable, "-c", code], env=run_env,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        elapsed = time.perf_counter() - start
+    lines = [json.loads(line) for line in result.stdout.splitlines() if line.strip()]
+    errors = sum("error" in line for line in lines) + items - len(lines)
+    tally(items, errors)
+    return {"items": items, "concurrency": concurrency, "items_per_second": round(items / elapsed, 1),
+            "errors": errors}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--first-token-ms", type=float, default=100.0)
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=20.0)
+    parser.add_argument("--connect-ms", type=float, default=100.0,
+                        help="simulated handshake time for each new connection")
+    parser.add_argument("--min-cache-tokens", type=int, default=0,
+                        help="shortest prefix the mock caches (real APIs need 1024 or more)")
+    parser.add_argument("--batch-items", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", help="also write the results to this file")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        args.first_token_ms, args.tokens_per_second, args.error_rate,
+        prefill_ms_per_1k_tokens=args.prefill_ms_per_1k_tokens, min_cache_tokens=args.min_cache_tokens,
+        connect_ms=args.connect_ms,
+    )
+    with MockServer(config) as server:
+        env = dict(os.environ, **provider_env(server.url))
+        os.environ.update(provider_env(server.url))
+
+        results = {}
+        for transport in TRANSPORTS:
+            os.environ["AUTOCMD_TRANSPORT"] = transport
+            for name in BUILTIN_PROVIDERS:
+                key = f"{name}/{transport}"
+                results[key] = warm_latency(name, args.runs)
+                results[key].update(cold_start(env, name, transport, args.runs))
+        batch = batch_throughput(env, args.batch_items, args.concurrency)
+        os.environ["AUTOCMD_TRANSPORT"] = "http"
+        cache = {name: prompt_cache(server, name, args.runs) for name in ("anthropic", "openai")}
+
+    error_rate = round(outcomes["failed"] / outcomes["requests"], 3) if outcomes["requests"] else 0.0
+    report = {
+        "benchmark": "providers",
+        "commit": git_commit(),
+        "runs": args.runs,
+        "server": {"first_token_ms": config.first_token_ms, "tokens_per_second": config.tokens_per_second,
+                   "error_rate": config.error_rate, "prefill_ms_per_1k_tokens": config.prefill_ms_per_1k_tokens,
+                   "min_cache_tokens": config.min_cache_tokens, "connect_ms": config.connect_ms,
+                   "requests": config.requests},
+        "results": results,
+        "batch": batch,
+        "prompt_cache": cache,
+        "errors": dict(outcomes, error_rate=error_rate),
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
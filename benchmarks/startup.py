@@ -0,0 +1,49 @@
+"""
+Startup benchmark: import cost of the SDK path versus the stdlib transport.
+
+Each scenario runs in a fresh interpreter so nothing is cached in-process.
+Prints one JSON object with the median wall time per scenario in milliseconds.
+
+    python benchmarks/startup.py [--runs N]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SRC = str(Path(__file__).resolve().parent.parent / "src")
+
+SCENARIOS = {
+    "interpreter": "pass",
+    "cli": "import autocmd_cli; autocmd_cli.create_provider('anthropic')",
+    "http_transport": "import autocmd_cli.transport",
+    "anthropic_sdk": "import anthropic",
+    "openai_sdk": "import openai",
+}
+
+
+def time_import(statement: str, runs: int) -> float:
+    samples = []
+    env = dict(os.environ, ANTHROPIC_API_KEY=os.environ.get("ANTHROPIC_API_KEY", "benchmark"))
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import sys; sys.path.insert(0, {SRC!r}); {statement}"], check=True,
+                       env=env)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    runs = int(sys.argv[sys.argv.index("--runs") + 1]) if "--runs" in sys.argv else 10
+    results = {name: round(time_import(statement, runs), 1) for name, statement in SCENARIOS.items()}
+    results["savings_vs_anthropic_ms"] = round(results["anthropic_sdk"] - results["http_transport"], 1)
+    results["savings_vs_openai_ms"] = round(results["openai_sdk"] - results["http_transport"], 1)
+    print(json.dumps({"benchmark": "startup", "runs": runs, "median_ms": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
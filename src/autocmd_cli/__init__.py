@@ -1,9 +1,42 @@
 #!/usr/bin/env python3
-import sys, os, re, getpass, shutil
+import sys, os, getpass, shutil
+from . import trace
+import importlib
+import json
+import signal
+import sqlite3
+import threading
+import time
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Optional, Set, Tuple
 from dotenv import load_dotenv
-from .llm_providers import get_provider, PROVIDERS
+from . import registry, settings
+from .llm_providers import (
+    PROVIDERS, LLMProvider, LocalProvider, get_provider, is_connection_error, is_rate_limit_error, retry_after,
+    usage_kwargs,
+)
+from .output import CommandParser, budget_max_tokens, parse_command
+from .racing import RacingProvider
+from .render import StreamRenderer
+from .stats import SPECULATIVE, StatsStore, histogram_percentile, prometheus_text, provider_entries, served_counts
+from .cache import ResponseCache, make_key, DEFAULT_TTL, DEFAULT_MAX_ENTRIES
+from .patterns import BUILTIN_PATTERNS, PatternEngine, create_engine, load_patterns
+from .similar import SimilarityIndex, DEFAULT_THRESHOLD as SIMILAR_THRESHOLD
+from .history import History, DEFAULT_LIMIT as HISTORY_LIMIT
+
+# Daemon, stdio, batch, cassette, context and prefetch support is imported by the code that uses it,
+# so a plain request doesn't pay for them
+if TYPE_CHECKING:
+    from .context import ContextCollector
+    from .prefetch import PrefetchSpool
+
+trace.imported()
+
+# Seconds of idleness after which a daemon pings a local model server (Ollama unloads after 300)
+LOCAL_KEEP_WARM = 240
+# The prefetch widget in the shell config runs from PREFETCH_MARKER to PREFETCH_END
+PREFETCH_MARKER = "# autocmd prefetch"
+PREFETCH_END = "# autocmd prefetch end"
 
 
 def get_config_dir() -> Path:
@@ -13,40 +46,34 @@ def get_settings_file() -> Path:
     return get_config_dir() / "settings"
 
 def get_setting(key: str, default: str = "") -> str:
-    settings_file = get_settings_file()
-    if not settings_file.exists():
-        return default
-
-    content = settings_file.read_text()
-    for line in content.split('\n'):
-        if '=' in line:
-            k, v = line.split('=', 1)
-            if k.strip() == key:
-                return v.strip()
-    return default
+    trace.count("settings reads")
+    return settings.load(get_settings_file()).get(key, default)
 
 def set_setting(key: str, value: str) -> None:
-    settings_file = get_settings_file()
-    settings_file.parent.mkdir(parents=True, exist_ok=True)
-
-    # Read existing settings
-    settings = {}
-    if settings_file.exists():
-        content = settings_file.read_text()
-        for line in content.split('\n'):
-            if '=' in line:
-                k, v = line.split('=', 1)
-                settings[k.strip()] = v.strip()
-
-    # Update setting
-    settings[key] = value
+    settings.update(get_settings_file(), {key: value})
 
-    # Write back
-    settings_file.write_text('\n'.join([f"{k}={v}" for k, v in settings.items()]))
+def get_response_cache() -> ResponseCache:
+    return ResponseCache(
+        get_config_dir() / "cache.db",
+        ttl=int(get_setting("cache_ttl", str(DEFAULT_TTL))),
+        max_entries=int(get_setting("cache_max_entries", str(DEFAULT_MAX_ENTRIES))),
+    )
 
 def is_shell_setup() -> bool:
     return (get_config_dir() / ".shell_setup_done").exists()
 
+def get_prefetch_spool() -> Optional["PrefetchSpool"]:
+    """The spool of speculatively generated commands, or None if prefetch is off."""
+    if get_setting("prefetch", "false") != "true":
+        return None
+    from . import prefetch
+    return prefetch.PrefetchSpool(
+        get_config_dir() / "prefetch.json",
+        ttl=float(get_setting("prefetch_ttl", str(prefetch.DEFAULT_TTL))),
+        per_minute=int(get_setting("prefetch_per_minute", str(prefetch.DEFAULT_PER_MINUTE))),
+        daily_tokens=int(get_setting("prefetch_daily_tokens", str(prefetch.DEFAULT_DAILY_TOKENS))),
+    )
+
 def detect_shell() -> Tuple[Optional[str], Optional[Path]]:
     shell = os.environ.get("SHELL", "")
     if "zsh" in shell:
@@ -72,6 +99,10 @@ def setup_shell_integration() -> bool:
         return False
 
     autocmd_cmd = shutil.which("autocmd") or "uv tool run --from autocmd-cli autocmd"
+    socket_path = get_daemon_socket()
+    # Requests to the daemon skip the package entirely; see client.py
+    from . import client
+    client_cmd = f"{sys.executable} -S {Path(client.__file__)}"
 
     if shell_type == "zsh":
         wrapper = f'''
@@ -79,7 +110,13 @@ def setup_shell_integration() -> bool:
 autocmd() {{
     # Handle triple quotes by preserving them as literal strings
     local args="$*"
-    local cmd=$({autocmd_cmd} "$args")
+    local cmd rc=75
+    # Talk to a running `autocmd --daemon` when there is one; 75 means it wasn't answering
+    if [ -S "{socket_path}" ]; then
+        cmd=$({client_cmd} "{socket_path}" "$args")
+        rc=$?
+    fi
+    [ $rc -eq 75 ] && cmd=$({autocmd_cmd} "$args")
     [ -n "$cmd" ] && print -z "$cmd"
 }}
 '''
@@ -89,23 +126,87 @@ autocmd() {{
 autocmd() {{
     # Handle triple quotes by preserving them as literal strings
     local args="$*"
-    local cmd=$({autocmd_cmd} "$args")
+    local cmd rc=75
+    # Talk to a running `autocmd --daemon` when there is one; 75 means it wasn't answering
+    if [ -S "{socket_path}" ]; then
+        cmd=$({client_cmd} "{socket_path}" "$args")
+        rc=$?
+    fi
+    [ $rc -eq 75 ] && cmd=$({autocmd_cmd} "$args")
     [ -n "$cmd" ] && {{ READLINE_LINE="$cmd"; READLINE_POINT=${{#READLINE_LINE}}; }}
 }}
 '''
 
-    if rc_file.exists() and "# autocmd" in rc_file.read_text():
-        get_config_dir().mkdir(parents=True, exist_ok=True)
-        (get_config_dir() / ".shell_setup_done").touch()
-        return True
+    installed = rc_file.read_text() if rc_file.exists() else ""
+    if "# autocmd" in installed:
+        # Keep the wrapper that is already there
+        wrapper = ""
 
-    with open(rc_file, "a") as f:
-        f.write(wrapper)
+    print("Prefetch commands in the background while you type a prompt? (y/n): ", end='', file=sys.stderr, flush=True)
+    if input().strip().lower() == 'y':
+        set_setting("prefetch", "true")
+        if PREFETCH_MARKER not in installed:
+            wrapper += prefetch_widget(shell_type, autocmd_cmd)
+
+    if wrapper:
+        with open(rc_file, "a") as f:
+            f.write(wrapper)
 
     get_config_dir().mkdir(parents=True, exist_ok=True)
     (get_config_dir() / ".shell_setup_done").touch()
     return True
 
+def prefetch_widget(shell_type: str, autocmd_cmd: str, debounce_ms: Optional[int] = None) -> str:
+    """Shell code that starts `autocmd --prefetch` once typing pauses on an `autocmd "..."` line.
+
+    A change to the prompt kills the prefetch started for the previous one,
+    whether it is still sleeping out the debounce or already generating. zsh
+    sees every keystroke; readline has no such hook, so bash looks at the line
+    when a space or a double quote is typed.
+    """
+    if debounce_ms is None:
+        from .prefetch import DEFAULT_DEBOUNCE_MS
+        debounce_ms = DEFAULT_DEBOUNCE_MS
+    def body(match: str) -> str:
+        return f'''
+    local request=""
+    [[ "$line" =~ $_autocmd_prefetch_re ]] && request="{match}"
+    (( ${{#request}} >= 8 )) || request=""
+    [[ "$request" == "$_autocmd_prefetch_request" ]] && return 0
+    _autocmd_prefetch_request="$request"
+    [ -n "$_autocmd_prefetch_pid" ] && kill "$_autocmd_prefetch_pid" 2>/dev/null
+    _autocmd_prefetch_pid=""
+    [ -n "$request" ] || return 0
+    _autocmd_prefetch_pid=$( ( sleep {debounce_ms / 1000:g}; exec {autocmd_cmd} --prefetch "$request" ) >/dev/null 2>&1 & echo $! )'''
+
+    if shell_type == "zsh":
+        return f'''
+{PREFETCH_MARKER}: start generating while the prompt is typed
+_autocmd_prefetch_re='^autocmd +"([^"]*[^" ]) *"? *$'
+_autocmd_prefetch() {{
+    local line="$BUFFER"{body("$match[1]")}
+}}
+autoload -Uz add-zle-hook-widget
+add-zle-hook-widget line-pre-redraw _autocmd_prefetch
+{PREFETCH_END}
+'''
+    return f'''
+{PREFETCH_MARKER}: start generating while the prompt is typed
+_autocmd_prefetch_re='^autocmd +"([^"]*[^" ]) *"? *$'
+_autocmd_prefetch_insert() {{
+    READLINE_LINE="${{READLINE_LINE:0:READLINE_POINT}}$1${{READLINE_LINE:READLINE_POINT}}"
+    READLINE_POINT=$((READLINE_POINT + 1))
+    local line="$READLINE_LINE"{body("${BASH_REMATCH[1]}")}
+}}
+_autocmd_prefetch_space() {{ _autocmd_prefetch_insert " "; }}
+_autocmd_prefetch_quote() {{ _autocmd_prefetch_insert '"'; }}
+if [[ $- == *i* ]]; then
+    bind -x '" ": _autocmd_prefetch_space'
+    bind -x '"\\"": _autocmd_prefetch_quote'
+fi
+{PREFETCH_END}
+'''
+
 def get_provider_name() -> str:
     """Get the provider name from environment or settings."""
     return os.environ.get("AUTOCMD_PROVIDER") or get_setting("provider", "anthropic")
@@ -116,12 +217,13 @@ def onboarding() -> None:
     print("", file=sys.stderr)
 
     # Provider selection
-    print(f"Available providers: {', '.join(PROVIDERS.keys())}", file=sys.stderr)
+    available = registry.names()
+    print(f"Available providers: {', '.join(available)}", file=sys.stderr)
     print("Choose a provider (default: anthropic): ", end='', file=sys.stderr, flush=True)
     provider = input().strip().lower() or "anthropic"
 
-    while provider not in PROVIDERS:
-        print(f"Unknown provider '{provider}'. Please choose from: {', '.join(PROVIDERS.keys())}", file=sys.stderr)
+    while provider not in available:
+        print(f"Unknown provider '{provider}'. Please choose from: {', '.join(available)}", file=sys.stderr)
         print("Choose a provider: ", end='', file=sys.stderr, flush=True)
         provider = input().strip().lower()
 
@@ -130,22 +232,27 @@ def onboarding() -> None:
     print("", file=sys.stderr)
 
     # API Key
-    env_var = PROVIDERS[provider].env_var_name()
-    print(f"Enter your {provider.capitalize()} API key (will be stored in {get_settings_file()}):", file=sys.stderr)
-    print(f"Alternatively, you can set the {env_var} environment variable.", file=sys.stderr)
-    print("API key: ", end='', file=sys.stderr, flush=True)
-    api_key = getpass.getpass("").strip()
-
-    if api_key:
-        set_setting("api_key", api_key)
-        print("API key saved.", file=sys.stderr)
+    spec = registry.get(provider)
+    env_var = spec.env_var
+    if not spec.api_key_required:
+        print(f"No API key needed. Point {spec.base_url_env_var} at your server if it isn't on the default port.",
+              file=sys.stderr)
     else:
-        print(f"No API key entered. You'll need to set {env_var} environment variable.", file=sys.stderr)
+        print(f"Enter your {provider.capitalize()} API key (will be stored in {get_settings_file()}):", file=sys.stderr)
+        print(f"Alternatively, you can set the {env_var} environment variable.", file=sys.stderr)
+        print("API key: ", end='', file=sys.stderr, flush=True)
+        api_key = getpass.getpass("").strip()
+
+        if api_key:
+            set_setting("api_key", api_key)
+            print("API key saved.", file=sys.stderr)
+        else:
+            print(f"No API key entered. You'll need to set {env_var} environment variable.", file=sys.stderr)
 
     print("", file=sys.stderr)
 
     # Model (optional)
-    default_model = PROVIDERS[provider]("dummy").default_model()
+    default_model = spec.default_model
     print(f"Default model for {provider}: {default_model}", file=sys.stderr)
     print("Enter a different model name or press Enter to use default: ", end='', file=sys.stderr, flush=True)
     model = input().strip()
@@ -165,10 +272,10 @@ def manage_settings() -> None:
     # Provider setting
     current_provider = get_setting("provider", "anthropic")
     print(f"Current provider: {current_provider}", file=sys.stderr)
-    print(f"Available providers: {', '.join(PROVIDERS.keys())}", file=sys.stderr)
+    print(f"Available providers: {', '.join(registry.names())}", file=sys.stderr)
     print("Change provider? (Enter provider name or press Enter to skip): ", end='', file=sys.stderr, flush=True)
     choice = input().strip().lower()
-    if choice and choice in PROVIDERS:
+    if choice and registry.find(choice):
         set_setting("provider", choice)
         current_provider = choice
         print(f"Provider set to {choice}.", file=sys.stderr)
@@ -178,7 +285,7 @@ def manage_settings() -> None:
     print("", file=sys.stderr)
 
     # API Key setting
-    env_var = PROVIDERS[current_provider].env_var_name()
+    env_var = registry.get(current_provider).env_var
     print(f"API key is read from {env_var} environment variable or settings file.", file=sys.stderr)
     print("Update API key? (y/n): ", end='', file=sys.stderr, flush=True)
     choice = input().strip().lower()
@@ -199,7 +306,7 @@ def manage_settings() -> None:
 
     # Model setting
     current_model = get_setting("model", "")
-    default_model = PROVIDERS[current_provider]("dummy").default_model()
+    default_model = registry.get(current_provider).default_model
     print(f"Current model: {current_model or f'{default_model} (default)'}", file=sys.stderr)
     print("Change model? (Enter model name or press Enter to skip): ", end='', file=sys.stderr, flush=True)
     choice = input().strip()
@@ -237,12 +344,14 @@ def reset_autocmd() -> None:
             lines = content.split('\n')
             new_lines = []
             skip = False
+            until = '}'
             for line in lines:
-                if "# autocmd" in line:
+                if not skip and "# autocmd" in line:
                     skip = True
-                elif skip and '}' in line:
+                    # The prefetch widget has several functions and ends with its own marker
+                    until = PREFETCH_END if line.strip().startswith(PREFETCH_MARKER) else '}'
+                elif skip and line.strip() == until:
                     skip = False
-                    continue
                 elif not skip:
                     new_lines.append(line)
             rc_file.write_text('\n'.join(new_lines))
@@ -250,12 +359,702 @@ def reset_autocmd() -> None:
         else:
             print("Reset complete.", file=sys.stderr)
 
+FLAGS = ("--no-cache", "--client", "--timings")
+
+def pop_flags(args: List[str], flags: Tuple[str, ...]) -> Tuple[Set[str], List[str]]:
+    """Strip leading option flags from args.
+
+    The shell wrapper passes everything as one space-joined argument, so flags
+    are also peeled off the front of that single argument.
+    """
+    found = set()
+    args = list(args)
+    while args:
+        head = args[0]
+        if head in flags:
+            found.add(head)
+            args.pop(0)
+            continue
+        word, _, rest = head.partition(' ')
+        if word in flags and rest:
+            found.add(word)
+            args[0] = rest
+            continue
+        break
+    return found, args
+
+def build_system_prompt(shell: Optional[str] = None) -> str:
+    """Return the fixed instructions, sent apart from the request so providers can cache them."""
+    shell = shell or os.environ.get('SHELL', 'bash')
+    return f"You are a command-line assistant. Convert the user's request to a single {shell} command. Output ONLY the command, nothing else - no explanations, no markdown, no options, no alternatives. Just the one best command. Note: This tool is called 'autocmd' (package: autocmd-cli), so if asked to upgrade itself, use 'uv tool upgrade autocmd-cli' or 'pip install --upgrade autocmd-cli'."
+
+def build_prompt(user_prompt: str, context: str = "") -> str:
+    """Return the user message for a request, after the working-directory context if there is any."""
+    if context:
+        return f"Context:\n{context}\n\nRequest: {user_prompt}"
+    return f"Request: {user_prompt}"
+
+def get_context_collector() -> Optional["ContextCollector"]:
+    """Return a collector for the working-directory context, or None if it is turned off."""
+    if get_setting("context", "false") != "true":
+        return None
+    from . import context
+    return context.ContextCollector(
+        get_config_dir() / "context.json",
+        budget_ms=float(get_setting("context_budget_ms", str(context.DEFAULT_BUDGET_MS))),
+        max_chars=int(get_setting("context_max_chars", str(context.DEFAULT_MAX_CHARS))),
+    )
+
+def resolve_api_key(provider_name: str) -> Optional[str]:
+    """Get the API key from settings if it is not in the environment.
+
+    A per-provider `<provider>_api_key` setting takes precedence over the
+    generic `api_key`, so several providers can be configured at once.
+    """
+    # 'race' and 'auto' have no key of their own; don't go looking for them among plugins
+    spec = registry.find(provider_name) if provider_name not in ("race", "auto") else None
+    if spec is not None:
+        if not os.environ.get(spec.env_var):
+            if not spec.api_key_required:
+                # Never hand a cloud provider's key to a local server
+                return get_setting(f"{provider_name}_api_key") or None
+            return get_setting(f"{provider_name}_api_key") or get_setting("api_key") or None
+    return None
+
+def _parse_members(value: str) -> List[Tuple[str, Optional[str]]]:
+    members = []
+    for member in value.split(","):
+        name, _, model = member.strip().partition(":")
+        if name:
+            members.append((name, model or None))
+    return members
+
+def get_race_members() -> List[str]:
+    """Get the `provider[:model]` entries raced by the 'race' provider."""
+    value = os.environ.get("AUTOCMD_RACE_PROVIDERS") or get_setting("race_providers", "")
+    return [member.strip() for member in value.split(",") if member.strip()]
+
+def get_auto_candidates() -> List[Tuple[str, str]]:
+    """Get the (provider, model) pairs the 'auto' provider chooses between.
+
+    Defaults to every built-in provider with a key in its environment variable
+    or a `<provider>_api_key` setting; providers from other packages take part
+    when listed explicitly.
+    """
+    value = os.environ.get("AUTOCMD_AUTO_PROVIDERS") or get_setting("auto_providers", "")
+    if value:
+        members = _parse_members(value)
+    else:
+        members = [
+            (name, None) for name, spec in registry.BUILTIN_PROVIDERS.items()
+            if os.environ.get(spec.env_var) or get_setting(f"{name}_api_key")
+        ]
+    specs = [(name, model, registry.find(name)) for name, model in members]
+    return [(name, model or spec.default_model) for name, model, spec in specs if spec is not None]
+
+def get_stats_store() -> StatsStore:
+    textfile = get_setting("prometheus_textfile")
+    return StatsStore(get_config_dir() / "stats.json", Path(textfile).expanduser() if textfile else None)
+
+def served_by(provider: LLMProvider, usage: Optional[dict] = None) -> Optional[LLMProvider]:
+    """Return the provider that actually answered, following a race to the winner of the call that filled usage."""
+    # A recording cassette wraps the provider that answered (cassette is only imported when one is in use)
+    cassette = sys.modules.get(f"{__name__}.cassette")
+    if cassette is not None and isinstance(provider, cassette.RecordingProvider):
+        provider = provider.inner
+    if isinstance(provider, RacingProvider):
+        provider = provider.winner_of(usage)
+    return provider
+
+def provider_label(provider: LLMProvider, usage: Optional[dict] = None) -> Optional[Tuple[str, str]]:
+    """Return (provider name, model) for stats, following a race to its winner."""
+    provider = served_by(provider, usage)
+    name = registry.name_of(provider)
+    return (name, provider.model) if name else None
+
+def record_success(provider: LLMProvider, start: float, first: Optional[float], end: float,
+                   usage: Optional[dict] = None) -> None:
+    """Record a successful request, with the token counts the provider reported for it."""
+    label = provider_label(provider, usage)
+    if label is None:
+        return
+    try:
+        get_stats_store().record_success(
+            *label, ttft=(first or end) - start, total=end - start, usage=usage or None
+        )
+    except OSError:
+        pass
+
+def record_served(source: str) -> None:
+    """Count a request answered from the response cache or a similar earlier request."""
+    try:
+        get_stats_store().record_served(source)
+    except OSError:
+        pass
+
+def record_failure(provider: LLMProvider, error: Exception) -> None:
+    label = provider_label(provider)
+    if label is None:
+        return
+    try:
+        get_stats_store().record_error(*label, rate_limited=is_rate_limit_error(error), retry_after=retry_after(error))
+    except OSError:
+        pass
+
+def time_stream(chunks: Iterator[str], timing: dict) -> Iterator[str]:
+    """Pass chunks through, noting when the first one arrived in timing['first']."""
+    try:
+        for text in chunks:
+            if "first" not in timing:
+                timing["first"] = time.monotonic()
+                trace.mark("first_token")
+            yield text
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+def _hedge_delay(members: List[LLMProvider]) -> float:
+    value = os.environ.get("AUTOCMD_RACE_DELAY_MS") or get_setting("race_delay_ms", "p95")
+    if value != "p95":
+        return float(value) / 1000
+    # Hedge once the first provider is slower than it is 95% of the time
+    label = provider_label(members[0])
+    p95 = get_stats_store().percentile(*label, 0.95) if label else None
+    return p95 or 0.0
+
+def create_provider(provider_name: str, model: Optional[str] = None) -> LLMProvider:
+    """Build the configured provider, including the 'race' and 'auto' modes.
+
+    With AUTOCMD_CASSETTE set, requests are replayed from (or recorded to) that file instead.
+    """
+    cassette = os.environ.get("AUTOCMD_CASSETTE")
+    mode = os.environ.get("AUTOCMD_CASSETTE_MODE", "replay")
+    if cassette:
+        from .cassette import RecordingProvider, ReplayProvider
+    if cassette and mode == "replay":
+        return ReplayProvider(Path(cassette), speed=float(os.environ.get("AUTOCMD_CASSETTE_SPEED", "1")))
+    provider = _build_provider(provider_name, model)
+    if cassette and mode == "record":
+        return RecordingProvider(provider, Path(cassette))
+    return provider
+
+def _build_provider(provider_name: str, model: Optional[str] = None) -> LLMProvider:
+    transport = resolve_transport()
+
+    if provider_name == "auto":
+        candidates = get_auto_candidates()
+        if not candidates:
+            raise ValueError("API key not found for any provider. Set a provider's API key environment variable.")
+        # Pick the currently fastest healthy provider from the recorded stats
+        name, model = candidates[get_stats_store().choose(candidates)]
+        provider_name = name
+
+    if provider_name != "race":
+        return get_provider(
+            provider_name=provider_name, api_key=resolve_api_key(provider_name), model=model, transport=transport
+        )
+
+    members = []
+    errors = []
+    for name, member_model in _parse_members(",".join(get_race_members())):
+        try:
+            members.append(get_provider(
+                provider_name=name, api_key=resolve_api_key(name), model=member_model, transport=transport
+            ))
+        except ValueError as e:
+            errors.append(f"{name}: {e}")
+    if not members:
+        detail = "; ".join(errors) or "set race_providers (e.g. groq,anthropic) in settings or AUTOCMD_RACE_PROVIDERS"
+        raise ValueError(f"No providers available to race - {detail}")
+    return RacingProvider(members, hedge_delay=_hedge_delay(members))
+
+def resolve_transport() -> Optional[str]:
+    """Get the HTTP transport ('sdk' or 'http') from environment or settings."""
+    return os.environ.get("AUTOCMD_TRANSPORT") or get_setting("transport") or None
+
+def resolve_model() -> Optional[str]:
+    """Get the model from environment or settings."""
+    return os.environ.get("AUTOCMD_MODEL") or get_setting("model") or None
+
+def cache_scope(shell: str, cwd: Optional[str]) -> str:
+    """Return what cached and similar commands are keyed on besides the prompt.
+
+    With context on, a command was written for one directory's files and branch, so the
+    working directory joins the shell.
+    """
+    if cwd and get_setting("context", "false") == "true":
+        return f"{shell}:{cwd}"
+    return shell
+
+def lookup_cache(user_prompt: str, provider_name: str, model: Optional[str], shell: str) -> Tuple[Optional[str], Optional[str]]:
+    """Return (cache_key, cached_command) for a request; both None if uncacheable."""
+    if provider_name == "race":
+        cache_model = ",".join(get_race_members())
+    elif provider_name == "auto":
+        cache_model = ",".join(f"{name}:{m}" for name, m in get_auto_candidates())
+    else:
+        spec = registry.find(provider_name)
+        if spec is None:
+            return None, None
+        cache_model = model or spec.default_model
+    cache_key = make_key(user_prompt, provider_name, cache_model, shell)
+    try:
+        return cache_key, get_response_cache().get(cache_key)
+    except sqlite3.Error:
+        return cache_key, None
+
+def store_cache(cache_key: Optional[str], cmd: str) -> None:
+    if not cache_key:
+        return
+    try:
+        get_response_cache().put(cache_key, cmd)
+    except sqlite3.Error:
+        pass
+
+def get_pattern_engine() -> PatternEngine:
+    return create_engine(get_config_dir() / "patterns")
+
+def resolve_locally(user_prompt: str) -> Optional[str]:
+    """Answer the request from the local pattern library, recording the hit rate."""
+    if get_setting("patterns", "true") != "true":
+        return None
+    match = get_pattern_engine().resolve(user_prompt)
+    try:
+        get_stats_store().record_local(match.pattern if match else None)
+    except OSError:
+        pass
+    return match.command if match else None
+
+def show_patterns() -> None:
+    """Print the pattern library size and how often it answered requests."""
+    user = load_patterns(get_config_dir() / "patterns")
+    print(f"Local patterns: {len(BUILTIN_PATTERNS)} built-in, {len(user)} from {get_config_dir() / 'patterns'}")
+    if get_setting("patterns", "true") != "true":
+        print("Disabled (patterns=false in settings)")
+    summary = get_stats_store().local_summary()
+    requests, hits = summary["requests"], summary["hits"]
+    rate = f" ({hits / requests:.0%})" if requests else ""
+    print(f"Answered locally: {hits} of {requests} requests{rate}")
+    if summary["saved_ms"]:
+        print(f"Estimated provider time saved: {summary['saved_ms'] / 1000:.1f}s")
+    for pattern, count in sorted(summary["patterns"].items(), key=lambda item: -item[1]):
+        print(f"  {count:6d}  {pattern}")
+
+def _format_ms(values: List[Optional[float]]) -> str:
+    return "/".join("-" if v is None else (f"{v / 1000:g}s" if v >= 1000 else f"{v:g}ms") for v in values)
+
+def show_stats(args: List[str]) -> None:
+    """Print request counts, hit rates, token usage and latency percentiles, or the Prometheus metrics."""
+    data = get_stats_store().load()
+    if "--prometheus" in args:
+        sys.stdout.write(prometheus_text(data))
+        return
+    served = served_counts(data)
+    total = sum(served.values())
+    rates = ", ".join(f"{source} {count / total:.0%}" for source, count in served.items()) if total else ""
+    print(f"Requests answered: {total}{f' ({rates})' if rates else ''}")
+    entries = provider_entries(data)
+    if not entries:
+        return
+    print()
+    print(f"{'provider/model':<40} {'requests':>8} {'errors':>6} {'in tokens':>10} {'out tokens':>10}"
+          f"  {'ttft p50/p95/p99':<22} total p50/p95/p99")
+    for key, entry in sorted(entries.items(), key=lambda item: -item[1]["requests"]):
+        ttft = [histogram_percentile(entry["ttft_hist"], q) for q in (0.5, 0.95, 0.99)]
+        latency = [histogram_percentile(entry["total_hist"], q) for q in (0.5, 0.95, 0.99)]
+        print(f"{key:<40} {entry['requests']:>8} {entry['errors']:>6} {entry['input_tokens']:>10} "
+              f"{entry['output_tokens']:>10}  {_format_ms(ttft):<22} {_format_ms(latency)}")
+    print()
+    print("Percentiles are the upper bounds of histogram buckets.")
+
+def get_similarity_index() -> SimilarityIndex:
+    return SimilarityIndex(
+        get_config_dir() / "similar.db",
+        threshold=float(get_setting("similar_threshold", str(SIMILAR_THRESHOLD))),
+    )
+
+def lookup_similar(user_prompt: str, shell: str) -> Optional[Tuple[str, str]]:
+    """Return (command, past prompt) for a near-duplicate of an earlier request, if any."""
+    if get_setting("similar", "true") != "true":
+        return None
+    try:
+        match = get_similarity_index().lookup(user_prompt, shell)
+    except sqlite3.Error:
+        return None
+    return match[:2] if match else None
+
+def print_similar_notice(matched_prompt: str) -> None:
+    print(f'autocmd: reusing the command for "{matched_prompt}" (similar)', file=sys.stderr)
+
+def store_similar(user_prompt: str, shell: str, cmd: str) -> None:
+    if get_setting("similar", "true") != "true":
+        return
+    try:
+        get_similarity_index().add(user_prompt, shell, cmd)
+    except sqlite3.Error:
+        pass
+
+def get_history() -> History:
+    return History(get_config_dir() / "history.db")
+
+def record_history(user_prompt: str, cmd: str, provider_name: str, provider: LLMProvider,
+                   latency: float, shell: str, cwd: str, usage: Optional[dict] = None) -> None:
+    """Append a generated command to the history log."""
+    name, model = provider_label(provider, usage) or (provider_name, provider.model)
+    add_history(user_prompt, cmd, name, model, round(latency * 1000, 1), shell, cwd)
+
+def add_history(user_prompt: str, cmd: str, provider_name: str, model: str, latency_ms: Optional[float],
+                shell: str, cwd: str) -> None:
+    if get_setting("history", "true") != "true":
+        return
+    try:
+        get_history().add(user_prompt, cmd, provider_name, model, latency_ms, shell, cwd)
+    except sqlite3.Error:
+        pass
+
+def run_prefetch(user_prompt: str) -> None:
+    """Generate a command for a prompt that is still being typed and leave it in the prefetch spool."""
+    spool = get_prefetch_spool()
+    if spool is None:
+        return
+    from .prefetch import BudgetExceeded
+    shell = os.environ.get('SHELL', 'bash')
+    cwd = os.getcwd()
+    provider_name = get_provider_name()
+    model = resolve_model()
+    # Nothing to gain where the request will be answered without a provider
+    if get_setting("patterns", "true") == "true" and get_pattern_engine().resolve(user_prompt):
+        return
+    if get_setting("cache", "true") == "true":
+        scope = cache_scope(shell, cwd)
+        if lookup_cache(user_prompt, provider_name, model, scope)[1] or lookup_similar(user_prompt, scope):
+            return
+    try:
+        if spool.claim(user_prompt, shell, cwd, speculative=True) is not None:
+            return
+    except BudgetExceeded:
+        return
+
+    # The shell kills a prefetch once the prompt changes; exit through the finally below
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(143))
+    cmd = None
+    tokens = 0
+    details = {}
+    collector = None
+    try:
+        provider = create_provider(provider_name, model)
+        collector = get_context_collector()
+        prompt = build_prompt(user_prompt, collector.collect(cwd) if collector else "")
+        system = build_system_prompt(shell)
+        # Charged if the provider reports no usage, or the prefetch is killed first
+        tokens = (len(prompt) + len(system)) // 4
+        timing = {}
+        usage = {}
+        provider.prepare()
+        start = time.monotonic()
+        parser = CommandParser()
+        try:
+            for _ in parser.consume(time_stream(
+                provider.generate_stream(prompt, max_tokens=budget_max_tokens(user_prompt), system=system,
+                                         **usage_kwargs(provider, usage)),
+                timing,
+            )):
+                pass
+        except Exception as e:
+            record_failure(provider, e)
+            return
+        end = time.monotonic()
+        cmd = parser.command or None
+        record_success(provider, start, timing.get("first"), end, usage)
+        record_served(SPECULATIVE)
+        if usage.keys() & {"input_tokens", "output_tokens"}:
+            tokens = usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+        else:
+            tokens += len(cmd or "") // 4
+        name, model = provider_label(provider, usage) or (provider_name, provider.model)
+        details = {"provider": name, "model": model, "latency_ms": round((end - start) * 1000, 1)}
+    finally:
+        spool.complete(user_prompt, shell, cwd, cmd, tokens=tokens, speculative=True, **details)
+    # After the command is in the spool, where a waiting request can take it
+    if collector:
+        collector.finish()
+
+def show_history(args: List[str]) -> None:
+    """Print the newest history entries matching the words in args."""
+    limit = HISTORY_LIMIT
+    if "--limit" in args:
+        i = args.index("--limit")
+        try:
+            limit = int(args[i + 1])
+        except (IndexError, ValueError):
+            print("Error: --limit needs a number.", file=sys.stderr)
+            sys.exit(1)
+        args = args[:i] + args[i + 2:]
+    for entry in get_history().search(" ".join(args), limit):
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.created))
+        print(f"{when}  {entry.command}")
+        print(f"{' ' * len(when)}  # {entry.prompt}")
+
+def stream_to_stderr(chunks: Iterable[str]) -> str:
+    """Echo streamed chunks to stderr, then clear them. Returns the full text."""
+    renderer = StreamRenderer(sys.stderr)
+    try:
+        for text in chunks:
+            renderer.write(text)
+    finally:
+        # Also on errors and Ctrl-C, so no half-drawn preview is left behind
+        renderer.clear()
+    return renderer.text()
+
+def get_daemon_socket() -> Path:
+    return get_config_dir() / "daemon.sock"
+
+def preload_sdks() -> None:
+    """Pay the SDK import cost once, up front, instead of on the first request."""
+    for module in ("anthropic", "openai"):
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+def take_prefetched(spool: "PrefetchSpool", user_prompt: str, shell: str, cwd: str, provider_name: str,
+                    model: Optional[str]) -> Optional[str]:
+    """Return the command prefetched for this prompt, waiting for one in flight, and record it as served.
+
+    Otherwise the prompt is left claimed for this process; release it with spool.complete(..., None).
+    """
+    prefetched = spool.wait(user_prompt, shell, cwd)
+    if not prefetched:
+        return None
+    cmd = prefetched["command"]
+    record_served("prefetch")
+    scope = cache_scope(shell, cwd)
+    store_cache(lookup_cache(user_prompt, provider_name, model, scope)[0], cmd)
+    store_similar(user_prompt, scope, cmd)
+    add_history(user_prompt, cmd, prefetched.get("provider", provider_name), prefetched.get("model", ""),
+                prefetched.get("latency_ms"), shell, cwd)
+    return cmd
+
+def create_request_handler() -> Tuple[Callable[..., None], Callable[[], None]]:
+    """Return the request handler shared by --daemon and --serve-stdio, and a function closing its providers.
+
+    Providers are kept per configuration, so their clients stay warm between requests.
+    """
+    providers = {}
+    lock = threading.Lock()
+
+    def handle(request, send, cancelled):
+        """Answer from local patterns or a prefetch like a one-shot run would, otherwise generate."""
+        user_prompt = request["prompt"]
+        shell = request.get("shell") or os.environ.get("SHELL", "bash")
+        cwd = request.get("cwd")
+        if not request.get("no_cache") and get_setting("cache", "true") == "true":
+            local_cmd = resolve_locally(user_prompt)
+            if local_cmd:
+                send({"command": local_cmd})
+                return
+        spool = get_prefetch_spool() if not request.get("no_cache") and cwd else None
+        if spool is None:
+            generate(request, send, cancelled)
+            return
+        try:
+            cmd = take_prefetched(spool, user_prompt, shell, cwd, request.get("provider") or get_provider_name(),
+                                  request.get("model") or resolve_model())
+            if cmd:
+                send({"command": cmd})
+                return
+            generate(request, send, cancelled)
+        finally:
+            spool.complete(user_prompt, shell, cwd, None)
+
+    def generate(request, send, cancelled):
+        user_prompt = request["prompt"]
+        shell = request.get("shell") or os.environ.get("SHELL", "bash")
+        # The client's AUTOCMD_PROVIDER/AUTOCMD_MODEL, when set, win over the daemon's
+        provider_name = request.get("provider") or get_provider_name()
+        model = request.get("model") or resolve_model()
+
+        scope = cache_scope(shell, request.get("cwd"))
+        cache_key = None
+        if not request.get("no_cache") and get_setting("cache", "true") == "true":
+            cache_key, cached = lookup_cache(user_prompt, provider_name, model, scope)
+            if cached:
+                send({"command": cached})
+                record_served("cache")
+                return
+            similar = lookup_similar(user_prompt, scope)
+            if similar:
+                send({"command": similar[0], "similar_to": similar[1]})
+                store_cache(cache_key, similar[0])
+                record_served("similar")
+                return
+
+        if provider_name == "auto":
+            # Choose per request so a long-lived daemon follows changes in provider latency
+            candidates = get_auto_candidates()
+            if candidates:
+                provider_name, model = candidates[get_stats_store().choose(candidates)]
+
+        key = (provider_name, resolve_api_key(provider_name), model, resolve_transport(), tuple(get_race_members()))
+        with lock:
+            provider = providers.get(key)
+            if provider is None:
+                provider = providers[key] = create_provider(provider_name, model)
+                if isinstance(provider, LocalProvider):
+                    # Long-lived servers keep the local model loaded between requests
+                    provider.keep_warm(float(get_setting("local_keep_warm", str(LOCAL_KEEP_WARM))))
+
+        collector = get_context_collector()
+        context = collector.collect(request["cwd"]) if collector and request.get("cwd") else ""
+
+        parser = CommandParser()
+        timing = {}
+        # Per request: the provider is shared with any other request in flight
+        usage = {}
+        provider.prepare()
+        start = time.monotonic()
+        tokens = parser.consume(time_stream(
+            provider.generate_stream(
+                build_prompt(user_prompt, context), max_tokens=budget_max_tokens(user_prompt),
+                system=build_system_prompt(shell), **usage_kwargs(provider, usage),
+            ),
+            timing,
+        ))
+        try:
+            try:
+                for text in tokens:
+                    if cancelled.is_set():
+                        tokens.close()
+                        return
+                    send({"token": text})
+            except Exception as e:
+                record_failure(provider, e)
+                raise
+            end = time.monotonic()
+            record_success(provider, start, timing.get("first"), end, usage)
+
+            cmd = parser.command
+            send({"command": cmd})
+        finally:
+            # Once the client has its answer
+            if collector:
+                collector.finish()
+        if cmd:
+            store_cache(cache_key, cmd)
+            store_similar(user_prompt, scope, cmd)
+            record_history(user_prompt, cmd, provider_name, provider, end - start, shell, request.get("cwd") or "",
+                           usage)
+
+    def close():
+        with lock:
+            for provider in providers.values():
+                provider.close()
+            providers.clear()
+
+    return handle, close
+
+def serve_daemon() -> None:
+    """Run the resident daemon, keeping providers warm between requests."""
+    handle, close = create_request_handler()
+    socket_path = get_daemon_socket()
+    from . import daemon
+
+    def ready():
+        print(f"autocmd daemon listening on {socket_path}", file=sys.stderr)
+        # Bound first, so clients reach the daemon (and cache hits are answered) while the SDKs load
+        threading.Thread(target=preload_sdks, name="autocmd-preload", daemon=True).start()
+
+    try:
+        daemon.serve(socket_path, handle, ready)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close()
+
+def serve_stdio() -> None:
+    """Serve JSON-RPC requests on stdin/stdout for editor and tool integrations."""
+    preload_sdks()
+    handle, close = create_request_handler()
+    rfile, wfile = sys.stdin.buffer, sys.stdout.buffer
+    # stdout carries the protocol; anything else printed goes to stderr
+    sys.stdout = sys.stderr
+    from . import stdio
+    try:
+        stdio.serve(rfile, wfile, handle)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close()
+
+def run_batch(argv: List[str]) -> int:
+    """Run `autocmd --batch FILE|- [--concurrency N] [--unordered]`. Returns the exit code."""
+    import asyncio
+    from .batch import BatchRunner
+
+    usage = "Usage: autocmd --batch FILE|- [--concurrency N] [--unordered]"
+    path = None
+    concurrency = 8
+    ordered = True
+    args = iter(argv)
+    for arg in args:
+        if arg == "--concurrency":
+            try:
+                concurrency = int(next(args, ""))
+            except ValueError:
+                print(usage, file=sys.stderr)
+                return 1
+        elif arg == "--unordered":
+            ordered = False
+        elif path is None:
+            path = arg
+        else:
+            print(usage, file=sys.stderr)
+            return 1
+    if path is None:
+        print(usage, file=sys.stderr)
+        return 1
+
+    default_provider = get_provider_name()
+    default_model = resolve_model()
+
+    def make_provider(name, model):
+        if model is None and name == default_provider:
+            model = default_model
+        return create_provider(name, model)
+
+    def write(result):
+        sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+
+    runner = BatchRunner(
+        make_provider, default_provider, build_prompt, parse_command,
+        concurrency=concurrency, ordered=ordered, system=build_system_prompt(),
+    )
+    try:
+        if path == "-":
+            summary = asyncio.run(runner.run(sys.stdin, write))
+        else:
+            with open(path, encoding="utf-8") as source:
+                summary = asyncio.run(runner.run(source, write))
+    except OSError as e:
+        print(f"Error: File system error - {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        print("\nCancelled", file=sys.stderr)
+        return 130
+
+    print(f"autocmd batch: {summary.format()}", file=sys.stderr)
+    return 1 if summary.failed else 0
+
 def main() -> None:
     # Force unbuffered stderr
     if sys.stderr:
         sys.stderr.reconfigure(write_through=True) if hasattr(sys.stderr, 'reconfigure') else None
 
+    trace.configure("--timings" in pop_flags(sys.argv[1:], FLAGS)[0])
     load_dotenv()
+    trace.mark("dotenv")
 
     if len(sys.argv) > 1 and sys.argv[1] == "--reset":
         reset_autocmd()
@@ -265,6 +1064,33 @@ def main() -> None:
         manage_settings()
         sys.exit(0)
 
+    if len(sys.argv) > 1 and sys.argv[1] == "--daemon":
+        serve_daemon()
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve-stdio":
+        serve_stdio()
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        sys.exit(run_batch(sys.argv[2:]))
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--patterns":
+        show_patterns()
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--history":
+        show_history(sys.argv[2:])
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--stats":
+        show_stats(sys.argv[2:])
+        sys.exit(0)
+
+    if len(sys.argv) > 2 and sys.argv[1] == "--prefetch":
+        run_prefetch(" ".join(sys.argv[2:]))
+        sys.exit(0)
+
     if not is_shell_setup():
         print("Welcome to autocmd! The text-to-command assistant.", file=sys.stderr)
         setup_shell_integration()
@@ -275,12 +1101,14 @@ def main() -> None:
             print(f"  source {rc_file}", file=sys.stderr)
         sys.exit(0)
 
-    if len(sys.argv) < 2:
+    flags, args = pop_flags(sys.argv[1:], FLAGS)
+
+    if len(args) < 1:
         print('autocmd: The text-to-command assistant', file=sys.stderr)
         sys.exit(1)
 
     # Parse arguments - support both single quoted and triple-quoted strings
-    user_input = ' '.join(sys.argv[1:])
+    user_input = ' '.join(args)
 
     # Check if using triple quotes
     if '"""' in user_input:
@@ -295,63 +1123,142 @@ def main() -> None:
             sys.exit(1)
     else:
         # Validate that user provided a single quoted prompt (not multiple unquoted words)
-        if len(sys.argv) > 2:
+        if len(args) > 1:
             print("Error: Prompt must be in double quotes.", file=sys.stderr)
             print(f'Usage: autocmd "your prompt here"', file=sys.stderr)
             print(f'   or: autocmd """your multiline prompt here"""', file=sys.stderr)
+            print(f'   or: autocmd --no-cache "your prompt here"', file=sys.stderr)
+            print(f'   or: autocmd --timings "your prompt here"', file=sys.stderr)
             print(f'   or: autocmd --settings', file=sys.stderr)
+            print(f'   or: autocmd --daemon', file=sys.stderr)
+            print(f'   or: autocmd --serve-stdio', file=sys.stderr)
+            print(f'   or: autocmd --batch prompts.jsonl', file=sys.stderr)
+            print(f'   or: autocmd --patterns', file=sys.stderr)
+            print(f'   or: autocmd --history "words to search for"', file=sys.stderr)
+            print(f'   or: autocmd --stats [--prometheus]', file=sys.stderr)
+            print(f'   or: autocmd --prefetch "your prompt here"', file=sys.stderr)
             print(f'   or: autocmd --reset', file=sys.stderr)
             sys.exit(1)
-        user_prompt = sys.argv[1]
+        user_prompt = args[0]
 
     streaming_enabled = get_setting("streaming", "true") == "true"
     provider_name = get_provider_name()
+    use_cache = "--no-cache" not in flags and get_setting("cache", "true") == "true"
+    shell = os.environ.get('SHELL', 'bash')
+    trace.mark("settings")
+    spool = None
 
     try:
-        # Get API key from settings if not in environment
-        api_key = None
-        if provider_name in PROVIDERS:
-            env_var = PROVIDERS[provider_name].env_var_name()
-            if not os.environ.get(env_var):
-                api_key = get_setting("api_key")
-
-        # Get model from settings or environment
-        model = os.environ.get("AUTOCMD_MODEL") or get_setting("model") or None
-
-        provider = get_provider(provider_name=provider_name, api_key=api_key, model=model)
-        prompt = f"You are a command-line assistant. Convert the user's request to a single {os.environ.get('SHELL', 'bash')} command. Output ONLY the command, nothing else - no explanations, no markdown, no options, no alternatives. Just the one best command. Note: This tool is called 'autocmd' (package: autocmd-cli), so if asked to upgrade itself, use 'uv tool upgrade autocmd-cli' or 'pip install --upgrade autocmd-cli'.\n\nRequest: {user_prompt}"
-
-        if streaming_enabled:
-            full_response = ""
-            for text in provider.generate_stream(prompt, max_tokens=200):
-                if hasattr(sys.stderr, 'buffer'):
-                    sys.stderr.buffer.write(text.encode('utf-8'))
-                    sys.stderr.buffer.flush()
-                else:
-                    print(text, end="", flush=True, file=sys.stderr)
-                full_response += text
-
-            # Clear the streamed output
-            if sys.stderr.isatty():
-                num_lines = full_response.count('\n')
-                if num_lines > 0:
-                    print(f"\033[{num_lines}A", end="", file=sys.stderr)
-                print("\r\033[J", end="", file=sys.stderr, flush=True)
-            else:
-                print("", file=sys.stderr)
+        # Formulaic requests are answered from local patterns with no API call at all
+        local_cmd = resolve_locally(user_prompt) if use_cache else None
+        trace.mark("patterns")
+        if local_cmd:
+            print(local_cmd)
+            return
+
+        # Take the command generated while the prompt was typed, waiting for it if it is on its way
+        spool = get_prefetch_spool() if "--no-cache" not in flags else None
+        if spool is not None:
+            prefetched = take_prefetched(spool, user_prompt, shell, os.getcwd(), provider_name, resolve_model())
+            trace.mark("prefetch")
+            if prefetched:
+                print(prefetched)
+                return
 
-            cmd = re.sub(r'^```\w*\n?|```$', '', full_response).strip()
-            if not cmd:
-                print("No command generated", file=sys.stderr)
-                sys.exit(1)
-            print(cmd)
+        # Hand the request to a running daemon; fall back to a one-shot call if there is none
+        sock = None
+        if "--client" in flags:
+            from . import client as daemon_client
+            sock = daemon_client.connect(get_daemon_socket())
+        cache_key = None
+        collector = None
+
+        if sock is not None:
+            client = daemon_client.DaemonClient(sock)
+            tokens = client.stream(dict(
+                daemon_client.request_overrides(),
+                prompt=user_prompt, shell=shell, cwd=os.getcwd(), no_cache=not use_cache,
+            ))
+            if streaming_enabled:
+                stream_to_stderr(tokens)
+            else:
+                for _ in tokens:
+                    pass
+            cmd = client.command or ""
+            if client.similar_to:
+                print_similar_notice(client.similar_to)
+            trace.mark("daemon")
         else:
-            response = provider.generate(prompt, max_tokens=200)
-            cmd = re.sub(r'^```\w*\n?|```$', '', response).strip()
-            if not cmd:
-                print("No command generated", file=sys.stderr)
-                sys.exit(1)
-            print(cmd)
+            model = resolve_model()
+
+            # Serve repeated requests from the local cache before touching any SDK
+            scope = cache_scope(shell, os.getcwd())
+            if use_cache:
+                cache_key, cached = lookup_cache(user_prompt, provider_name, model, scope)
+                trace.mark("cache")
+                if cached:
+                    print(cached)
+                    record_served("cache")
+                    return
+                # Then reuse the command from an earlier request worded differently
+                similar = lookup_similar(user_prompt, scope)
+                trace.mark("similar")
+                if similar:
+                    print_similar_notice(similar[1])
+                    print(similar[0])
+                    store_cache(cache_key, similar[0])
+                    record_served("similar")
+                    return
+
+            # Git status finishes in the background while the request is sent
+            collector = get_context_collector()
+            context = collector.collect(os.getcwd()) if collector else ""
+            trace.mark("context")
+
+            provider = create_provider(provider_name, model)
+            trace.mark("provider")
+            trace.annotate(provider=provider_name, model=provider.model, transport=provider.transport)
+            prompt = build_prompt(user_prompt, context)
+            system = build_system_prompt(shell)
+
+            max_tokens = budget_max_tokens(user_prompt)
+
+            timing = {}
+            usage = {}
+            # The SDK import is start-up time, not the provider's latency
+            provider.prepare()
+            start = time.monotonic()
+            try:
+                if streaming_enabled:
+                    # Stop reading as soon as a complete command has arrived
+                    parser = CommandParser()
+                    stream_to_stderr(parser.consume(time_stream(
+                        provider.generate_stream(prompt, max_tokens=max_tokens, system=system,
+                                                 **usage_kwargs(provider, usage)),
+                        timing,
+                    )))
+                    cmd = parser.command
+                else:
+                    response = provider.generate(prompt, max_tokens=max_tokens, system=system,
+                                                 **usage_kwargs(provider, usage))
+                    cmd = parse_command(response)
+            except Exception as e:
+                record_failure(provider, e)
+                raise
+            trace.mark("stream" if streaming_enabled else "response")
+            end = time.monotonic()
+            record_success(provider, start, timing.get("first"), end, usage)
+
+        if not cmd:
+            print("No command generated", file=sys.stderr)
+            sys.exit(1)
+        print(cmd)
+        store_cache(cache_key, cmd)
+        if sock is None:
+            store_similar(user_prompt, scope, cmd)
+            record_history(user_prompt, cmd, provider_name, provider, end - start, shell, os.getcwd(), usage)
+        if collector:
+            collector.finish()
 
     except KeyboardInterrupt:
         print("\nCancelled", file=sys.stderr)
@@ -369,15 +1276,21 @@ def main() -> None:
         sys.exit(1)
     except Exception as e:
         error_msg = str(e)
-        if "api_key" in error_msg.lower() or "authentication" in error_msg.lower() or "unauthorized" in error_msg.lower():
+        if is_connection_error(e):
+            print(f"Error: Network connection failed. Check your internet connection.", file=sys.stderr)
+        elif "api_key" in error_msg.lower() or "authentication" in error_msg.lower() or "unauthorized" in error_msg.lower():
             print(f"Error: Invalid API key. Run 'autocmd --settings' to reconfigure.", file=sys.stderr)
-        elif "rate" in error_msg.lower() or "quota" in error_msg.lower():
+        elif is_rate_limit_error(e) or "quota" in error_msg.lower():
             print(f"Error: API rate limit or quota exceeded. Please try again later.", file=sys.stderr)
         elif "network" in error_msg.lower() or "connection" in error_msg.lower():
             print(f"Error: Network connection failed. Check your internet connection.", file=sys.stderr)
         else:
             print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        if spool is not None:
+            # Release this request's claim on the prompt
+            spool.complete(user_prompt, shell, os.getcwd(), None)
 
 if __name__ == "__main__":
     main()
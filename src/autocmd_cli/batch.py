@@ -0,0 +1,204 @@
+"""
+Batch mode for autocmd.
+
+Reads prompts as JSONL (one object or string per line) and generates commands
+with bounded concurrency on a single event loop, writing one JSONL result per
+prompt. Input is read lazily and at most `buffer` results are held waiting for
+in-order output, so memory stays flat regardless of input size.
+
+Input lines:  "find big files"  or  {"prompt": "...", "id": ..., "provider": ..., "model": ...}
+Output lines: {"index": 0, "id": ..., "prompt": ..., "command": ..., "provider": ...,
+               "model": ..., "latency_ms": ..., "attempts": 1}
+              or the same with "error" in place of "command".
+"""
+
+import asyncio
+import json
+import random
+import time
+from typing import Any, Callable, Dict, IO, List, Optional, Set
+
+from .llm_providers import LLMProvider, is_rate_limit_error, retry_after
+from .output import budget_max_tokens
+from .stats import BUCKETS_MS, bucket_index, histogram_percentile
+
+ProviderFactory = Callable[[str, Optional[str]], LLMProvider]
+
+
+class BatchSummary:
+    """Counters for a finished batch run."""
+
+    def __init__(self):
+        self.total = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+        self.elapsed = 0.0
+        # A fixed-size histogram rather than every latency, so long runs stay flat in memory
+        self.latency_hist: List[int] = [0] * (len(BUCKETS_MS) + 1)
+
+    def add_latency(self, ms: float) -> None:
+        self.latency_hist[bucket_index(ms)] += 1
+
+    def format(self) -> str:
+        rate = self.total / self.elapsed if self.elapsed else 0.0
+        line = (
+            f"{self.total} prompts, {self.succeeded} ok, {self.failed} failed, "
+            f"{self.retries} retries in {self.elapsed:.1f}s ({rate:.1f} prompts/s)"
+        )
+        if any(self.latency_hist):
+            # Upper bounds of the buckets the percentiles fall in
+            p50, p95 = (histogram_percentile(self.latency_hist, q) for q in (0.5, 0.95))
+            line += f", latency p50 <={p50:g}ms p95 <={p95:g}ms"
+        return line
+
+
+def parse_item(line: str) -> Dict[str, Any]:
+    """Parse one input line into a request dict with at least a prompt."""
+    item = json.loads(line)
+    if isinstance(item, str):
+        item = {"prompt": item}
+    if not isinstance(item, dict) or not isinstance(item.get("prompt"), str) or not item["prompt"].strip():
+        raise ValueError("each line must be a string or an object with a non-empty 'prompt'")
+    return item
+
+
+class BatchRunner:
+    """Runs prompts through providers with bounded concurrency and retries."""
+
+    def __init__(
+        self,
+        make_provider: ProviderFactory,
+        default_provider: str,
+        build_prompt: Callable[[str], str],
+        extract_command: Callable[[str], str],
+        concurrency: int = 8,
+        ordered: bool = True,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        timeout: float = 60.0,
+        system: Optional[str] = None,
+    ):
+        self.make_provider = make_provider
+        self.default_provider = default_provider
+        self.build_prompt = build_prompt
+        self.extract_command = extract_command
+        self.concurrency = max(1, concurrency)
+        self.ordered = ordered
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.system = system
+        # Results waiting on a slower earlier item count against this limit
+        self.buffer = self.concurrency * 4
+        self.summary = BatchSummary()
+        self._providers: Dict[Any, LLMProvider] = {}
+
+    def _provider(self, name: str, model: Optional[str]) -> LLMProvider:
+        provider = self._providers.get((name, model))
+        if provider is None:
+            provider = self._providers[(name, model)] = self.make_provider(name, model)
+        return provider
+
+    async def _process(self, index: int, line: str) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"index": index}
+        try:
+            item = parse_item(line)
+        except ValueError as e:
+            result["error"] = f"Invalid input line: {e}"
+            return result
+
+        for key in ("id", "prompt"):
+            if key in item:
+                result[key] = item[key]
+
+        attempts = 0
+        start = time.monotonic()
+        try:
+            result["provider"] = item.get("provider") or self.default_provider
+            provider = self._provider(result["provider"], item.get("model"))
+            result["model"] = provider.model
+            while True:
+                attempts += 1
+                try:
+                    response = await provider.agenerate(
+                        self.build_prompt(item["prompt"]),
+                        max_tokens=budget_max_tokens(item["prompt"]),
+                        timeout=self.timeout,
+                        system=self.system,
+                    )
+                    break
+                except Exception as e:
+                    if not is_rate_limit_error(e) or attempts > self.max_retries:
+                        raise
+                    self.summary.retries += 1
+                    delay = retry_after(e) or min(self.backoff * 2 ** attempts, 60) * (0.5 + random.random())
+                    await asyncio.sleep(delay)
+            result["command"] = self.extract_command(response)
+        except asyncio.TimeoutError:
+            result["error"] = f"Timed out after {self.timeout:g}s"
+        except Exception as e:
+            result["error"] = str(e) or type(e).__name__
+
+        latency = (time.monotonic() - start) * 1000
+        result["latency_ms"] = round(latency, 1)
+        result["attempts"] = attempts
+        if "command" in result:
+            self.summary.add_latency(latency)
+        return result
+
+    def _record(self, result: Dict[str, Any]) -> None:
+        if "error" in result:
+            self.summary.failed += 1
+        else:
+            self.summary.succeeded += 1
+
+    async def run(self, source: IO[str], write: Callable[[Dict[str, Any]], None]) -> BatchSummary:
+        """Process every line of source, calling write for each result."""
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        in_flight: Set["asyncio.Future[Dict[str, Any]]"] = set()
+        waiting: Dict[int, Dict[str, Any]] = {}
+        next_index = 0
+
+        def emit(done: Set["asyncio.Future[Dict[str, Any]]"]) -> None:
+            nonlocal next_index
+            for future in done:
+                result = future.result()
+                self._record(result)
+                if self.ordered:
+                    waiting[result["index"]] = result
+                else:
+                    write(result)
+            while next_index in waiting:
+                write(waiting.pop(next_index))
+                next_index += 1
+
+        async def wait_one() -> None:
+            nonlocal in_flight
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            emit(done)
+
+        try:
+            index = 0
+            while True:
+                # Read off the event loop so in-flight requests keep progressing on a slow stdin
+                line = await loop.run_in_executor(None, source.readline)
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                while len(in_flight) >= self.concurrency or len(in_flight) + len(waiting) >= self.buffer:
+                    await wait_one()
+                in_flight.add(asyncio.ensure_future(self._process(index, line)))
+                index += 1
+            while in_flight:
+                await wait_one()
+            self.summary.total = index
+        finally:
+            for future in in_flight:
+                future.cancel()
+            for provider in self._providers.values():
+                await provider.aclose()
+            self.summary.elapsed = time.monotonic() - start
+        return self.summary
@@ -0,0 +1,101 @@
+"""
+On-disk response cache for autocmd.
+
+Generated commands are stored in a small SQLite database so that repeating
+the exact same request skips the provider round trip entirely. Entries are
+evicted by age (TTL) and by count, least recently used first. SQLite's WAL
+mode keeps concurrent reads and writes from many terminals safe.
+"""
+
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1000
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so trivially different requests share an entry."""
+    return " ".join(prompt.split())
+
+
+def make_key(prompt: str, provider: str, model: str, shell: str) -> str:
+    """Build the cache key for a request."""
+    raw = "\0".join([normalize_prompt(prompt), provider, model, shell])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU cache of generated commands with TTL and size limits."""
+
+    def __init__(self, path: Path, ttl: int = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, command TEXT NOT NULL, "
+            "created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached command for key, or None on a miss."""
+        if not self.path.exists():
+            return None
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT command, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            command, created = row
+            if now - created > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            return command
+        finally:
+            conn.close()
+
+    def put(self, key: str, command: str) -> None:
+        """Store a command and evict expired and least recently used entries."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, command, created, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (key, command, now, now),
+            )
+            conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        if not self.path.exists():
+            return
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM responses")
+        finally:
+            conn.close()
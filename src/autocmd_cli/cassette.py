@@ -0,0 +1,189 @@
+"""
+Record and replay provider streams.
+
+Live provider timings are too noisy to catch regressions in autocmd's own
+overhead. RecordingProvider wraps a real provider and appends every request it
+serves to a cassette: one JSON line per request with the prompt, a hash of the
+system prompt and the streamed chunks, each with the milliseconds since the
+previous one (or since the request, for the first). ReplayProvider serves those
+streams back offline, matched by prompt and system prompt, at the recorded
+speed, faster, or with no delay at all.
+
+Set AUTOCMD_CASSETTE to a file and AUTOCMD_CASSETTE_MODE to `record` or
+`replay` (the default) to use them in place of the configured provider;
+AUTOCMD_CASSETTE_SPEED scales replay (1 recorded speed, 10 ten times faster,
+0 no delay).
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from .llm_providers import LLMProvider, usage_kwargs
+
+VERSION = 1
+
+
+class ReplayError(Exception):
+    """A provider error captured in a cassette, raised again on replay."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def request_key(prompt: str, system: Optional[str]) -> Tuple[str, str]:
+    """What a replayed request is matched on: the user prompt and a hash of the instructions."""
+    return prompt, hashlib.sha1((system or "").encode("utf-8")).hexdigest()[:16]
+
+
+class Cassette:
+    """A JSON-lines file of recorded provider interactions."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, interaction: Dict[str, Any]) -> None:
+        line = json.dumps(dict(interaction, v=VERSION), ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def load(self) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+        """Recorded interactions by request key, in recording order."""
+        interactions = defaultdict(list)
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    interaction = json.loads(line)
+                    interactions[(interaction["prompt"], interaction["system"])].append(interaction)
+        return interactions
+
+
+class RecordingProvider(LLMProvider):
+    """Passes requests through to a provider and records its streams to a cassette."""
+
+    reports_usage = True
+
+    def __init__(self, inner: LLMProvider, path: Path):
+        self.inner = inner
+        self.cassette = Cassette(path)
+        super().__init__(inner.api_key, inner.model)
+        self.transport = inner.transport
+
+    def default_model(self) -> str:
+        return self.inner.default_model()
+
+    @classmethod
+    def env_var_name(cls) -> str:
+        return "AUTOCMD_CASSETTE"
+
+    def prepare(self) -> None:
+        self.inner.prepare()
+
+    def close(self) -> None:
+        self.inner.close()
+
+    def generate(self, prompt: str, max_tokens: int = 200, system: Optional[str] = None,
+                 usage: Optional[Dict[str, int]] = None) -> str:
+        return "".join(self.generate_stream(prompt, max_tokens, system, usage))
+
+    def generate_stream(self, prompt: str, max_tokens: int = 200, system: Optional[str] = None,
+                        usage: Optional[Dict[str, int]] = None) -> Iterator[str]:
+        chunks: List[List[Any]] = []
+        error = None
+        last = time.monotonic()
+        stream = self.inner.generate_stream(prompt, max_tokens, system, **usage_kwargs(self.inner, usage))
+        try:
+            for text in stream:
+                now = time.monotonic()
+                chunks.append([round((now - last) * 1000, 2), text])
+                last = now
+                yield text
+        except Exception as e:
+            error = {"message": str(e), "status_code": getattr(e, "status_code", None),
+                     "after_ms": round((time.monotonic() - last) * 1000, 2)}
+            raise
+        finally:
+            # Also when the caller stops early: the replay then ends where the caller stopped reading
+            stream.close()
+            prompt_key, system_key = request_key(prompt, system)
+            interaction = {"prompt": prompt_key, "system": system_key, "model": self.inner.model,
+                           "provider": type(self.inner).__name__, "max_tokens": max_tokens, "chunks": chunks}
+            if error:
+                interaction["error"] = error
+            self.cassette.append(interaction)
+
+
+class ReplayProvider(LLMProvider):
+    """Serves recorded streams from a cassette, without any network access.
+
+    speed scales the recorded delays: 1 replays at the recorded speed, 10 ten
+    times faster and 0 with no delay. Requests are matched by prompt and system
+    prompt, or by prompt alone if the instructions have changed since; repeated
+    requests replay their recordings in turn, cycling.
+    """
+
+    def __init__(self, path: Path, speed: float = 1.0, model: Optional[str] = None):
+        self.cassette = Cassette(path)
+        self.speed = speed
+        self._interactions: Optional[Dict[Tuple[str, Optional[str]], Deque[Dict[str, Any]]]] = None
+        self._lock = threading.Lock()
+        super().__init__("", model)
+        self.transport = "replay"
+
+    def default_model(self) -> str:
+        return "replay"
+
+    @classmethod
+    def env_var_name(cls) -> str:
+        return "AUTOCMD_CASSETTE"
+
+    def close(self) -> None:
+        pass
+
+    def _next_for(self, key: Optional[Tuple[str, str]]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self._interactions is None:
+                self._interactions = {}
+                for (prompt, system), recorded in self.cassette.load().items():
+                    self._interactions[prompt, system] = deque(recorded)
+                    # Fallback for when only the instructions have changed since recording
+                    self._interactions.setdefault((prompt, None), deque()).extend(recorded)
+            if key is None:
+                return None
+            recorded = self._interactions.get(key) or self._interactions.get((key[0], None))
+            if not recorded:
+                raise LookupError(f"No recording in {self.cassette.path} for request: {key[0]!r}")
+            recorded.rotate(-1)
+            return recorded[-1]
+
+    def generate(self, prompt: str, max_tokens: int = 200, system: Optional[str] = None) -> str:
+        return "".join(self.generate_stream(prompt, max_tokens, system))
+
+    def generate_stream(self, prompt: str, max_tokens: int = 200, system: Optional[str] = None) -> Iterator[str]:
+        interaction = self._next_for(request_key(prompt, system))
+        # Sleep to an absolute schedule so per-chunk overhead doesn't accumulate as drift
+        due = time.monotonic()
+        for delay_ms, text in interaction["chunks"]:
+            due = self._wait(due, delay_ms)
+            yield text
+        error = interaction.get("error")
+        if error:
+            self._wait(due, error.get("after_ms", 0))
+            raise ReplayError(error["message"], error.get("status_code"))
+
+    def _wait(self, due: float, delay_ms: float) -> float:
+        if self.speed <= 0:
+            return due
+        due += delay_ms / 1000 / self.speed
+        remaining = due - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        return due
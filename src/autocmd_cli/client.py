@@ -0,0 +1,142 @@
+"""
+Client side of the daemon protocol (see daemon.py).
+
+The shell wrapper runs this file directly, as `python -S .../client.py SOCKET
+PROMPT`, when the daemon's socket exists. Run that way it loads neither the
+package nor site-packages, only the standard library modules below and
+render.py, so a request through the daemon pays for a bare interpreter
+start-up and nothing else. It exits with EX_TEMPFAIL (75) when the daemon is
+not answering or the arguments need the full CLI, and the wrapper then falls
+back to a one-shot `autocmd`.
+"""
+
+import json
+import os
+import socket
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+try:
+    from .render import StreamRenderer
+except ImportError:
+    # Run as a script: the package directory is on sys.path instead of the package
+    from render import StreamRenderer
+
+EX_TEMPFAIL = 75
+
+
+def connect(socket_path: Union[str, "os.PathLike[str]"], timeout: float = 0.2) -> Optional[socket.socket]:
+    """Connect to a running daemon, or return None if there is none."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(os.fspath(socket_path))
+    except OSError:
+        sock.close()
+        return None
+    sock.settimeout(None)
+    return sock
+
+
+class DaemonClient:
+    """Sends one request over a connected socket and streams the reply."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.command: Optional[str] = None
+        # The earlier prompt whose command was reused, if it was
+        self.similar_to: Optional[str] = None
+
+    def stream(self, payload: Dict[str, Any]) -> Iterator[str]:
+        """Yield streamed tokens; the final command is left in self.command."""
+        rfile = self.sock.makefile("rb")
+        try:
+            self.sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+            for line in rfile:
+                message = json.loads(line)
+                if "token" in message:
+                    yield message["token"]
+                elif "error" in message:
+                    raise RuntimeError(message["error"])
+                else:
+                    self.command = message.get("command", "")
+                    self.similar_to = message.get("similar_to")
+                    return
+            raise RuntimeError("autocmd daemon closed the connection")
+        finally:
+            rfile.close()
+            self.sock.close()
+
+
+def request_overrides() -> Dict[str, str]:
+    """The client's provider and model environment variables, which the daemon honours per request."""
+    overrides = {}
+    for field, name in (("provider", "AUTOCMD_PROVIDER"), ("model", "AUTOCMD_MODEL")):
+        if os.environ.get(name):
+            overrides[field] = os.environ[name]
+    return overrides
+
+
+def _streaming_enabled(settings_file: str) -> bool:
+    # The settings module can't be imported from here; the file is plain key=value lines
+    settings = {}
+    try:
+        with open(settings_file) as f:
+            for line in f:
+                if "=" in line:
+                    key, value = line.split("=", 1)
+                    settings[key.strip()] = value.strip()
+    except OSError:
+        pass
+    return settings.get("streaming", "true") == "true"
+
+
+def run(argv: List[str]) -> int:
+    """Send `PROMPT` to the daemon on `SOCKET` and print the command; argv is [SOCKET, PROMPT]."""
+    if len(argv) != 2:
+        return EX_TEMPFAIL
+    socket_path, text = argv
+    if text.startswith("--"):
+        # Flags are for the full CLI
+        return EX_TEMPFAIL
+    if '"""' in text:
+        parts = text.split('"""')
+        if len(parts) < 3:
+            return EX_TEMPFAIL
+        text = parts[1]
+
+    sock = connect(socket_path)
+    if sock is None:
+        return EX_TEMPFAIL
+    client = DaemonClient(sock)
+    payload = dict(request_overrides(), prompt=text, shell=os.environ.get("SHELL", "bash"), cwd=os.getcwd())
+    tokens = client.stream(payload)
+    try:
+        if _streaming_enabled(os.path.join(os.path.dirname(socket_path), "settings")):
+            renderer = StreamRenderer(sys.stderr)
+            try:
+                for token in tokens:
+                    renderer.write(token)
+            finally:
+                renderer.clear()
+        else:
+            for _ in tokens:
+                pass
+    except KeyboardInterrupt:
+        print("\nCancelled", file=sys.stderr)
+        return 130
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if client.similar_to:
+        print(f'autocmd: reusing the command for "{client.similar_to}" (similar)', file=sys.stderr)
+    if not client.command:
+        print("No command generated", file=sys.stderr)
+        return 1
+    print(client.command)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run(sys.argv[1:]))
@@ -0,0 +1,252 @@
+"""
+Working-directory context for the prompt.
+
+Without context the model has to guess file names, the git branch and which
+tools are installed, and a wrong guess costs a second request. The collector
+gathers a short summary of the current directory, the git repository it is in
+and the relevant tools on PATH, within a time budget of a few milliseconds and
+a character budget for the prompt.
+
+Results are cached in `context.json` per directory and per PATH entry, keyed
+by their mtimes, so a warm collection is a handful of stat() calls. `git
+status` is the one expensive step: it runs in the background while the request
+is in flight, finish() gives it at most FINISH_WAIT more once the command is
+out (the shell's `$(...)` waits for autocmd to exit), and its result is cached
+for the next request in the same repository (until the index or HEAD changes,
+or it is STATUS_TTL old).
+Anything that does not fit in the budget is left out rather than waited for.
+"""
+
+import json
+import os
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .fileutil import atomic_write
+
+DEFAULT_BUDGET_MS = 5.0
+DEFAULT_MAX_CHARS = 600
+MAX_LISTING = 40
+MAX_CACHED_DIRS = 200
+STATUS_TTL = 30.0
+# How long after it started finish() may wait for a background `git status`
+STATUS_WAIT = 1.0
+# ... and at most this long once called, which is after the command is printed
+FINISH_WAIT = 0.05
+
+# Tools a command might prefer over a standard one, or that a request may be about
+TOOLS = (
+    "rg", "fd", "fzf", "jq", "yq", "bat", "eza", "gsed", "gawk", "git", "gh", "docker", "podman", "kubectl",
+    "python3", "node", "npm", "pnpm", "yarn", "bun", "cargo", "go", "make", "uv", "brew", "apt", "dnf",
+    "pacman", "rsync", "curl", "wget", "ffmpeg", "magick", "convert", "lsof", "ss", "systemctl",
+)
+_GIT_OPERATIONS = (
+    ("MERGE_HEAD", "merging"), ("rebase-merge", "rebasing"), ("rebase-apply", "rebasing"),
+    ("CHERRY_PICK_HEAD", "cherry-picking"), ("BISECT_LOG", "bisecting"),
+)
+
+
+def _mtime(path: Path) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def find_git_dir(cwd: Path) -> Optional[Tuple[Path, Path]]:
+    """Return (work tree root, git dir) for the repository containing cwd, if any."""
+    for directory in (cwd, *cwd.parents):
+        dot_git = directory / ".git"
+        if dot_git.is_dir():
+            return directory, dot_git
+        if dot_git.is_file():
+            # Worktrees and submodules point at their git dir
+            try:
+                target = dot_git.read_text().partition("gitdir:")[2].strip()
+            except OSError:
+                return None
+            return directory, (directory / target).resolve()
+    return None
+
+
+def git_head(git_dir: Path) -> str:
+    """Branch name, or the short commit when HEAD is detached, read without running git."""
+    try:
+        head = (git_dir / "HEAD").read_text().strip()
+    except OSError:
+        return ""
+    if head.startswith("ref: refs/heads/"):
+        return head[len("ref: refs/heads/"):]
+    if head.startswith("ref: "):
+        return head[len("ref: "):]
+    return f"detached at {head[:8]}"
+
+
+def summarize_status(porcelain: str) -> str:
+    """Turn `git status --porcelain` output into "2 staged, 1 modified, 3 untracked: a.py b.py ..."."""
+    counts = {"staged": 0, "modified": 0, "untracked": 0}
+    paths = []
+    for line in porcelain.splitlines():
+        if len(line) < 4:
+            continue
+        index, worktree, path = line[0], line[1], line[3:]
+        if index == "?":
+            counts["untracked"] += 1
+        else:
+            counts["staged"] += index != " "
+            counts["modified"] += worktree != " "
+        paths.append(path)
+    if not paths:
+        return "clean"
+    summary = ", ".join(f"{count} {name}" for name, count in counts.items() if count)
+    return f"{summary}: {' '.join(paths[:8])}{' ...' if len(paths) > 8 else ''}"
+
+
+class ContextCollector:
+    """Builds the context section of the prompt, caching what it can between runs."""
+
+    def __init__(self, cache_path: Optional[Path] = None, budget_ms: float = DEFAULT_BUDGET_MS,
+                 max_chars: int = DEFAULT_MAX_CHARS):
+        self.cache_path = cache_path
+        self.budget = budget_ms / 1000
+        self.max_chars = max_chars
+        self._cache: Optional[Dict[str, Any]] = None
+        self._dirty = False
+        self._status: Optional[Tuple[str, list, subprocess.Popen, float]] = None
+
+    def _load(self) -> Dict[str, Any]:
+        if self._cache is None:
+            try:
+                self._cache = json.loads(self.cache_path.read_text()) if self.cache_path else {}
+            except (OSError, ValueError):
+                self._cache = {}
+            for section in ("dirs", "repos", "path"):
+                self._cache.setdefault(section, {})
+        return self._cache
+
+    def collect(self, cwd: str) -> str:
+        """Return the context for cwd, or "" if nothing could be gathered in time."""
+        deadline = time.monotonic() + self.budget
+        cwd_path = Path(cwd)
+        lines = [f"Working directory: {cwd}"]
+        repo = find_git_dir(cwd_path)
+        if repo is not None:
+            lines.append(self._git(*repo))
+        steps = (lambda: self._listing(cwd_path), lambda: self._tools(deadline))
+        for step in steps:
+            if time.monotonic() > deadline:
+                break
+            line = step()
+            if line:
+                lines.append(line)
+        return self._fit(lines)
+
+    def _fit(self, lines: List[str]) -> str:
+        """Keep whole lines in order, cutting the last one short, within max_chars."""
+        kept, used = [], 0
+        for line in lines:
+            room = self.max_chars - used
+            if room <= 0:
+                break
+            if len(line) > room:
+                line = line[:max(room - 4, 0)].rsplit(" ", 1)[0] + " ..."
+            kept.append(line)
+            used += len(line) + 1
+        return "\n".join(kept)
+
+    def _git(self, root: Path, git_dir: Path) -> str:
+        line = f"Git: branch {git_head(git_dir)}"
+        line += "".join(f", {state}" for name, state in _GIT_OPERATIONS if (git_dir / name).exists())
+        signature = [_mtime(git_dir / "index"), _mtime(git_dir / "HEAD")]
+        cached = self._load()["repos"].get(str(root))
+        if cached and cached["signature"] == signature and time.time() - cached["time"] < STATUS_TTL:
+            return f"{line}; status: {cached['status']}"
+        # Too slow to wait for: refresh it in the background for the next request
+        try:
+            process = subprocess.Popen(
+                ["git", "-C", str(root), "status", "--porcelain"],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, stdin=subprocess.DEVNULL, text=True,
+            )
+        except OSError:
+            return line
+        self._status = (str(root), signature, process, time.monotonic())
+        return line
+
+    def _remember(self, section: str, key: str, value: Dict[str, Any]) -> None:
+        """Store a cache entry, dropping the least recently stored ones past MAX_CACHED_DIRS."""
+        entries = self._load()[section]
+        entries.pop(key, None)
+        entries[key] = value
+        while len(entries) > MAX_CACHED_DIRS:
+            del entries[next(iter(entries))]
+        self._dirty = True
+
+    def _listing(self, cwd: Path) -> str:
+        dirs = self._load()["dirs"]
+        key, signature = str(cwd), _mtime(cwd)
+        cached = dirs.get(key)
+        if cached and cached["signature"] == signature:
+            return cached["listing"]
+        names = []
+        total = 0
+        try:
+            with os.scandir(cwd) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    total += 1
+                    if len(names) < MAX_LISTING:
+                        names.append(entry.name + ("/" if entry.is_dir() else ""))
+        except OSError:
+            return ""
+        names.sort()
+        listing = f"Files ({total}): {' '.join(names)}{' ...' if total > len(names) else ''}" if total else ""
+        self._remember("dirs", key, {"signature": signature, "listing": listing})
+        return listing
+
+    def _tools(self, deadline: float) -> str:
+        wanted = set(TOOLS)
+        found = set()
+        cached_path = self._load()["path"]
+        for directory in os.environ.get("PATH", "").split(os.pathsep):
+            if not directory:
+                continue
+            if time.monotonic() > deadline:
+                # The directories listed so far stay cached, so the next request gets further
+                break
+            signature = _mtime(Path(directory))
+            cached = cached_path.get(directory)
+            if cached is None or cached["signature"] != signature:
+                try:
+                    present = sorted(wanted.intersection(os.listdir(directory)))
+                except OSError:
+                    present = []
+                cached = cached_path[directory] = {"signature": signature, "tools": present}
+                self._dirty = True
+            found.update(cached["tools"])
+        return f"Tools: {' '.join(tool for tool in TOOLS if tool in found)}" if found else ""
+
+    def finish(self, wait: float = FINISH_WAIT) -> None:
+        """Collect a background `git status` if it finishes within wait seconds and save the cache."""
+        if self._status is not None:
+            root, signature, process, started = self._status
+            self._status = None
+            # communicate() drains the pipe, which a large repository's status would otherwise fill and block on
+            remaining = max(min(started + STATUS_WAIT - time.monotonic(), wait), 0.01)
+            try:
+                output, _ = process.communicate(timeout=remaining)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+            else:
+                if process.returncode == 0:
+                    status = summarize_status(output)
+                    self._remember("repos", root, {"signature": signature, "time": time.time(), "status": status})
+        if self._dirty and self.cache_path is not None:
+            self._dirty = False
+            try:
+                atomic_write(self.cache_path, json.dumps(self._cache))
+            except OSError:
+                pass
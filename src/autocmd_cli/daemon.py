@@ -0,0 +1,111 @@
+"""
+Resident daemon mode for autocmd.
+
+`autocmd --daemon` keeps one Python process alive behind a Unix domain socket
+so shell invocations skip interpreter start-up, SDK imports and connection
+set-up. The protocol is line-delimited JSON:
+
+    client -> daemon:  {"prompt": "...", "shell": "/bin/zsh", "cwd": "...", "no_cache": false,
+                        "provider": "...", "model": "..."}   (provider and model are optional)
+    daemon -> client:  {"token": "..."}   (zero or more, while streaming)
+                       {"command": "..."} or {"error": "..."}
+
+A command reused from a similar earlier prompt carries that prompt in
+"similar_to".
+
+Closing the connection cancels the request; the daemon stops reading from the
+provider as soon as it notices.
+"""
+
+import json
+import os
+import signal
+import socketserver
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from .client import DaemonClient, connect  # noqa: F401  (the client side of the protocol)
+
+Handler = Callable[[Dict[str, Any], Callable[[Dict[str, Any]], None], threading.Event], None]
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            payload = json.loads(line)
+        except ValueError:
+            self._send({"error": "Malformed request"})
+            return
+
+        cancelled = threading.Event()
+        threading.Thread(target=self._watch_disconnect, args=(cancelled,), daemon=True).start()
+
+        try:
+            self.server.handler(payload, self._send, cancelled)
+        except (BrokenPipeError, ConnectionResetError):
+            cancelled.set()
+        except Exception as e:
+            try:
+                self._send({"error": str(e)})
+            except OSError:
+                pass
+
+    def _watch_disconnect(self, cancelled: threading.Event) -> None:
+        # The client sends nothing after its request, so EOF means it went away (e.g. Ctrl-C)
+        try:
+            self.connection.recv(1)
+        except OSError:
+            pass
+        cancelled.set()
+
+    def _send(self, message: Dict[str, Any]) -> None:
+        self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, handler: Handler):
+        self.handler = handler
+        super().__init__(path, _RequestHandler)
+
+
+def create_server(socket_path: Path, handler: Handler) -> socketserver.BaseServer:
+    """Bind a daemon server to socket_path, replacing a stale socket file."""
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    if socket_path.exists():
+        if connect(socket_path) is not None:
+            raise RuntimeError(f"autocmd daemon already running on {socket_path}")
+        socket_path.unlink()
+
+    old_umask = os.umask(0o077)
+    try:
+        server = _Server(str(socket_path), handler)
+    finally:
+        os.umask(old_umask)
+    return server
+
+
+def serve(socket_path: Path, handler: Handler, ready: Optional[Callable[[], None]] = None) -> None:
+    """Serve requests on socket_path until interrupted; ready is called once the socket is bound."""
+    server = create_server(socket_path, handler)
+
+    def _stop(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        if ready is not None:
+            ready()
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            socket_path.unlink()
+        except FileNotFoundError:
+            pass
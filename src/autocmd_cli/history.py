@@ -0,0 +1,158 @@
+"""
+Searchable history of generated commands.
+
+Every command a provider generates is appended to a SQLite log next to the
+response cache, with its prompt, provider, model, latency and time. The words
+of the prompt and the command also go into an inverted index (word -> entry
+ids, clustered by word), with a vocabulary table counting the entries each
+word appears in. A search expands each query word to the indexed words it
+prefixes ("rsy" finds rsync). Common words are searched by walking the
+entries from the newest down and checking each word with index lookups,
+stopping at the limit; a rare word's few postings are collected instead. Either
+way `autocmd --history rsync` stays in the milliseconds however long the
+history grows. Appending costs one short transaction.
+"""
+
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+DEFAULT_LIMIT = 20
+# Prefixes matching more words than this are searched as a range instead of a list
+MAX_EXPANSION = 100
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class HistoryEntry(NamedTuple):
+    id: int
+    created: float
+    prompt: str
+    command: str
+    provider: str
+    model: str
+    latency_ms: Optional[float]
+    shell: str
+    cwd: str
+
+
+def tokens(text: str) -> List[str]:
+    """Distinct lowercase words of text, in order of appearance."""
+    return list(dict.fromkeys(_TOKEN_RE.findall(text.lower())))
+
+
+def _has_prefix(prefix: str, prompt: str, command: str) -> bool:
+    return any(word.startswith(prefix) for word in tokens(f"{prompt} {command}"))
+
+
+class History:
+    """Append-only log of generated commands with a word index."""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "id INTEGER PRIMARY KEY, created REAL NOT NULL, prompt TEXT NOT NULL, command TEXT NOT NULL, "
+            "provider TEXT NOT NULL, model TEXT NOT NULL, latency_ms REAL, shell TEXT NOT NULL, cwd TEXT NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS terms (term TEXT NOT NULL, id INTEGER NOT NULL, "
+            "PRIMARY KEY (term, id)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS words (word TEXT PRIMARY KEY, entries INTEGER NOT NULL) WITHOUT ROWID")
+        return conn
+
+    def add(self, prompt: str, command: str, provider: str, model: str,
+            latency_ms: Optional[float] = None, shell: str = "", cwd: str = "") -> None:
+        """Append a generated command and index its words."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            entry_id = conn.execute(
+                "INSERT INTO entries (created, prompt, command, provider, model, latency_ms, shell, cwd) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), prompt, command, provider, model, latency_ms, shell, cwd),
+            ).lastrowid
+            terms = tokens(f"{prompt} {command}")
+            conn.executemany("INSERT INTO terms (term, id) VALUES (?, ?)", [(term, entry_id) for term in terms])
+            conn.executemany(
+                "INSERT INTO words (word, entries) VALUES (?, 1) "
+                "ON CONFLICT (word) DO UPDATE SET entries = entries + 1",
+                [(term,) for term in terms],
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def search(self, query: str = "", limit: int = DEFAULT_LIMIT) -> List[HistoryEntry]:
+        """Return the newest entries containing every word of query (as a prefix), newest first."""
+        if not self.path.exists():
+            return []
+        terms = tokens(query)
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=5.0)
+        try:
+            if not terms:
+                rows = conn.execute("SELECT * FROM entries ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                rows = self._match(conn, terms, limit)
+        except sqlite3.OperationalError:
+            # Not created yet
+            return []
+        finally:
+            conn.close()
+        return [HistoryEntry(*row) for row in rows]
+
+    def _match(self, conn: sqlite3.Connection, terms: List[str], limit: int) -> list:
+        query = self._query(conn, terms, limit)
+        if query is None:
+            return []
+        return conn.execute(*query).fetchall()
+
+    def _query(self, conn: sqlite3.Connection, terms: List[str], limit: int) -> Optional[Tuple[str, list]]:
+        """SQL and parameters finding the newest entries matching every term, or None if one matches nothing."""
+        conn.create_function("has_prefix", 3, _has_prefix, deterministic=True)
+        expansions = []
+        for term in terms:
+            # "\U0010ffff" sorts after any word that starts with the term
+            bounds = (term, term + "\U0010ffff")
+            words = conn.execute("SELECT word, entries FROM words WHERE word >= ? AND word < ?", bounds).fetchall()
+            if not words:
+                return None
+            expansions.append((sum(entries for _, entries in words), term, [word for word, _ in words]))
+        expansions.sort(key=lambda expansion: expansion[0])
+        newest = conn.execute("SELECT max(id) FROM entries").fetchone()[0] or 0
+
+        def check(term: str, words: List[str], alias: str) -> Tuple[str, list]:
+            # A range of terms can't be probed by id; a prefix that short is checked against the entry's words
+            if len(words) > MAX_EXPANSION:
+                return " AND has_prefix(?, e.prompt, e.command)", [term]
+            return (f" AND EXISTS (SELECT 1 FROM terms o WHERE o.term IN ({', '.join('?' * len(words))}) "
+                    f"AND o.id = {alias}.id)"), words
+
+        rarest, term, words = expansions[0]
+        if rarest * rarest <= limit * newest:
+            # Fewer postings than the entries a walk would visit before the limit: collect the rarest
+            # word's entries and check the rest per candidate.
+            # An entry can have several words starting with the term; it is listed once
+            sql = "SELECT DISTINCT e.* FROM terms t JOIN entries e ON e.id = t.id WHERE "
+            if len(words) > MAX_EXPANSION:
+                sql, params = sql + "t.term >= ? AND t.term < ?", [term, term + "\U0010ffff"]
+            else:
+                sql, params = sql + f"t.term IN ({', '.join('?' * len(words))})", list(words)
+            others = expansions[1:]
+        else:
+            # Common words: walk entries newest first by rowid, so the scan stops at the limit
+            sql, params, others = "SELECT e.* FROM entries e WHERE 1", [], expansions
+        for _, other_term, other_words in others:
+            clause, clause_params = check(other_term, other_words, "e")
+            sql += clause
+            params += clause_params
+        return sql + " ORDER BY e.id DESC LIMIT ?", params + [limit]
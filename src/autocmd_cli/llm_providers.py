@@ -5,185 +5,635 @@ This module provides a unified interface for multiple LLM providers,
 making it easy to add new providers without changing the main application logic.
 """
 
+import functools
 import os
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Iterator, Optional
+from collections.abc import Mapping
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, Iterator, List, Optional
+
+from . import registry, trace
+from .output import STOP_SEQUENCES
+
+# Idle connections are kept open this long so back-to-back requests skip TCP/TLS set-up
+KEEPALIVE_EXPIRY = 60.0
+
+
+class _ClientPool:
+    """Reference-counted SDK clients shared by providers with the same endpoint and key."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._clients: Dict[Hashable, List[Any]] = {}
+
+    def acquire(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        with self.lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = self._clients[key] = [factory(), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def release(self, key: Hashable) -> None:
+        with self.lock:
+            entry = self._clients.get(key)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._clients[key]
+                entry[0].close()
+
+
+_pool = _ClientPool()
+
+
+def _http2_enabled() -> bool:
+    if os.environ.get("AUTOCMD_HTTP2", "").lower() not in ("1", "true", "yes"):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_http_client(sdk: Any, is_async: bool = False) -> Any:
+    """Build a keep-alive HTTP client from the SDK's own defaults.
+
+    Returns None on SDK versions without DefaultHttpxClient, in which case the
+    SDK builds its default client (still reused through the pool).
+    """
+    client_class = getattr(sdk, "DefaultAsyncHttpxClient" if is_async else "DefaultHttpxClient", None)
+    default_limits = getattr(sdk, "DEFAULT_CONNECTION_LIMITS", None)
+    if client_class is None or default_limits is None:
+        return None
+    limits = type(default_limits)(
+        max_connections=default_limits.max_connections,
+        max_keepalive_connections=default_limits.max_keepalive_connections,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+    return client_class(http2=_http2_enabled(), limits=limits)
+
+
+def read_usage(usage: Any) -> Optional[Dict[str, int]]:
+    """Normalize an Anthropic or OpenAI usage block (SDK object or dict) to input/output token counts.
+
+    Input tokens include prompt-cache reads and writes, which Anthropic counts apart.
+    """
+    if not usage:
+        return None
+    get = usage.get if isinstance(usage, dict) else lambda name: getattr(usage, name, None)
+    if get("prompt_tokens") is not None or get("completion_tokens") is not None:
+        return {"input_tokens": get("prompt_tokens") or 0, "output_tokens": get("completion_tokens") or 0}
+    fields = ("input_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
+    return {"input_tokens": sum(get(name) or 0 for name in fields), "output_tokens": get("output_tokens") or 0}
+
+
+def _add_usage(usage: Optional[Dict[str, int]], reported: Any) -> None:
+    if usage is not None:
+        usage.update(read_usage(reported) or {})
+
+
+def estimate_usage(prompt: str, output: str) -> Dict[str, int]:
+    """Rough token counts (about four characters a token) for a response the API never counted."""
+    return {"input_tokens": (len(prompt) + 3) // 4, "output_tokens": (len(output) + 3) // 4}
+
+
+def usage_kwargs(provider: Any, usage: Optional[Dict[str, int]]) -> Dict[str, Any]:
+    """Keyword arguments that pass a usage dict to provider.generate(_stream), if the provider takes one."""
+    return {"usage": usage} if usage is not None and getattr(provider, "reports_usage", False) else {}
 
 
 class LLMProvider(ABC):
-    """Base class for all LLM providers."""
+    """Base class for all LLM providers.
+
+    Providers hold one long-lived SDK client, shared with every other provider
+    instance that talks to the same endpoint with the same key. Call close()
+    (or use the provider as a context manager) to release it.
+
+    Providers that set reports_usage take a `usage` dict in generate and
+    generate_stream, and fill it with the token counts the API reported for
+    that request ({"input_tokens": ..., "output_tokens": ...}). The counts
+    belong to the call rather than the provider, which the daemon shares
+    between concurrent requests. A stream closed early has only the counts
+    that had arrived by then; OpenAI-compatible APIs send theirs last, so those
+    providers fill in an estimate instead.
+    """
+
+    # Providers for local servers set this to False and accept any (or no) key
+    api_key_required = True
+    reports_usage = False
+    # Built-in providers' registry entry, the one place their key variable and default model are written;
+    # other providers override default_model and env_var_name instead
+    spec: Optional[registry.ProviderSpec] = None
 
     def __init__(self, api_key: str, model: Optional[str] = None):
         self.api_key = api_key
         self.model = model or self.default_model()
+        # "sdk" uses the vendor SDK; "http" uses the lightweight stdlib transport
+        self.transport = os.environ.get("AUTOCMD_TRANSPORT", "sdk").lower()
+        self._client: Any = None
+        self._async_client: Any = None
+        self._async_loop: Any = None
+
+    def __enter__(self) -> "LLMProvider":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "LLMProvider":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    @property
+    def client(self) -> Any:
+        """The pooled SDK client, created on first use."""
+        if self._client is None:
+            with _pool.lock:
+                if self._client is None:
+                    self._client = _pool.acquire(self._client_key(), self._create_client)
+                    trace.mark("client")
+        return self._client
+
+    def prepare(self) -> None:
+        """Import the SDK and build the client, so that timing a request leaves both out.
+
+        Failures are left for the request itself to report.
+        """
+        if type(self)._create_client is LLMProvider._create_client:
+            # No SDK client of its own (a plugin overriding generate, or a wrapper)
+            return
+        try:
+            self.client
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        """Release the pooled client; it is closed once no provider uses it."""
+        with _pool.lock:
+            if self._client is not None:
+                self._client = None
+                _pool.release(self._client_key())
+
+    @property
+    def async_client(self) -> Any:
+        """The async SDK client for the running event loop, created on first use."""
+        # asyncio is imported lazily throughout: it costs more to import than the one-shot CLI needs
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            # Async connections are bound to the loop that opened them
+            self._async_client = self._create_async_client()
+            self._async_loop = loop
+        return self._async_client
+
+    async def aclose(self) -> None:
+        """Close the async client and release the pooled sync client."""
+        client, self._async_client, self._async_loop = self._async_client, None, None
+        if client is not None:
+            await client.close()
+        self.close()
+
+    def _client_key(self) -> Hashable:
+        """Return the key under which this provider's client is shared."""
+        return (type(self).__name__, self.api_key)
+
+    def _create_client(self) -> Any:
+        """Create the SDK client for this provider.
+
+        Not abstract: providers that implement generate themselves (wrappers,
+        plugins) need no client, and only fail if something asks for one.
+        """
+        raise NotImplementedError(f"{type(self).__name__} has no SDK client; it must implement _create_client")
+
+    def _create_async_client(self) -> Any:
+        """Create the async SDK client for this provider."""
+        raise NotImplementedError(
+            f"{type(self).__name__} has no async SDK client; it must implement _create_async_client"
+        )
 
-    @abstractmethod
     def default_model(self) -> str:
         """Return the default model name for this provider."""
-        pass
+        return self._spec().default_model
+
+    def stop_sequences(self) -> List[str]:
+        """Return sequences at which the provider should stop generating."""
+        return list(STOP_SEQUENCES)
 
     @abstractmethod
-    def generate(self, prompt: str, max_tokens: int = 200) -> str:
-        """Generate a non-streaming response."""
+    def generate(self, prompt: str, max_tokens: int = 200, system: Optional[str] = None) -> str:
+        """Generate a non-streaming response.
+
+        prompt is the user's content; system holds the fixed instructions, sent
+        separately so providers can cache them as a prompt prefix.
+        """
         pass
 
     @abstractmethod
-    def generate_stream(self, prompt: str, max_tokens: int = 200) -> Iterator[str]:
+    def generate_stream(self, prompt: str, max_tokens: int = 200, system: Optional[str] = None) -> Iterator[str]:
         """Generate a streaming response."""
         pass
 
     @classmethod
-    @abstractmethod
     def env_var_name(cls) -> str:
         """Return the environment variable name for the API key."""
-        pass
+        return cls._spec().env_var
+
+    @classmethod
+    def base_url_env_var(cls) -> str:
+        """Return the environment variable that overrides the API base URL."""
+        if cls.spec is not None:
+            return cls.spec.base_url_env_var
+        return cls.env_var_name().replace("_API_KEY", "_BASE_URL")
+
+    @classmethod
+    def _spec(cls) -> registry.ProviderSpec:
+        if cls.spec is None:
+            raise NotImplementedError(f"{cls.__name__} must set spec, or implement default_model and env_var_name")
+        return cls.spec
+
+    async def agenerate(
+        self, prompt: str, max_tokens: int = 200, timeout: Optional[float] = None, system: Optional[str] = None
+    ) -> str:
+        """Generate a non-streaming response without blocking the event loop.
+
+        Raises asyncio.TimeoutError if the response takes longer than timeout seconds.
+        """
+        import asyncio
+        return await asyncio.wait_for(self._agenerate(prompt, max_tokens, system), timeout)
+
+    async def agenerate_stream(
+        self, prompt: str, max_tokens: int = 200, timeout: Optional[float] = None, system: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Generate a streaming response without blocking the event loop.
+
+        timeout bounds the whole stream, not each chunk. Cancelling the
+        consuming task closes the upstream stream.
+        """
+        import asyncio
+        deadline = None if timeout is None else time.monotonic() + timeout
+        stream = self._agenerate_stream(prompt, max_tokens, system).__aiter__()
+        try:
+            while True:
+                remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    text = await asyncio.wait_for(stream.__anext__(), remaining)
+                except StopAsyncIteration:
+                    return
+                yield text
+        finally:
+            await stream.aclose()
+
+    async def _agenerate(self, prompt: str, max_tokens: int, system: Optional[str] = None) -> str:
+        """Async generation hook; defaults to running generate() in a worker thread."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.generate, prompt, max_tokens, system))
+
+    async def _agenerate_stream(
+        self, prompt: str, max_tokens: int, system: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Async streaming hook; defaults to pulling generate_stream() from a worker thread."""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        iterator = self.generate_stream(prompt, max_tokens, system)
+        done = object()
+        try:
+            while True:
+                text = await loop.run_in_executor(None, next, iterator, done)
+                if text is done:
+                    return
+                yield text
+        finally:
+            try:
+                iterator.close()
+            except ValueError:
+                # Still running in the worker thread after a cancellation
+                pass
 
 
 class AnthropicProvider(LLMProvider):
     """Anthropic Claude provider."""
 
-    def default_model(self) -> str:
-        return "claude-haiku-4-5-20251001"
+    spec = registry.BUILTIN_PROVIDERS["anthropic"]
+    reports_usage = True
 
-    @classmethod
-    def env_var_name(cls) -> str:
-        return "ANTHROPIC_API_KEY"
-
-    def generate(self, prompt: str, max_tokens: int = 200) -> str:
-        from anthropic import Anthropic
-        client = Anthropic(api_key=self.api_key)
-        response = client.messages.create(
-            model=self.model,
-            max_tokens=max_tokens,
-            messages=[{"role": "user", "content": prompt}]
+    def __init__(self, api_key: str, model: Optional[str] = None, base_url: Optional[str] = None):
+        self.base_url = base_url or os.environ.get(self.base_url_env_var())
+        super().__init__(api_key, model)
+
+    def _client_key(self) -> Hashable:
+        return ("anthropic", self.transport, self.base_url, self.api_key, _http2_enabled())
+
+    def _create_client(self) -> Any:
+        if self.transport == "http":
+            from .transport import AnthropicTransport
+            return AnthropicTransport(self.api_key, self.base_url)
+        import anthropic
+        return anthropic.Anthropic(
+            api_key=self.api_key, base_url=self.base_url, http_client=_build_http_client(anthropic)
         )
+
+    def _request(self, prompt: str, max_tokens: int, system: Optional[str]) -> Dict[str, Any]:
+        """Build the Messages API request body."""
+        request = {
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "stop_sequences": self.stop_sequences(),
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        if system:
+            # The instructions are identical across requests: let the API cache them as a prefix
+            request["system"] = [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+        return request
+
+    def generate(self, prompt: str, max_tokens: int = 200, system: Optional[str] = None,
+                 usage: Optional[Dict[str, int]] = None) -> str:
+        request = self._request(prompt, max_tokens, system)
+        if self.transport == "http":
+            reported = {}
+            text = self.client.generate(request, reported)
+            _add_usage(usage, reported)
+            return text
+        response = self.client.messages.create(**request)
+        _add_usage(usage, response.usage)
         return response.content[0].text
 
-    def generate_stream(self, prompt: str, max_tokens: int = 200) -> Iterator[str]:
-        from anthropic import Anthropic
-        client = Anthropic(api_key=self.api_key)
-        with client.messages.stream(
-            model=self.model,
-            max_tokens=max_tokens,
-            messages=[{"role": "user", "content": prompt}]
-        ) as stream:
+    def generate_stream(self, prompt: str, max_tokens: int = 200, system: Optional[str] = None,
+                        usage: Optional[Dict[str, int]] = None) -> Iterator[str]:
+        request = self._request(prompt, max_tokens, system)
+        if self.transport == "http":
+            reported = {}
+            try:
+                yield from self.client.generate_stream(request, reported)
+            finally:
+                _add_usage(usage, reported)
+            return
+        with self.client.messages.stream(**request) as stream:
             for text in stream.text_stream:
                 yield text
+            _add_usage(usage, stream.get_final_message().usage)
+
+    def _create_async_client(self) -> Any:
+        import anthropic
+        return anthropic.AsyncAnthropic(
+            api_key=self.api_key, base_url=self.base_url, http_client=_build_http_client(anthropic, is_async=True)
+        )
+
+    async def _agenerate(self, prompt: str, max_tokens: int, system: Optional[str] = None) -> str:
+        if self.transport == "http":
+            return await super()._agenerate(prompt, max_tokens, system)
+        response = await self.async_client.messages.create(**self._request(prompt, max_tokens, system))
+        return response.content[0].text
+
+    async def _agenerate_stream(
+        self, prompt: str, max_tokens: int, system: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        if self.transport == "http":
+            async for text in super()._agenerate_stream(prompt, max_tokens, system):
+                yield text
+            return
+        async with self.async_client.messages.stream(**self._request(prompt, max_tokens, system)) as stream:
+            async for text in stream.text_stream:
+                yield text
 
 
 class OpenAICompatibleProvider(LLMProvider):
     """Generic provider for OpenAI-compatible APIs."""
 
+    default_base_url: Optional[str] = None
+    reports_usage = True
+
     def __init__(self, api_key: str, model: Optional[str] = None, base_url: Optional[str] = None):
-        self.base_url = base_url
+        self.base_url = base_url or os.environ.get(self.base_url_env_var()) or self.default_base_url
         super().__init__(api_key, model)
 
-    def generate(self, prompt: str, max_tokens: int = 200) -> str:
-        from openai import OpenAI
-        client = OpenAI(api_key=self.api_key, base_url=self.base_url)
-        response = client.chat.completions.create(
-            model=self.model,
-            max_tokens=max_tokens,
-            messages=[{"role": "user", "content": prompt}]
+    def _client_key(self) -> Hashable:
+        return ("openai", self.transport, self.base_url, self.api_key, _http2_enabled())
+
+    def _create_client(self) -> Any:
+        if self.transport == "http":
+            from .transport import OpenAITransport
+            return OpenAITransport(self.api_key, self.base_url)
+        import openai
+        return openai.OpenAI(api_key=self.api_key, base_url=self.base_url, http_client=_build_http_client(openai))
+
+    def _request(self, prompt: str, max_tokens: int, system: Optional[str]) -> Dict[str, Any]:
+        """Build the chat-completions request body."""
+        messages = [{"role": "user", "content": prompt}]
+        if system:
+            # A leading system message that never changes is a prefix the provider can cache
+            messages.insert(0, {"role": "system", "content": system})
+        return {"model": self.model, "max_tokens": max_tokens, "stop": self.stop_sequences(), "messages": messages}
+
+    def generate(self, prompt: str, max_tokens: int = 200, system: Optional[str] = None,
+                 usage: Optional[Dict[str, int]] = None) -> str:
+        request = self._request(prompt, max_tokens, system)
+        if self.transport == "http":
+            reported = {}
+            text = self.client.generate(request, reported)
+            _add_usage(usage, reported)
+            return text
+        response = self.client.chat.completions.create(**request)
+        _add_usage(usage, response.usage)
+        return response.choices[0].message.content
+
+    def generate_stream(self, prompt: str, max_tokens: int = 200, system: Optional[str] = None,
+                        usage: Optional[Dict[str, int]] = None) -> Iterator[str]:
+        # Token counts only come with a final usage chunk, and only when asked for
+        request = dict(self._request(prompt, max_tokens, system), stream_options={"include_usage": True})
+        received = []
+        stream = self._stream(request, usage)
+        try:
+            for text in stream:
+                received.append(text)
+                yield text
+        finally:
+            stream.close()
+            if usage is not None and not usage:
+                # Stopped before the usage chunk (a complete command arrived): estimate the counts
+                usage.update(estimate_usage(f"{system or ''}{prompt}", "".join(received)))
+
+    def _stream(self, request: Dict[str, Any], usage: Optional[Dict[str, int]]) -> Iterator[str]:
+        if self.transport == "http":
+            reported = {}
+            try:
+                yield from self.client.generate_stream(request, reported)
+            finally:
+                _add_usage(usage, reported)
+            return
+        stream = self.client.chat.completions.create(**request, stream=True)
+        try:
+            for chunk in stream:
+                if chunk.usage:
+                    _add_usage(usage, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+
+    def _create_async_client(self) -> Any:
+        import openai
+        return openai.AsyncOpenAI(
+            api_key=self.api_key, base_url=self.base_url, http_client=_build_http_client(openai, is_async=True)
         )
+
+    async def _agenerate(self, prompt: str, max_tokens: int, system: Optional[str] = None) -> str:
+        if self.transport == "http":
+            return await super()._agenerate(prompt, max_tokens, system)
+        response = await self.async_client.chat.completions.create(**self._request(prompt, max_tokens, system))
         return response.choices[0].message.content
 
-    def generate_stream(self, prompt: str, max_tokens: int = 200) -> Iterator[str]:
-        from openai import OpenAI
-        client = OpenAI(api_key=self.api_key, base_url=self.base_url)
-        stream = client.chat.completions.create(
-            model=self.model,
-            max_tokens=max_tokens,
-            messages=[{"role": "user", "content": prompt}],
-            stream=True
+    async def _agenerate_stream(
+        self, prompt: str, max_tokens: int, system: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        if self.transport == "http":
+            async for text in super()._agenerate_stream(prompt, max_tokens, system):
+                yield text
+            return
+        stream = await self.async_client.chat.completions.create(
+            **self._request(prompt, max_tokens, system), stream=True
         )
-        for chunk in stream:
-            if chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
 
 
 class OpenAIProvider(OpenAICompatibleProvider):
     """OpenAI GPT provider."""
 
-    def default_model(self) -> str:
-        return "gpt-4o-mini"
-
-    @classmethod
-    def env_var_name(cls) -> str:
-        return "OPENAI_API_KEY"
+    spec = registry.BUILTIN_PROVIDERS["openai"]
 
 
 class GroqProvider(OpenAICompatibleProvider):
     """Groq provider."""
 
-    def __init__(self, api_key: str, model: Optional[str] = None):
-        super().__init__(api_key, model, base_url="https://api.groq.com/openai/v1")
-
-    def default_model(self) -> str:
-        return "llama-3.3-70b-versatile"
-
-    @classmethod
-    def env_var_name(cls) -> str:
-        return "GROQ_API_KEY"
+    spec = registry.BUILTIN_PROVIDERS["groq"]
+    default_base_url = "https://api.groq.com/openai/v1"
 
 
 class GrokProvider(OpenAICompatibleProvider):
     """xAI Grok provider."""
 
-    def __init__(self, api_key: str, model: Optional[str] = None):
-        super().__init__(api_key, model, base_url="https://api.x.ai/v1")
-
-    def default_model(self) -> str:
-        return "grok-beta"
-
-    @classmethod
-    def env_var_name(cls) -> str:
-        return "XAI_API_KEY"
+    spec = registry.BUILTIN_PROVIDERS["grok"]
+    default_base_url = "https://api.x.ai/v1"
 
 
 class DeepseekProvider(OpenAICompatibleProvider):
     """Deepseek provider."""
 
-    def __init__(self, api_key: str, model: Optional[str] = None):
-        super().__init__(api_key, model, base_url="https://api.deepseek.com")
-
-    def default_model(self) -> str:
-        return "deepseek-chat"
-
-    @classmethod
-    def env_var_name(cls) -> str:
-        return "DEEPSEEK_API_KEY"
+    spec = registry.BUILTIN_PROVIDERS["deepseek"]
+    default_base_url = "https://api.deepseek.com"
 
 
 class OpenrouterProvider(OpenAICompatibleProvider):
     """Openrouter provider."""
 
-    def __init__(self, api_key: str, model: Optional[str] = None):
-        super().__init__(api_key, model, base_url="https://openrouter.ai/api/v1")
+    spec = registry.BUILTIN_PROVIDERS["openrouter"]
+    default_base_url = "https://openrouter.ai/api/v1"
 
-    def default_model(self) -> str:
-        return "anthropic/claude-3.5-sonnet"
 
-    @classmethod
-    def env_var_name(cls) -> str:
-        return "OPENROUTER_API_KEY"
+class LocalProvider(OpenAICompatibleProvider):
+    """Local model behind an OpenAI-compatible server such as llama.cpp or Ollama.
+
+    The base URL (AUTOCMD_LOCAL_BASE_URL) may be a loopback address or an
+    `http+unix://` socket. Requests always go through the stdlib transport:
+    the SDKs can't reach Unix sockets and take longer to import than a small
+    local model takes to answer. No API key is needed.
+    """
+
+    spec = registry.BUILTIN_PROVIDERS["local"]
+    default_base_url = "http://127.0.0.1:8080/v1"
+    api_key_required = spec.api_key_required
+
+    def __init__(self, api_key: str = "", model: Optional[str] = None, base_url: Optional[str] = None):
+        super().__init__(api_key or "local", model, base_url)
+        # A single command rarely needs more; a small window keeps the KV cache and prefill cheap
+        self.max_tokens_cap = int(os.environ.get("AUTOCMD_LOCAL_MAX_TOKENS", "96"))
+        self.num_ctx = int(os.environ.get("AUTOCMD_LOCAL_NUM_CTX", "2048"))
+        self._keep_warm: Optional[threading.Event] = None
+        self._keep_warm_thread: Optional[threading.Thread] = None
+        self._last_used = time.monotonic()
+
+    @property
+    def transport(self) -> str:
+        return "http"
+
+    @transport.setter
+    def transport(self, value: str) -> None:
+        pass
 
+    def _request(self, prompt: str, max_tokens: int, system: Optional[str]) -> Dict[str, Any]:
+        self._last_used = time.monotonic()
+        request = super()._request(prompt, min(max_tokens, self.max_tokens_cap), system)
+        # llama.cpp: reuse the KV cache for the unchanged system prefix.
+        # Ollama: context window and prediction limit.
+        request["cache_prompt"] = True
+        request["options"] = {"num_ctx": self.num_ctx, "num_predict": request["max_tokens"]}
+        return request
 
-# Registry of all available providers
-PROVIDERS = {
-    "anthropic": AnthropicProvider,
-    "openai": OpenAIProvider,
-    "groq": GroqProvider,
-    "grok": GrokProvider,
-    "deepseek": DeepseekProvider,
-    "openrouter": OpenrouterProvider,
-}
+    def ping(self) -> None:
+        """Generate one token, so the server keeps the model loaded and its pages resident."""
+        self.generate("ping", max_tokens=1)
+
+    def keep_warm(self, interval: float) -> None:
+        """Ping the server whenever it has been idle for interval seconds, until close()."""
+        if interval <= 0 or self._keep_warm is not None:
+            return
+        stop = self._keep_warm = threading.Event()
+
+        def run() -> None:
+            while not stop.wait(max(interval - (time.monotonic() - self._last_used), 0.01)):
+                if time.monotonic() - self._last_used >= interval:
+                    try:
+                        self.ping()
+                    except Exception:
+                        # The server may be restarting; try again after the next interval
+                        self._last_used = time.monotonic()
+
+        self._keep_warm_thread = threading.Thread(target=run, name="autocmd-keep-warm", daemon=True)
+        self._keep_warm_thread.start()
+
+    def close(self) -> None:
+        if self._keep_warm is not None:
+            self._keep_warm.set()
+            self._keep_warm = None
+            # Let a ping in flight finish, so none reaches the server after close()
+            self._keep_warm_thread.join()
+        super().close()
+
+
+class _ProviderClasses(Mapping):
+    """Provider name -> LLMProvider class, looked up in the registry and imported on access."""
+
+    def __getitem__(self, name: str) -> type:
+        if registry.find(name) is None:
+            raise KeyError(name)
+        return registry.load_class(name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(registry.names())
+
+    def __len__(self) -> int:
+        return len(registry.names())
+
+
+PROVIDERS: Mapping = _ProviderClasses()
 
 
 def get_provider(
     provider_name: Optional[str] = None,
     api_key: Optional[str] = None,
-    model: Optional[str] = None
+    model: Optional[str] = None,
+    transport: Optional[str] = None
 ) -> LLMProvider:
     """
     Get an LLM provider instance.
@@ -193,6 +643,7 @@ def get_provider(
                       If None, uses AUTOCMD_PROVIDER env var or defaults to 'anthropic'.
         api_key: API key for the provider. If None, uses the provider's env var.
         model: Model name to use. If None, uses the provider's default model or AUTOCMD_MODEL env var.
+        transport: 'sdk' or 'http'. If None, uses AUTOCMD_TRANSPORT env var or defaults to 'sdk'.
 
     Returns:
         An instance of the requested LLM provider.
@@ -204,18 +655,14 @@ def get_provider(
     if provider_name is None:
         provider_name = os.environ.get("AUTOCMD_PROVIDER", "anthropic").lower()
 
-    if provider_name not in PROVIDERS:
-        available = ", ".join(PROVIDERS.keys())
-        raise ValueError(f"Unknown provider '{provider_name}'. Available: {available}")
-
-    provider_class = PROVIDERS[provider_name]
+    spec = registry.get(provider_name)
 
     # Get API key
     if api_key is None:
-        api_key = os.environ.get(provider_class.env_var_name())
-        if not api_key:
+        api_key = os.environ.get(spec.env_var)
+        if not api_key and spec.api_key_required:
             raise ValueError(
-                f"API key not found. Set {provider_class.env_var_name()} environment variable "
+                f"API key not found. Set {spec.env_var} environment variable "
                 f"or pass api_key parameter."
             )
 
@@ -223,4 +670,49 @@ def get_provider(
     if model is None:
         model = os.environ.get("AUTOCMD_MODEL")
 
-    return provider_class(api_key=api_key, model=model)
+    provider = registry.load_class(provider_name)(api_key=api_key, model=model)
+    if transport:
+        provider.transport = transport.lower()
+    return provider
+
+
+def get_async_provider(
+    provider_name: Optional[str] = None,
+    api_key: Optional[str] = None,
+    model: Optional[str] = None,
+    transport: Optional[str] = None
+) -> LLMProvider:
+    """
+    Get an LLM provider instance for use from asyncio code.
+
+    Resolves the provider, API key and model exactly like get_provider. Use the
+    returned provider's agenerate/agenerate_stream methods, and close it with
+    `await provider.aclose()` or `async with`.
+
+    Raises:
+        ValueError: If the provider is not found or API key is not available.
+    """
+    return get_provider(provider_name=provider_name, api_key=api_key, model=model, transport=transport)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Return True if error means the provider is throttling requests."""
+    # 429 is the standard rate limit status; Anthropic uses 529 when overloaded
+    return getattr(error, "status_code", None) in (429, 529) or type(error).__name__ == "RateLimitError"
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """Return True if error means the provider could not be reached."""
+    # The SDKs' APITimeoutError subclasses their APIConnectionError
+    return any(cls.__name__ in ("APIConnectionError", "TransportConnectionError") for cls in type(error).__mro__)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Return the server's Retry-After hint in seconds, if the error carries one."""
+    headers = getattr(error, "headers", None) or getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,165 @@
+"""
+Incremental parsing of model output into a shell command.
+
+Models often follow the command with a closing fence, blank lines or a short
+explanation. CommandParser recognizes the point where a complete command has
+arrived so callers can stop reading (and stop paying for) the stream.
+"""
+
+import re
+from typing import Iterable, Iterator
+
+# Stops generation at a closing code fence; the opening fence has no preceding newline
+STOP_SEQUENCES = ["\n```"]
+
+_FENCE_RE = re.compile(r'^```\w*\n?|```$')
+# One opener per closer: "then" is not counted, since elif brings another one before the same fi
+_OPENERS = {"do", "if", "case"}
+_CLOSERS = {"done", "fi", "esac"}
+_CONTINUATIONS = ("\\", "|", "&&", "||", "&&\\", "||\\")
+
+
+def extract_command(response: str) -> str:
+    """Strip code fences and whitespace from a model response."""
+    return _FENCE_RE.sub('', response.strip()).strip()
+
+
+def budget_max_tokens(user_prompt: str) -> int:
+    """Pick a max_tokens budget that scales with the request instead of a fixed 200.
+
+    Short requests produce one-liners; long multi-line requests may need a
+    loop or pipeline, so the budget grows with the prompt, within bounds.
+    """
+    return max(64, min(400, 64 + len(user_prompt) // 2))
+
+
+def _scan_line(line: str, state: dict) -> None:
+    """Update shell nesting state (quotes, brackets, blocks, heredocs) with one line."""
+    quote = state["quote"]
+    unquoted = []
+    i = 0
+    while i < len(line):
+        ch = line[i]
+        if quote:
+            if ch == "\\" and quote == '"':
+                i += 1
+            elif ch == quote:
+                quote = ""
+        elif ch == "\\":
+            i += 1
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "#" and (i == 0 or line[i - 1].isspace()):
+            break
+        else:
+            unquoted.append(ch)
+            if ch in "({":
+                state["depth"] += 1
+            elif ch in ")}":
+                state["depth"] = max(state["depth"] - 1, 0)
+            elif line.startswith("<<", i) and not line.startswith("<<<", i):
+                match = re.match(r"<<-?\s*['\"]?(\w+)", line[i:])
+                if match:
+                    state["heredoc"] = match.group(1)
+        i += 1
+    state["quote"] = quote
+
+    # Whole shell words only, so arguments such as dd's if=... are not taken for keywords
+    for word in re.findall(r"[^\s;&|(){}]+", "".join(unquoted)):
+        if word in _OPENERS:
+            state["blocks"] += 1
+        elif word in _CLOSERS:
+            state["blocks"] = max(state["blocks"] - 1, 0)
+
+
+def _continues(line: str, state: dict) -> bool:
+    """Return True if the command is still open after this line."""
+    return bool(
+        state["quote"]
+        or state["heredoc"]
+        or state["depth"] > 0
+        or state["blocks"] > 0
+        or line.rstrip().endswith(_CONTINUATIONS)
+    )
+
+
+class CommandParser:
+    """Recognizes a finished command as streamed text arrives.
+
+    A command is finished at the closing fence of a fenced block, or at the
+    end of the first line that does not continue (no open quotes, brackets,
+    loops, heredocs or trailing pipes/backslashes).
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.end = -1
+        self._scanned = 0
+        self._state = {"quote": "", "depth": 0, "blocks": 0, "heredoc": ""}
+        self._fenced = None
+
+    @property
+    def done(self) -> bool:
+        return self.end >= 0
+
+    @property
+    def command(self) -> str:
+        return extract_command(self.text[:self.end] if self.done else self.text)
+
+    def feed(self, chunk: str) -> bool:
+        """Add streamed text; return True once a complete command has arrived."""
+        if self.done:
+            return True
+        self.text += chunk
+        while not self.done:
+            newline = self.text.find("\n", self._scanned)
+            if newline == -1:
+                break
+            line = self.text[self._scanned:newline]
+            self._scanned = newline + 1
+            self._feed_line(line, newline)
+        return self.done
+
+    def _feed_line(self, line: str, newline: int) -> None:
+        stripped = line.strip()
+        if self._fenced is None:
+            if not stripped:
+                return
+            self._fenced = stripped.startswith("```")
+            if self._fenced:
+                return
+
+        state = self._state
+        if state["heredoc"]:
+            if stripped == state["heredoc"]:
+                state["heredoc"] = ""
+        elif self._fenced and stripped.startswith("```"):
+            self.end = newline
+            return
+        else:
+            _scan_line(line, state)
+
+        # Fenced blocks end at their closing fence; bare commands at the first line that closes
+        if not self._fenced and not _continues(line, state):
+            self.end = newline
+
+    def consume(self, chunks: Iterable[str]) -> Iterator[str]:
+        """Yield chunks up to the end of the command, then close the upstream stream."""
+        try:
+            for chunk in chunks:
+                before = len(self.text)
+                if self.feed(chunk):
+                    yield chunk[:max(self.end - before, 0)]
+                    return
+                yield chunk
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+
+def parse_command(response: str) -> str:
+    """Extract the command from a complete (non-streamed) response."""
+    parser = CommandParser()
+    parser.feed(response + "\n")
+    return parser.command
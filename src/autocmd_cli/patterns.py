@@ -0,0 +1,102 @@
+"""
+Local pattern engine for frequent, formulaic requests.
+
+Requests like "show disk usage" or "kill process on port 8080" don't need a
+model. Each pattern is a regular expression that must match the whole prompt
+(case-insensitively) and a command template whose `{name}` fields are filled
+from the expression's named groups, shell-quoted. A prompt that only partly
+matches, or matches nothing, falls through to the provider.
+
+Users can add or override patterns in `~/.config/autocmd/patterns`, one per
+line, checked before the built-in ones:
+
+    # regex => template
+    deploy (?P<env>staging|prod) => make deploy ENV={env}
+"""
+
+import re
+import shlex
+import sys
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+SEPARATOR = " => "
+
+BUILTIN_PATTERNS: Sequence[Tuple[str, str]] = (
+    (r"(?:show |check |display )?(?:free )?disk (?:usage|space)", "df -h"),
+    (r"(?:show |check )?(?:the )?size of (?:this|the current) (?:dir|directory|folder)", "du -sh ."),
+    (r"(?:kill|stop) (?:the )?(?:process|server|whatever is) (?:on|using|running on) port (?P<port>\d+)",
+     "lsof -ti tcp:{port} | xargs kill"),
+    (r"(?:what|which process) is (?:running on|using|listening on) port (?P<port>\d+)", "lsof -i :{port}"),
+    (r"(?:untar|extract|unpack) (?P<file>\S+\.(?:tar|tar\.gz|tgz|tar\.bz2|tbz2|tar\.xz|txz))", "tar -xf {file}"),
+    (r"(?:unzip|extract|unpack) (?P<file>\S+\.zip)", "unzip {file}"),
+    (r"(?:find|list|show) (?:all )?(?:the )?\.(?P<ext>\w+) files(?: here| in this (?:dir|directory|folder))?",
+     "find . -name '*.{ext}'"),
+    (r"count (?:the )?lines (?:in|of) (?P<file>\S+)", "wc -l {file}"),
+    (r"(?:show |check )?(?:the )?git status", "git status"),
+    (r"(?:show )?(?:the )?(?:git log|commits) for (?:the )?last (?P<n>\d+) commits?", "git log --oneline -n {n}"),
+    (r"(?:show )?(?:the )?last (?P<n>\d+) (?:git )?commits", "git log --oneline -n {n}"),
+    (r"list files(?: here)?", "ls"),
+    (r"list all files(?: here)?", "ls -a"),
+    (r"list (?:all )?files including hidden(?: ones| files)?", "ls -la"),
+    (r"(?:where am i|(?:show |print )?(?:the )?(?:current|working) directory)", "pwd"),
+    (r"(?:make|create) (?:a )?(?:new )?(?:dir|directory|folder) (?:called |named )?(?P<name>\S+)", "mkdir -p {name}"),
+    (r"(?:show |list |print )?(?:all )?environment variables", "env"),
+    (r"(?:show |print )?(?:my |the )?path(?: variable)?", 'echo "$PATH"'),
+)
+
+
+class PatternMatch(NamedTuple):
+    command: str
+    pattern: str
+
+
+class PatternEngine:
+    """Resolves prompts against an ordered list of (regex, template) patterns."""
+
+    def __init__(self, patterns: Sequence[Tuple[str, str]]):
+        self.patterns = [(re.compile(regex, re.IGNORECASE), template) for regex, template in patterns]
+
+    def resolve(self, prompt: str) -> Optional[PatternMatch]:
+        """Return the filled-in command for a prompt, or None to fall through."""
+        text = " ".join(prompt.split()).rstrip(".?!")
+        for regex, template in self.patterns:
+            match = regex.fullmatch(text)
+            if match is None:
+                continue
+            fields = {name: shlex.quote(value) for name, value in match.groupdict().items() if value is not None}
+            try:
+                return PatternMatch(template.format(**fields), regex.pattern)
+            except (KeyError, IndexError, ValueError):
+                # A user template referring to a group its regex doesn't have
+                continue
+        return None
+
+
+def load_patterns(path: Path) -> List[Tuple[str, str]]:
+    """Read user patterns from path; invalid lines are reported and skipped."""
+    try:
+        lines = path.read_text().splitlines()
+    except FileNotFoundError:
+        return []
+    patterns = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        regex, sep, template = line.partition(SEPARATOR)
+        try:
+            if not sep:
+                raise ValueError(f"expected 'regex{SEPARATOR}template'")
+            re.compile(regex)
+        except (re.error, ValueError) as e:
+            print(f"autocmd: skipping {path}:{number}: {e}", file=sys.stderr)
+            continue
+        patterns.append((regex.strip(), template.strip()))
+    return patterns
+
+
+def create_engine(user_patterns_path: Optional[Path] = None) -> PatternEngine:
+    """Build an engine from the user's patterns followed by the built-in ones."""
+    user = load_patterns(user_patterns_path) if user_patterns_path else []
+    return PatternEngine(user + list(BUILTIN_PATTERNS))
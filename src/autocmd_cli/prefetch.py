@@ -0,0 +1,166 @@
+"""
+Speculative generation while a prompt is still being typed.
+
+The shell integration can watch the command line and, once typing pauses on
+an `autocmd "..."` line, start `autocmd --prefetch "<prompt>"` in the
+background; a keystroke that changes the prompt kills the previous one. The
+prefetch generates the command as usual and leaves it in a short-lived spool,
+so by the time Enter is pressed the command is often already there, or well
+on its way.
+
+The spool is one small JSON file. Each entry is a prompt being generated
+(with the pid of the process generating it) or a finished command. Whoever
+starts on a prompt first, prefetch or real request, claims it; the other
+takes the finished command or waits for it, so a prompt is never generated
+twice. Entries of processes that died (superseded prefetches are killed) are
+dropped, and finished ones expire after `ttl` seconds.
+
+Speculative generations are capped by a rate (starts per minute) and a daily
+token budget, kept in the same file. A submitted prompt takes a prefetched
+command if it matches after normalising case, whitespace and trailing
+punctuation, or if both have the same canonical words and the same numbers
+and paths (see similar.features): "show disk usage" takes a command prefetched
+for "show the disk usage", while "port 3000" never takes one for "port 300".
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .cache import normalize_prompt
+from .fileutil import atomic_write, locked
+from .similar import features
+
+DEFAULT_TTL = 120
+DEFAULT_DEBOUNCE_MS = 400
+DEFAULT_PER_MINUTE = 6
+DEFAULT_DAILY_TOKENS = 20000
+# A real request gives up waiting for a prefetch in flight after this long
+MAX_WAIT = 15.0
+POLL_INTERVAL = 0.02
+
+
+def prompt_key(prompt: str) -> str:
+    """The prompt with case, whitespace and trailing punctuation normalised away."""
+    return normalize_prompt(prompt).lower().rstrip(" .?!")
+
+
+def prompts_match(a: str, b: str) -> bool:
+    """True if a command generated for prompt a answers prompt b."""
+    a, b = prompt_key(a), prompt_key(b)
+    return a == b or features(a) == features(b)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class BudgetExceeded(Exception):
+    """A speculative generation would go over the rate or daily token budget."""
+
+
+class PrefetchSpool:
+    """Pending and finished speculative generations, shared by every terminal."""
+
+    def __init__(self, path: Path, ttl: float = DEFAULT_TTL, per_minute: int = DEFAULT_PER_MINUTE,
+                 daily_tokens: int = DEFAULT_DAILY_TOKENS):
+        self.path = path
+        self.ttl = ttl
+        self.per_minute = per_minute
+        self.daily_tokens = daily_tokens
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            data = {}
+        now = time.time()
+        # Finished entries expire; pending ones go with the process that was generating them
+        data["entries"] = [
+            entry for entry in data.get("entries", [])
+            if (entry["command"] is not None and now - entry["created"] < self.ttl)
+            or (entry["command"] is None and now - entry["created"] < MAX_WAIT * 4 and _alive(entry["pid"]))
+        ]
+        data["starts"] = [start for start in data.get("starts", []) if now - start < 60]
+        if data.get("day") != time.strftime("%Y-%m-%d"):
+            data["day"], data["tokens"] = time.strftime("%Y-%m-%d"), 0
+        return data
+
+    def _save(self, data: Dict[str, Any]) -> None:
+        atomic_write(self.path, json.dumps(data, separators=(",", ":")))
+
+    def _find(self, data: Dict[str, Any], prompt: str, shell: str, cwd: str) -> Optional[Dict[str, Any]]:
+        for entry in reversed(data["entries"]):
+            if entry["shell"] == shell and entry["cwd"] == cwd and prompts_match(entry["prompt"], prompt):
+                return entry
+        return None
+
+    def claim(self, prompt: str, shell: str, cwd: str, speculative: bool = False) -> Optional[Dict[str, Any]]:
+        """Return the entry already covering this prompt, or register this process as generating it and return None.
+
+        With speculative=True the rate and daily token budgets apply, and
+        BudgetExceeded is raised instead of claiming past them.
+        """
+        with locked(self.path):
+            data = self._load()
+            entry = self._find(data, prompt, shell, cwd)
+            if entry is not None:
+                return entry
+            if speculative:
+                if len(data["starts"]) >= self.per_minute or data["tokens"] >= self.daily_tokens:
+                    raise BudgetExceeded()
+                data["starts"].append(time.time())
+            data["entries"].append({
+                "prompt": prompt, "shell": shell, "cwd": cwd, "pid": os.getpid(), "created": time.time(),
+                "command": None,
+            })
+            self._save(data)
+            return None
+
+    def wait(self, prompt: str, shell: str, cwd: str, timeout: float = MAX_WAIT) -> Optional[Dict[str, Any]]:
+        """Take the finished entry for this prompt, waiting for one in flight.
+
+        Returns None, with the prompt claimed for this process, if there is
+        none or the process generating it went away.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            entry = self.claim(prompt, shell, cwd)
+            if entry is None or entry["command"] is not None:
+                return entry
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(POLL_INTERVAL)
+
+    def complete(self, prompt: str, shell: str, cwd: str, command: Optional[str], tokens: int = 0,
+                 speculative: bool = False, **details: Any) -> None:
+        """Finish this process's claim on the prompt with a command, or drop it if command is None.
+
+        details (provider, model, latency_ms) are kept with the command; tokens
+        are charged to the daily budget if the generation was speculative.
+        """
+        with locked(self.path):
+            data = self._load()
+            pid = os.getpid()
+            # Only this prompt's: a daemon has one pid for every request it is serving
+            mine = [
+                entry for entry in data["entries"]
+                if entry["pid"] == pid and entry["command"] is None
+                and entry["shell"] == shell and entry["cwd"] == cwd and prompts_match(entry["prompt"], prompt)
+            ]
+            for entry in mine:
+                if command:
+                    entry.update(details, command=command, created=time.time())
+                else:
+                    data["entries"].remove(entry)
+            if speculative:
+                data["tokens"] += tokens
+            self._save(data)
@@ -0,0 +1,141 @@
+"""
+Hedged requests across several providers.
+
+RacingProvider sends the same request to a list of providers and streams from
+whichever produces the first token, cancelling the rest. With a hedge delay of
+zero every provider starts at once; otherwise each extra provider is only
+started if nothing has arrived after another `hedge_delay` seconds, which keeps
+the extra spend to the slow tail.
+"""
+
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from .llm_providers import LLMProvider, usage_kwargs
+
+_DONE = object()
+
+
+class RacingProvider(LLMProvider):
+    """Streams from the first of several providers to produce a token.
+
+    The usage dict of a call gets the winner's token counts, when it reports
+    them, and the winner's index in providers under "winner" (see winner_of).
+    The provider may be shared by concurrent requests, so nothing about a
+    race is kept on it.
+    """
+
+    reports_usage = True
+
+    def __init__(self, providers: List[LLMProvider], hedge_delay: float = 0.0):
+        if not providers:
+            raise ValueError("Racing needs at least one provider.")
+        self.providers = providers
+        self.hedge_delay = hedge_delay
+        super().__init__("", "+".join(p.model for p in providers))
+
+    def default_model(self) -> str:
+        return "race"
+
+    @classmethod
+    def env_var_name(cls) -> str:
+        return "AUTOCMD_RACE_PROVIDERS"
+
+    def close(self) -> None:
+        for provider in self.providers:
+            provider.close()
+
+    def prepare(self) -> None:
+        for provider in self.providers:
+            provider.prepare()
+
+    def generate(self, prompt: str, max_tokens: int = 200, system: Optional[str] = None,
+                 usage: Optional[Dict[str, int]] = None) -> str:
+        return "".join(self.generate_stream(prompt, max_tokens, system, usage))
+
+    def generate_stream(self, prompt: str, max_tokens: int = 200, system: Optional[str] = None,
+                        usage: Optional[Dict[str, int]] = None) -> Iterator[str]:
+        results: "queue.Queue" = queue.Queue()
+        stopped = threading.Event()
+        race = {"winner": -1}
+        racer_usage: List[Dict[str, int]] = [{} for _ in self.providers]
+
+        def run(index: int) -> None:
+            provider = self.providers[index]
+            stream = provider.generate_stream(prompt, max_tokens, system, **usage_kwargs(provider, racer_usage[index]))
+            try:
+                for text in stream:
+                    results.put((index, text))
+                    # Losers drop out at their next chunk; everyone stops once the caller is done
+                    if stopped.is_set() or race["winner"] not in (-1, index):
+                        break
+                results.put((index, _DONE))
+            except Exception as e:
+                results.put((index, e))
+            finally:
+                stream.close()
+
+        def launch(index: int) -> None:
+            threading.Thread(target=run, args=(index,), daemon=True).start()
+
+        started = 1
+        launch(0)
+        if self.hedge_delay <= 0:
+            while started < len(self.providers):
+                launch(started)
+                started += 1
+
+        winner_index = -1
+        failed = 0
+        last_error: Optional[Exception] = None
+        next_launch = time.monotonic() + self.hedge_delay
+        try:
+            while True:
+                timeout = None
+                if winner_index < 0 and started < len(self.providers):
+                    timeout = max(next_launch - time.monotonic(), 0)
+                try:
+                    index, item = results.get(timeout=timeout)
+                except queue.Empty:
+                    # Nothing yet from the providers in flight: hedge with the next one
+                    launch(started)
+                    started += 1
+                    next_launch = time.monotonic() + self.hedge_delay
+                    continue
+
+                if winner_index >= 0 and index != winner_index:
+                    continue
+                if item is _DONE or isinstance(item, Exception):
+                    if winner_index >= 0:
+                        if item is _DONE:
+                            return
+                        raise item
+                    # A racer failed (or finished without any text) before anyone won
+                    failed += 1
+                    if item is not _DONE:
+                        last_error = item
+                    if failed == started:
+                        if started == len(self.providers):
+                            if last_error is not None:
+                                raise last_error
+                            return
+                        # Everyone in flight failed, so don't wait out the delay
+                        launch(started)
+                        started += 1
+                        next_launch = time.monotonic() + self.hedge_delay
+                    continue
+
+                if winner_index < 0:
+                    winner_index = race["winner"] = index
+                yield item
+        finally:
+            stopped.set()
+            if usage is not None and winner_index >= 0:
+                usage.update(racer_usage[winner_index], winner=winner_index)
+
+    def winner_of(self, usage: Optional[Dict[str, int]]) -> Optional[LLMProvider]:
+        """The provider that won the call that filled usage, or None if none did."""
+        index = usage.get("winner") if usage else None
+        return None if index is None else self.providers[index]
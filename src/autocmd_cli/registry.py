@@ -0,0 +1,140 @@
+"""
+Provider registry.
+
+Everything autocmd needs to know about a provider before using it (its API
+key variable, default model, base URL variable and whether it needs a key at
+all) is kept here as plain data, so choosing, configuring and caching for a
+provider never imports its implementation. The class is imported by
+load_class() when a request actually goes to it. Built-in classes read these
+values from their spec here (LLMProvider.spec) rather than repeating them.
+
+Other packages can add providers through the `autocmd.providers` entry-point
+group. Each entry point names a ProviderSpec, which should live in a module
+that is cheap to import, and whose target names the implementation:
+
+    [project.entry-points."autocmd.providers"]
+    gateway = "acme_autocmd.spec:GATEWAY"
+
+    # acme_autocmd/spec.py
+    GATEWAY = ProviderSpec(
+        "gateway", "acme_autocmd.provider:GatewayProvider",
+        env_var="ACME_GATEWAY_API_KEY", default_model="acme-fast",
+        base_url_env_var="ACME_GATEWAY_BASE_URL",
+    )
+
+Entry points are only scanned when a name is not built in or when every
+provider is listed: importlib.metadata alone costs more to import than the
+rest of autocmd, so requests to built-in providers never touch it. Built-in
+names take precedence over entry points.
+"""
+
+import importlib
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional, Type
+
+ENTRY_POINT_GROUP = "autocmd.providers"
+
+
+class ProviderSpec(NamedTuple):
+    name: str
+    # "module:Class" of the LLMProvider implementation
+    target: str
+    env_var: str
+    default_model: str
+    base_url_env_var: str
+    api_key_required: bool = True
+
+
+_BUILTIN_MODULE = "autocmd_cli.llm_providers"
+
+BUILTIN_PROVIDERS: Dict[str, ProviderSpec] = {
+    spec.name: spec for spec in (
+        ProviderSpec("anthropic", f"{_BUILTIN_MODULE}:AnthropicProvider", "ANTHROPIC_API_KEY",
+                     "claude-haiku-4-5-20251001", "ANTHROPIC_BASE_URL"),
+        ProviderSpec("openai", f"{_BUILTIN_MODULE}:OpenAIProvider", "OPENAI_API_KEY",
+                     "gpt-4o-mini", "OPENAI_BASE_URL"),
+        ProviderSpec("groq", f"{_BUILTIN_MODULE}:GroqProvider", "GROQ_API_KEY",
+                     "llama-3.3-70b-versatile", "GROQ_BASE_URL"),
+        ProviderSpec("grok", f"{_BUILTIN_MODULE}:GrokProvider", "XAI_API_KEY",
+                     "grok-beta", "XAI_BASE_URL"),
+        ProviderSpec("deepseek", f"{_BUILTIN_MODULE}:DeepseekProvider", "DEEPSEEK_API_KEY",
+                     "deepseek-chat", "DEEPSEEK_BASE_URL"),
+        ProviderSpec("openrouter", f"{_BUILTIN_MODULE}:OpenrouterProvider", "OPENROUTER_API_KEY",
+                     "anthropic/claude-3.5-sonnet", "OPENROUTER_BASE_URL"),
+        ProviderSpec("local", f"{_BUILTIN_MODULE}:LocalProvider", "AUTOCMD_LOCAL_API_KEY",
+                     "qwen2.5-coder:1.5b", "AUTOCMD_LOCAL_BASE_URL", api_key_required=False),
+    )
+}
+
+_discovered: Optional[Dict[str, ProviderSpec]] = None
+_classes: Dict[str, Type[Any]] = {}
+
+
+def _entry_points() -> List[Any]:
+    from importlib.metadata import entry_points
+    found = entry_points()
+    if hasattr(found, "select"):
+        return list(found.select(group=ENTRY_POINT_GROUP))
+    # Python < 3.10 returns a dict of groups
+    return list(found.get(ENTRY_POINT_GROUP, []))
+
+
+def discovered() -> Dict[str, ProviderSpec]:
+    """Providers registered by other packages, read once per process."""
+    global _discovered
+    if _discovered is None:
+        _discovered = {}
+        for entry_point in _entry_points():
+            if entry_point.name in BUILTIN_PROVIDERS:
+                continue
+            try:
+                spec = entry_point.load()
+            except Exception as e:
+                # A broken plugin must not take autocmd down with it
+                print(f"autocmd: skipping provider '{entry_point.name}': {e}", file=sys.stderr)
+                continue
+            if isinstance(spec, ProviderSpec):
+                _discovered[entry_point.name] = spec._replace(name=entry_point.name)
+            else:
+                print(f"autocmd: skipping provider '{entry_point.name}': not a ProviderSpec", file=sys.stderr)
+    return _discovered
+
+
+def find(name: str) -> Optional[ProviderSpec]:
+    """Return the spec for a provider name, looking through entry points only if it is not built in."""
+    spec = BUILTIN_PROVIDERS.get(name)
+    if spec is None:
+        spec = discovered().get(name)
+    return spec
+
+
+def get(name: str) -> ProviderSpec:
+    """Return the spec for a provider name; raises ValueError for unknown names."""
+    spec = find(name)
+    if spec is None:
+        raise ValueError(f"Unknown provider '{name}'. Available: {', '.join(names())}")
+    return spec
+
+
+def names() -> List[str]:
+    """All provider names, built-in first."""
+    return list(BUILTIN_PROVIDERS) + list(discovered())
+
+
+def load_class(name: str) -> Type[Any]:
+    """Import and return the LLMProvider class for a provider name."""
+    cls = _classes.get(name)
+    if cls is None:
+        module, _, attribute = get(name).target.partition(":")
+        cls = _classes[name] = getattr(importlib.import_module(module), attribute)
+    return cls
+
+
+def name_of(provider: Any) -> Optional[str]:
+    """Return the registry name of a provider instance, or None if it is not a registered provider."""
+    cls = type(provider)
+    target = f"{cls.__module__}:{cls.__qualname__}"
+    for spec in (*BUILTIN_PROVIDERS.values(), *(_discovered or {}).values()):
+        if spec.target == target:
+            return spec.name
+    return None
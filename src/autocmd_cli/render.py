@@ -0,0 +1,137 @@
+"""
+Live preview of a streamed response on the terminal.
+
+Tokens are shown as they arrive and wiped once the command is complete.
+StreamRenderer coalesces tokens into frames written at most `fps` times a
+second, one write and flush per frame rather than per token, and tracks where
+the cursor ends up, soft-wrapped lines included, so the final clear removes
+exactly the rows it drew. When the stream is not a terminal, the text is
+written as-is with no escape sequences.
+"""
+
+import os
+import sys
+import time
+import unicodedata
+from typing import Callable, List, Optional, TextIO
+
+DEFAULT_FPS = 30
+DEFAULT_WIDTH = 80
+TAB_WIDTH = 8
+
+
+def char_width(char: str) -> int:
+    """Terminal cells taken by one character: 2 for wide East Asian, 0 for combining and control."""
+    if char.isascii():
+        return 1 if char.isprintable() else 0
+    if unicodedata.combining(char) or unicodedata.category(char) in ("Cf", "Cc", "Mn", "Me"):
+        return 0
+    return 2 if unicodedata.east_asian_width(char) in ("W", "F") else 1
+
+
+def terminal_width(stream: TextIO) -> int:
+    try:
+        return os.get_terminal_size(stream.fileno()).columns or DEFAULT_WIDTH
+    except (AttributeError, OSError, ValueError):
+        return DEFAULT_WIDTH
+
+
+class StreamRenderer:
+    """Draws streamed text to a terminal in coalesced frames and clears it afterwards."""
+
+    def __init__(self, stream: Optional[TextIO] = None, fps: float = DEFAULT_FPS,
+                 clock: Callable[[], float] = time.monotonic, width: Optional[int] = None):
+        self.stream = stream if stream is not None else sys.stderr
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.clock = clock
+        self.tty = _isatty(self.stream)
+        self.width = width or (terminal_width(self.stream) if self.tty else DEFAULT_WIDTH)
+        self.rows = 0  # Rows below the one the preview started on
+        self.col = 0  # Cells used on the current row; == width means the next character wraps
+        self._pending: List[str] = []
+        self._chunks: List[str] = []
+        self._last_frame = None
+
+    def write(self, text: str) -> None:
+        """Queue text; it is drawn now if a frame is due, otherwise with the next one."""
+        if not text:
+            return
+        self._chunks.append(text)
+        self._pending.append(text)
+        now = self.clock()
+        # The first token goes out immediately: that is the latency the user sees
+        if self._last_frame is None or now - self._last_frame >= self.interval:
+            self._last_frame = now
+            self.flush()
+
+    def flush(self) -> None:
+        """Draw everything queued as one frame."""
+        if not self._pending:
+            return
+        frame = "".join(self._pending)
+        self._pending.clear()
+        self._advance(frame)
+        _write(self.stream, frame)
+
+    def _advance(self, text: str) -> None:
+        """Move the tracked cursor over text as the terminal would, wrapping at the width."""
+        width = self.width
+        for i, line in enumerate(text.split("\n")):
+            if i:
+                self.rows += 1
+                self.col = 0
+            if "\r" in line:
+                self.col = 0
+                line = line.rsplit("\r", 1)[1]
+            if line.isascii() and line.isprintable():
+                # Fast path for the usual case: n cells with deferred wrapping
+                if line:
+                    total = self.col + len(line)
+                    if total > width:
+                        self.rows += (total - 1) // width
+                        self.col = (total - 1) % width + 1
+                    else:
+                        self.col = total
+                continue
+            for char in line:
+                if char == "\t":
+                    # Tabs stop at the last column rather than wrapping
+                    self.col = min(self.col + TAB_WIDTH - self.col % TAB_WIDTH, width)
+                    continue
+                cells = char_width(char)
+                if cells and self.col + cells > width:
+                    self.rows += 1
+                    self.col = 0
+                self.col += cells
+
+    def clear(self) -> None:
+        """Erase everything drawn so far and return the cursor to where the preview started."""
+        self.flush()
+        if self.tty:
+            up = f"\033[{self.rows}A" if self.rows else ""
+            _write(self.stream, f"{up}\r\033[J")
+        elif self._chunks and not self._chunks[-1].endswith("\n"):
+            _write(self.stream, "\n")
+        self.rows = self.col = 0
+
+    def text(self) -> str:
+        """Everything written so far."""
+        return "".join(self._chunks)
+
+
+def _isatty(stream: TextIO) -> bool:
+    try:
+        return stream.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+def _write(stream: TextIO, text: str) -> None:
+    buffer = getattr(stream, "buffer", None)
+    if buffer is not None:
+        # Bypass the text layer's encoder and line buffering: one write, one flush
+        buffer.write(text.encode("utf-8", "replace"))
+        buffer.flush()
+    else:
+        stream.write(text)
+        stream.flush()
@@ -0,0 +1,76 @@
+"""
+Parsed, cached access to the `key=value` settings file.
+
+The file is parsed once and kept in memory until its stat signature (mtime,
+size, inode) changes, so repeated lookups, including a long-running daemon
+checking settings on every request, cost one stat() call. Updates are
+read-modify-write under a file lock and land with an atomic rename, so
+concurrent terminals and `--settings` sessions never lose or tear each
+other's changes.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple
+
+from .fileutil import atomic_write, locked
+
+_cache: Dict[str, Tuple[Tuple[int, int, int], Dict[str, str]]] = {}
+_lock = threading.Lock()
+
+
+def parse(text: str) -> Dict[str, str]:
+    settings = {}
+    for line in text.split('\n'):
+        if '=' in line:
+            k, v = line.split('=', 1)
+            settings[k.strip()] = v.strip()
+    return settings
+
+
+def _signature(path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    # Atomic writes change the inode, which catches rewrites within the mtime granularity
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def load(path: Path) -> Mapping[str, str]:
+    """Return the settings in path, re-parsing only if the file has changed.
+
+    The returned mapping is shared; copy it before modifying.
+    """
+    signature = _signature(path)
+    if signature is None:
+        return {}
+    key = str(path)
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    try:
+        settings = parse(path.read_text())
+    except FileNotFoundError:
+        return {}
+    with _lock:
+        _cache[key] = (signature, settings)
+    return settings
+
+
+def update(path: Path, changes: Mapping[str, Optional[str]]) -> None:
+    """Apply changes to the settings file; a value of None removes the key."""
+    with locked(path):
+        try:
+            settings = parse(path.read_text())
+        except FileNotFoundError:
+            settings = {}
+        for k, v in changes.items():
+            if v is None:
+                settings.pop(k, None)
+            else:
+                settings[k] = v
+        atomic_write(path, '\n'.join(f"{k}={v}" for k, v in settings.items()))
+    with _lock:
+        _cache.pop(str(path), None)
@@ -0,0 +1,210 @@
+"""
+Reuse of commands generated for near-duplicate prompts.
+
+Prompts are reduced to a set of canonical words ("list largest files in this
+dir" and "find big files here" both become {show, large, file, dir}) and
+indexed with MinHash/LSH: each prompt's signature is cut into bands, and
+prompts sharing any band hash become candidates. Candidates are then checked
+with the exact Jaccard similarity of their word sets, and numbers and paths
+must match exactly, so "kill the process on port 3000" never reuses the
+command for port 8080. Directional words (from, to, into, before, after,
+except, ...) are kept together with the word that follows them and must match
+too, so "move project into backup" never reuses the command for "move backup
+into project".
+
+The band hashes live in an indexed SQLite table next to the response cache,
+so lookups are a handful of index probes regardless of how many prompts are
+stored, and new entries are added incrementally.
+"""
+
+import re
+import sqlite3
+import zlib
+from array import array
+from pathlib import Path
+from random import Random
+from typing import FrozenSet, List, Optional, Tuple
+
+from .cache import normalize_prompt
+
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_MAX_ENTRIES = 50000
+MAX_CANDIDATES = 16
+
+_PRIME = (1 << 61) - 1
+_rng = Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_WORD_RE = re.compile(r"[\w./~*-]+")
+_STOPWORDS = frozenset(
+    "a an the in on of for with and or all any some me my i please can you that which "
+    "is are be this these those it its inside within under by".split()
+)
+# Words that give the next word a role; the pair must match exactly
+_DIRECTIONS = {
+    "from": "from", "to": "to", "into": "to", "onto": "to", "before": "before", "after": "after",
+    "since": "after", "until": "before", "except": "except", "excluding": "except", "than": "than",
+}
+_SYNONYMS = {
+    "show": "show", "list": "show", "find": "show", "display": "show", "print": "show", "get": "show",
+    "search": "show", "locate": "show", "view": "show", "see": "show", "what": "show",
+    "big": "large", "bigger": "large", "biggest": "large", "large": "large", "larger": "large",
+    "largest": "large", "huge": "large", "heavy": "large",
+    "small": "small", "smaller": "small", "smallest": "small", "tiny": "small",
+    "here": "dir", "dir": "dir", "dirs": "dir", "directory": "dir", "directories": "dir", "folder": "dir",
+    "folders": "dir", "cwd": "dir", "current": "dir", "pwd": "dir",
+    "delete": "remove", "remove": "remove", "rm": "remove", "erase": "remove",
+    "count": "count", "number": "count", "how": "count", "many": "count",
+    "recent": "new", "recently": "new", "latest": "new", "newest": "new", "new": "new",
+    "modified": "changed", "changed": "changed", "edited": "changed", "updated": "changed",
+    "kill": "kill", "stop": "kill", "terminate": "kill",
+    "process": "process", "processes": "process", "proc": "process",
+    "size": "size", "sizes": "size", "space": "size", "usage": "size",
+}
+
+
+def _canonical(word: str) -> str:
+    if word in _SYNONYMS:
+        return _SYNONYMS[word]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    return _SYNONYMS.get(word, word)
+
+
+def features(prompt: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """Return (canonical words, literals) for a prompt.
+
+    Literals are words with digits, paths or globs, and each directional word
+    paired with the word after it ("to:backup"); they must match exactly.
+    """
+    words, literals = set(), set()
+    direction = None
+    for word in _WORD_RE.findall(prompt.lower()):
+        if word in _DIRECTIONS:
+            if direction is not None:
+                literals.add(f"{direction}:")
+            direction = _DIRECTIONS[word]
+            continue
+        if any(c.isdigit() for c in word) or any(c in word for c in "./~*"):
+            literals.add(word)
+            words.add(word)
+        elif word not in _STOPWORDS:
+            word = _canonical(word)
+            words.add(word)
+        else:
+            continue
+        if direction is not None:
+            literals.add(f"{direction}:{word}")
+            direction = None
+    if direction is not None:
+        literals.add(f"{direction}:")
+    return frozenset(words), frozenset(literals)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def signature(words: FrozenSet[str]) -> array:
+    """MinHash signature of a word set (NUM_PERM 32-bit values)."""
+    hashes = [zlib.crc32(word.encode("utf-8")) for word in words]
+    return array("I", (min((a * h + b) % _PRIME for h in hashes) & 0xFFFFFFFF for a, b in _PERMUTATIONS))
+
+
+def band_keys(sig: array) -> List[int]:
+    """One integer per LSH band: the band number in the high bits, its hash in the low 32."""
+    return [(band << 32) | zlib.crc32(sig[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+
+class SimilarityIndex:
+    """Index of past prompt -> command pairs, searchable by prompt similarity."""
+
+    def __init__(self, path: Path, threshold: float = DEFAULT_THRESHOLD, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=5.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS prompts ("
+            "id INTEGER PRIMARY KEY, shell TEXT NOT NULL, prompt TEXT NOT NULL, "
+            "command TEXT NOT NULL, UNIQUE (shell, prompt))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS bands (key INTEGER NOT NULL, id INTEGER NOT NULL, "
+            "PRIMARY KEY (key, id)) WITHOUT ROWID"
+        )
+        return conn
+
+    def lookup(self, prompt: str, shell: str) -> Optional[Tuple[str, str, float]]:
+        """Return (command, matched prompt, similarity) for the closest past prompt, or None."""
+        if not self.path.exists():
+            return None
+        words, literals = features(prompt)
+        if not words:
+            return None
+        keys = band_keys(signature(words))
+        # Read-only and schema-free: lookups run before every provider call
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=5.0)
+        try:
+            # Prompts sharing the most bands are the likeliest matches; the scope is filtered
+            # before the cut, so other directories' copies of a prompt can't crowd this one out
+            rows = conn.execute(
+                "SELECT p.prompt, p.command, COUNT(*) AS shared FROM bands b JOIN prompts p ON p.id = b.id "
+                f"WHERE b.key IN ({','.join('?' * len(keys))}) AND p.shell = ? "
+                "GROUP BY p.id ORDER BY shared DESC LIMIT ?",
+                keys + [shell, MAX_CANDIDATES],
+            ).fetchall()
+        except sqlite3.OperationalError:
+            # Not created yet
+            return None
+        finally:
+            conn.close()
+
+        best = None
+        for past_prompt, command, _ in rows:
+            past_words, past_literals = features(past_prompt)
+            if past_literals != literals:
+                continue
+            score = jaccard(words, past_words)
+            if score >= self.threshold and (best is None or score > best[2]):
+                best = (command, past_prompt, score)
+        return best
+
+    def add(self, prompt: str, shell: str, command: str) -> None:
+        """Index a prompt and the command generated for it."""
+        prompt = normalize_prompt(prompt)
+        words, _ = features(prompt)
+        if not words:
+            return
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT id FROM prompts WHERE shell = ? AND prompt = ?", (shell, prompt)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE prompts SET command = ? WHERE id = ?", (command, row[0]))
+            else:
+                entry_id = conn.execute(
+                    "INSERT INTO prompts (shell, prompt, command) VALUES (?, ?, ?)", (shell, prompt, command)
+                ).lastrowid
+                conn.executemany(
+                    "INSERT OR IGNORE INTO bands (key, id) VALUES (?, ?)",
+                    [(key, entry_id) for key in band_keys(signature(words))],
+                )
+                # Trim the oldest entries in bulk rather than on every insert
+                if entry_id % 1000 == 0:
+                    cutoff = entry_id - self.max_entries
+                    conn.execute("DELETE FROM prompts WHERE id <= ?", (cutoff,))
+                    conn.execute("DELETE FROM bands WHERE id <= ?", (cutoff,))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
@@ -0,0 +1,283 @@
+"""
+Per-provider latency and health statistics.
+
+Each provider/model pair keeps exponentially weighted moving averages of
+time-to-first-token, total latency and error rate, fixed-bucket histograms of
+both latencies for percentiles, and running totals of requests, errors and the
+input/output tokens the provider reported. Requests answered without a
+provider (local patterns, the response cache, a similar earlier request) are
+counted apart. The whole store is one small JSON file whose size depends only
+on the number of provider/model pairs, so recording a request rewrites a few
+hundred bytes however long autocmd has been in use. Rate-limited providers are
+backed off exponentially.
+
+The same numbers can be written out in the Prometheus text format, for
+node_exporter's textfile collector.
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from .fileutil import atomic_write, locked
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+BUCKETS_MS = (50, 100, 150, 200, 300, 400, 600, 800, 1000, 1500, 2000, 3000, 5000, 10000)
+ALPHA = 0.2
+MIN_BACKOFF = 30.0
+MAX_BACKOFF = 15 * 60.0
+# Fewer samples than this and percentiles are not trusted
+MIN_SAMPLES = 20
+# Key of the local pattern engine's counters, kept apart from provider/model entries
+LOCAL_KEY = "_local"
+# Key of the counters of requests answered from the response cache, a similar request or a prefetch
+SERVED_KEY = "_served"
+SERVED_SOURCES = ("local", "cache", "similar", "prefetch")
+# Counted under SERVED_KEY: provider requests made speculatively, which answered nobody yet
+SPECULATIVE = "speculative"
+
+
+def _key(provider: str, model: str) -> str:
+    return f"{provider}/{model}"
+
+
+def _ewma(previous: Optional[float], value: float) -> float:
+    return value if previous is None else previous + ALPHA * (value - previous)
+
+
+def _new_entry() -> Dict[str, Any]:
+    return {
+        "requests": 0,
+        "errors": 0,
+        "ttft_ms": None,
+        "total_ms": None,
+        "error_rate": 0.0,
+        "ttft_hist": [0] * (len(BUCKETS_MS) + 1),
+        "total_hist": [0] * (len(BUCKETS_MS) + 1),
+        "ttft_sum_ms": 0.0,
+        "total_sum_ms": 0.0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "backoff": 0.0,
+        "rate_limited_until": 0.0,
+    }
+
+
+def bucket_index(ms: float) -> int:
+    """Index of the BUCKETS_MS histogram bucket that a latency in ms falls in."""
+    for i, bound in enumerate(BUCKETS_MS):
+        if ms <= bound:
+            return i
+    return len(BUCKETS_MS)
+
+
+def histogram_percentile(hist: List[int], q: float) -> Optional[float]:
+    """Estimate the q-th percentile in ms as the upper bound of the bucket it falls in."""
+    count = sum(hist)
+    if not count:
+        return None
+    target = q * count
+    seen = 0
+    for i, n in enumerate(hist):
+        seen += n
+        if seen >= target:
+            return BUCKETS_MS[i] if i < len(BUCKETS_MS) else BUCKETS_MS[-1] * 2
+    return None
+
+
+def provider_entries(data: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """The provider/model entries of a loaded store, filled in with any fields added since they were written."""
+    return {key: dict(_new_entry(), **entry) for key, entry in data.items() if not key.startswith("_")}
+
+
+def served_counts(data: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    """How many requests of a loaded store each source answered: local, cache, similar, prefetch and provider."""
+    served = dict.fromkeys(SERVED_SOURCES, 0)
+    served.update(data.get(SERVED_KEY) or {})
+    speculative = served.pop(SPECULATIVE, 0)
+    served["local"] = (data.get(LOCAL_KEY) or {}).get("hits", 0)
+    provider = sum(entry["requests"] - entry["errors"] for entry in provider_entries(data).values())
+    served["provider"] = max(provider - speculative, 0)
+    return served
+
+
+class StatsStore:
+    """Reads and updates the provider stats file.
+
+    If textfile is set, every update also rewrites it with the metrics in the
+    Prometheus text format.
+    """
+
+    def __init__(self, path: Path, textfile: Optional[Path] = None):
+        self.path = path
+        self.textfile = textfile
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, data: Dict[str, Dict[str, Any]]) -> None:
+        atomic_write(self.path, json.dumps(data, separators=(",", ":")))
+        if self.textfile is not None:
+            # node_exporter usually runs as another user
+            atomic_write(self.textfile, prometheus_text(data), mode=0o644)
+
+    def _update(self, provider: str, model: str, apply) -> None:
+        with locked(self.path):
+            data = self.load()
+            entry = data.setdefault(_key(provider, model), _new_entry())
+            for field, value in _new_entry().items():
+                entry.setdefault(field, value)
+            apply(entry)
+            self._save(data)
+
+    def record_success(self, provider: str, model: str, ttft: float, total: float,
+                       usage: Optional[Dict[str, int]] = None) -> None:
+        """Record a successful request; ttft and total are in seconds, usage as from read_usage()."""
+        def apply(entry):
+            entry["requests"] += 1
+            entry["ttft_ms"] = _ewma(entry["ttft_ms"], ttft * 1000)
+            entry["total_ms"] = _ewma(entry["total_ms"], total * 1000)
+            entry["error_rate"] = _ewma(entry["error_rate"], 0.0)
+            entry["ttft_hist"][bucket_index(ttft * 1000)] += 1
+            entry["total_hist"][bucket_index(total * 1000)] += 1
+            entry["ttft_sum_ms"] += ttft * 1000
+            entry["total_sum_ms"] += total * 1000
+            if usage:
+                entry["input_tokens"] += usage.get("input_tokens", 0)
+                entry["output_tokens"] += usage.get("output_tokens", 0)
+            entry["backoff"] = 0.0
+        self._update(provider, model, apply)
+
+    def record_error(self, provider: str, model: str, rate_limited: bool = False,
+                     retry_after: Optional[float] = None) -> None:
+        """Record a failed request, backing the provider off if it is rate limiting."""
+        def apply(entry):
+            entry["requests"] += 1
+            entry["errors"] += 1
+            entry["error_rate"] = _ewma(entry["error_rate"], 1.0)
+            if rate_limited:
+                backoff = retry_after or min(max(entry["backoff"] * 2, MIN_BACKOFF), MAX_BACKOFF)
+                entry["backoff"] = backoff
+                entry["rate_limited_until"] = time.time() + backoff
+        self._update(provider, model, apply)
+
+    def record_local(self, pattern: Optional[str]) -> None:
+        """Count a request seen by the local pattern engine; pattern is None on a miss."""
+        with locked(self.path):
+            data = self.load()
+            entry = data.setdefault(LOCAL_KEY, {"requests": 0, "hits": 0, "patterns": {}})
+            entry["requests"] += 1
+            if pattern is not None:
+                entry["hits"] += 1
+                entry["patterns"][pattern] = entry["patterns"].get(pattern, 0) + 1
+            self._save(data)
+
+    def record_served(self, source: str) -> None:
+        """Count a request answered without a provider; source is "cache", "similar" or "prefetch".
+
+        Local pattern hits are counted by record_local. SPECULATIVE counts a
+        prefetch generation, which is recorded as a provider request as well.
+        """
+        with locked(self.path):
+            data = self.load()
+            served = data.setdefault(SERVED_KEY, {})
+            served[source] = served.get(source, 0) + 1
+            self._save(data)
+
+    def local_summary(self) -> Dict[str, Any]:
+        """Return the local hit counts plus the provider latency they avoided, in ms."""
+        data = self.load()
+        entry = data.get(LOCAL_KEY) or {"requests": 0, "hits": 0, "patterns": {}}
+        latencies = [e["total_ms"] for e in provider_entries(data).values() if e["total_ms"]]
+        average = sum(latencies) / len(latencies) if latencies else None
+        return dict(entry, saved_ms=entry["hits"] * average if average is not None else None)
+
+    def percentile(self, provider: str, model: str, q: float) -> Optional[float]:
+        """Estimate the q-th TTFT percentile in seconds from the histogram."""
+        entry = self.load().get(_key(provider, model))
+        if not entry:
+            return None
+        hist = entry["ttft_hist"]
+        if sum(hist) < MIN_SAMPLES:
+            return None
+        bound = histogram_percentile(hist, q)
+        return bound / 1000 if bound is not None else None
+
+    def choose(self, candidates: Sequence[Sequence[str]]) -> int:
+        """Return the index of the fastest healthy (provider, model) candidate.
+
+        Candidates with no requests yet are preferred so every provider gets
+        measured; rate-limited ones are skipped unless nothing else is available.
+        """
+        data = self.load()
+        now = time.time()
+        best, best_score = 0, None
+        for index, (provider, model) in enumerate(candidates):
+            entry = data.get(_key(provider, model))
+            if entry is None or not entry["requests"]:
+                score = -1.0
+            else:
+                # A provider that has only failed so far counts as slower than any measured one
+                ttft = entry["ttft_ms"] if entry["ttft_ms"] is not None else BUCKETS_MS[-1]
+                score = ttft * (1 + 4 * entry["error_rate"])
+                if entry["rate_limited_until"] > now:
+                    score += 1e9
+            if best_score is None or score < best_score:
+                best, best_score = index, score
+        return best
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: str) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def prometheus_text(data: Dict[str, Dict[str, Any]]) -> str:
+    """Render loaded stats in the Prometheus text exposition format."""
+    entries = provider_entries(data)
+    labelled = []
+    for key, entry in sorted(entries.items()):
+        provider, _, model = key.partition("/")
+        labelled.append((_labels(provider=provider, model=model), entry))
+
+    lines = []
+
+    def family(name: str, kind: str, description: str) -> None:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for name, field, description in (
+        ("autocmd_provider_requests_total", "requests", "Requests sent to the provider."),
+        ("autocmd_provider_errors_total", "errors", "Requests to the provider that failed."),
+        ("autocmd_input_tokens_total", "input_tokens", "Input tokens reported by the provider."),
+        ("autocmd_output_tokens_total", "output_tokens", "Output tokens reported by the provider."),
+    ):
+        family(name, "counter", description)
+        lines.extend(f"{name}{labels} {entry[field]}" for labels, entry in labelled)
+
+    for name, prefix, description in (
+        ("autocmd_ttft_seconds", "ttft", "Time from request to first token."),
+        ("autocmd_latency_seconds", "total", "Time from request to complete response."),
+    ):
+        family(name, "histogram", description)
+        for labels, entry in labelled:
+            cumulative = 0
+            for bound, n in zip(BUCKETS_MS + (None,), entry[f"{prefix}_hist"]):
+                cumulative += n
+                le = "+Inf" if bound is None else repr(bound / 1000)
+                lines.append(f'{name}_bucket{labels[:-1]},le="{le}"}} {cumulative}')
+            lines.append(f"{name}_sum{labels} {entry[f'{prefix}_sum_ms'] / 1000:.6f}")
+            lines.append(f"{name}_count{labels} {cumulative}")
+
+    family("autocmd_served_total", "counter", "Requests answered, by what answered them.")
+    lines.extend(f"autocmd_served_total{_labels(source=source)} {count}" for source, count in served_counts(data).items())
+    family("autocmd_prefetch_generations_total", "counter", "Commands generated speculatively while a prompt was typed.")
+    lines.append(f"autocmd_prefetch_generations_total {(data.get(SERVED_KEY) or {}).get(SPECULATIVE, 0)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,180 @@
+"""
+Stdio JSON-RPC server mode for editor and tool integrations.
+
+`autocmd --serve-stdio` runs one long-lived process that reads JSON-RPC 2.0
+messages from stdin and writes them to stdout, one per line, so a plugin pays
+interpreter start-up, SDK imports and connection set-up once. Requests run
+concurrently and are told apart by id:
+
+    -> {"jsonrpc": "2.0", "id": 1, "method": "generate",
+        "params": {"prompt": "...", "shell": "/bin/zsh", "cwd": "...", "no_cache": false}}
+    <- {"jsonrpc": "2.0", "method": "token", "params": {"id": 1, "text": "ls "}}   (while streaming)
+    <- {"jsonrpc": "2.0", "id": 1, "result": {"command": "ls -la",
+        "timing": {"queued_ms": 0.1, "first_token_ms": 212.4, "total_ms": 388.0}}}
+
+    -> {"jsonrpc": "2.0", "method": "cancel", "params": {"id": 1}}
+    <- {"jsonrpc": "2.0", "id": 1, "error": {"code": -32800, "message": "Request cancelled"}}
+
+`$/cancelRequest` is accepted as an alias of `cancel`. `shutdown` answers with
+a null result and stops the server once running requests have finished, as
+does the end of stdin (which cancels them first). Requests are served by the
+same handler as the daemon (see daemon.Handler).
+"""
+
+import json
+import threading
+import time
+from typing import Any, BinaryIO, Dict, Optional
+
+from .daemon import Handler
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+REQUEST_CANCELLED = -32800
+
+
+def _valid_id(value: Any) -> bool:
+    """JSON-RPC ids are strings, integers or null; anything else can't key the pending requests."""
+    return value is None or isinstance(value, str) or (isinstance(value, int) and not isinstance(value, bool))
+
+
+class StdioServer:
+    """Dispatches JSON-RPC requests from a line stream to a daemon-style handler."""
+
+    def __init__(self, rfile: BinaryIO, wfile: BinaryIO, handler: Handler):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.handler = handler
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._pending: Dict[Any, threading.Event] = {}
+        self._threads = []
+
+    def send(self, message: Dict[str, Any]) -> None:
+        data = json.dumps(dict(jsonrpc="2.0", **message)).encode("utf-8") + b"\n"
+        # One write per message, so concurrent requests never interleave within a line
+        with self._write_lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+    def _error(self, request_id: Any, code: int, message: str) -> None:
+        self.send({"id": request_id, "error": {"code": code, "message": message}})
+
+    def serve(self) -> None:
+        """Read messages until stdin closes or a shutdown request arrives."""
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError:
+                self._error(None, PARSE_ERROR, "Parse error")
+                continue
+            if not isinstance(message, dict) or not isinstance(message.get("method"), str) \
+                    or not _valid_id(message.get("id")):
+                request_id = message.get("id") if isinstance(message, dict) else None
+                self._error(request_id if _valid_id(request_id) else None, INVALID_REQUEST, "Invalid request")
+                continue
+            if self._dispatch(message):
+                break
+        else:
+            # The client went away: nobody is left to read the results
+            with self._lock:
+                for cancelled in self._pending.values():
+                    cancelled.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _dispatch(self, message: Dict[str, Any]) -> bool:
+        """Handle one message; returns True when the server should stop."""
+        method, request_id = message["method"], message.get("id")
+        params = message.get("params") or {}
+        if method in ("cancel", "$/cancelRequest"):
+            target = params.get("id") if isinstance(params, dict) else None
+            if not _valid_id(target):
+                # A notification: there is no one to answer, and no such request can be pending
+                return False
+            with self._lock:
+                cancelled = self._pending.get(target)
+            if cancelled is not None:
+                cancelled.set()
+            return False
+        if method == "shutdown":
+            for thread in self._threads:
+                thread.join()
+            if request_id is not None:
+                self.send({"id": request_id, "result": None})
+            return True
+        if method != "generate":
+            if request_id is not None:
+                self._error(request_id, METHOD_NOT_FOUND, f"Method not found: {method}")
+            return False
+        if request_id is None or not isinstance(params, dict) or not isinstance(params.get("prompt"), str):
+            self._error(request_id, INVALID_PARAMS, "generate needs an id and a prompt")
+            return False
+        with self._lock:
+            if request_id in self._pending:
+                self._error(request_id, INVALID_REQUEST, f"Request id already in use: {request_id}")
+                return False
+            cancelled = self._pending[request_id] = threading.Event()
+        thread = threading.Thread(target=self._run, args=(request_id, params, cancelled, time.monotonic()),
+                                  daemon=True)
+        self._threads = [t for t in self._threads if t.is_alive()] + [thread]
+        thread.start()
+        return False
+
+    def _run(self, request_id: Any, params: Dict[str, Any], cancelled: threading.Event, received: float) -> None:
+        start = time.monotonic()
+        first: Optional[float] = None
+        answered = False
+
+        def send(message: Dict[str, Any]) -> None:
+            nonlocal first, answered
+            if "token" in message:
+                if first is None:
+                    first = time.monotonic()
+                self.send({"method": "token", "params": {"id": request_id, "text": message["token"]}})
+            elif "command" in message:
+                # Answer now; the handler may still have bookkeeping (cache, history) to do
+                end = time.monotonic()
+                timing = {
+                    "queued_ms": round((start - received) * 1000, 1),
+                    # A cached command arrives whole, with no tokens before it
+                    "first_token_ms": round(((first or end) - received) * 1000, 1),
+                    "total_ms": round((end - received) * 1000, 1),
+                }
+                answered = True
+                self._release(request_id, cancelled)
+                result = {"command": message["command"], "timing": timing}
+                if message.get("similar_to"):
+                    result["similar_to"] = message["similar_to"]
+                self.send({"id": request_id, "result": result})
+
+        try:
+            self.handler(params, send, cancelled)
+        except BrokenPipeError:
+            # stdout is gone; there is no one to report to
+            return
+        except Exception as e:
+            if not answered:
+                self._error(request_id, SERVER_ERROR, str(e))
+            return
+        finally:
+            self._release(request_id, cancelled)
+        if not answered:
+            self._error(request_id, REQUEST_CANCELLED if cancelled.is_set() else SERVER_ERROR,
+                        "Request cancelled" if cancelled.is_set() else "No command generated")
+
+    def _release(self, request_id: Any, cancelled: threading.Event) -> None:
+        """Free the request id for reuse, unless a newer request has already taken it."""
+        with self._lock:
+            if self._pending.get(request_id) is cancelled:
+                del self._pending[request_id]
+
+
+def serve(rfile: BinaryIO, wfile: BinaryIO, handler: Handler) -> None:
+    """Serve JSON-RPC requests from rfile, writing responses to wfile, until either side is done."""
+    StdioServer(rfile, wfile, handler).serve()
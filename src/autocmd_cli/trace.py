@@ -0,0 +1,122 @@
+"""
+Phase-level timing for one autocmd run.
+
+Call sites drop named marks (`trace.mark("dotenv")`) at the end of each phase;
+a phase's duration is the time since the previous mark. Marks are no-ops until
+tracing is enabled, so they can stay in the hot path.
+
+Enable with `autocmd --timings "..."` to print a breakdown to stderr, or with
+AUTOCMD_TRACE: `1`/`stderr` prints to stderr, any other value is a file path
+that each run appends one JSON line to.
+"""
+
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Taken when the package starts importing, so the first phase covers imports
+START = time.monotonic()
+_imported: Optional[float] = None
+_enabled = False
+_output: Optional[str] = None
+_events: List[Tuple[str, float]] = []
+_counts: Dict[str, int] = {}
+_extra: Dict[str, Any] = {}
+
+
+def imported() -> None:
+    """Note that package imports have finished; recorded even while disabled."""
+    global _imported
+    _imported = time.monotonic()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(output: Optional[str] = None) -> None:
+    """Start recording; the report is written when the process exits."""
+    global _enabled, _output
+    if _enabled:
+        return
+    import atexit
+    _enabled = True
+    _output = output
+    if _imported is not None:
+        _events.append(("imports", _imported))
+    atexit.register(report)
+
+
+def configure(timings_flag: bool = False) -> None:
+    """Enable tracing from the --timings flag or the AUTOCMD_TRACE variable."""
+    value = os.environ.get("AUTOCMD_TRACE", "")
+    if value and value not in ("0", "1", "stderr"):
+        enable(value)
+    elif timings_flag or value in ("1", "stderr"):
+        enable()
+
+
+def mark(name: str) -> None:
+    """Mark the end of a phase."""
+    if _enabled:
+        _events.append((name, time.monotonic()))
+
+
+def count(name: str) -> None:
+    """Count an event that is too frequent or scattered to be its own phase."""
+    if _enabled:
+        _counts[name] = _counts.get(name, 0) + 1
+
+
+def annotate(**fields: Any) -> None:
+    """Attach context (provider, model, ...) to the report."""
+    if _enabled:
+        _extra.update(fields)
+
+
+def phases() -> List[Tuple[str, float]]:
+    """Return (phase, milliseconds) pairs in the order they ended."""
+    result = []
+    previous = START
+    for name, at in _events:
+        result.append((name, (at - previous) * 1000))
+        previous = at
+    return result
+
+
+def report() -> None:
+    """Write the breakdown to stderr or append it to the trace file."""
+    if not _events:
+        return
+    total = (_events[-1][1] - START) * 1000
+    if _output:
+        record = dict(_extra, time=time.time(), total_ms=round(total, 2), counts=dict(_counts),
+                      phases=[[name, round(ms, 2)] for name, ms in phases()])
+        try:
+            with open(_output, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"autocmd: could not write trace to {_output}: {e}", file=sys.stderr)
+        return
+
+    lines = ["autocmd timings (ms):"]
+    lines += [f"  {name:<16}{ms:9.1f}" for name, ms in phases()]
+    lines.append(f"  {'total':<16}{total:9.1f}")
+    lines += [f"  {name}: {n}" for name, n in sorted(_counts.items())]
+    lines += [f"  {key}: {value}" for key, value in sorted(_extra.items())]
+    print("\n".join(lines), file=sys.stderr)
+
+
+def reset() -> None:
+    """Disable tracing and drop recorded marks."""
+    global _enabled, _output
+    if _enabled:
+        import atexit
+        atexit.unregister(report)
+    _enabled = False
+    _output = None
+    _events.clear()
+    _counts.clear()
+    _extra.clear()
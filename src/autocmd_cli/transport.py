@@ -0,0 +1,272 @@
+"""
+Minimal standard-library HTTP transport for provider calls.
+
+Speaks the Anthropic Messages API and the OpenAI chat-completions API,
+including their server-sent-event streams, with nothing but http.client and
+ssl. Importing this module costs a few milliseconds, versus hundreds for the
+anthropic/openai SDKs and their pydantic/httpx dependencies, which matters for
+a CLI that makes exactly one request per process.
+
+Select it with AUTOCMD_TRANSPORT=http or `transport=http` in settings.
+Base URLs of the form `http+unix://<percent-encoded socket path>/v1` reach a
+server on a Unix domain socket.
+"""
+
+import http.client
+import json
+import socket
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from . import trace
+
+ANTHROPIC_BASE_URL = "https://api.anthropic.com"
+ANTHROPIC_VERSION = "2023-06-01"
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+USER_AGENT = "autocmd-cli"
+
+
+class TransportError(Exception):
+    """An HTTP error returned by the provider API."""
+
+    def __init__(self, status_code: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class TransportConnectionError(TransportError):
+    """The provider API could not be reached, or the connection failed during the request."""
+
+    def __init__(self, error: OSError):
+        Exception.__init__(self, f"Connection error: {error}")
+        self.status_code = None
+        self.headers = {}
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket; "localhost" is only used for the Host header."""
+
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class HTTPTransport:
+    """Keep-alive JSON/SSE client for one API endpoint."""
+
+    def __init__(self, base_url: str, headers: Dict[str, str], timeout: float = 60.0):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or "https"
+        self.host = parts.hostname or ""
+        # The netloc is case-sensitive here, so it can't come from parts.hostname
+        self.socket_path = unquote(parts.netloc) if self.scheme == "http+unix" else None
+        self.port = parts.port
+        self.prefix = parts.path.rstrip("/")
+        self.headers = dict(headers, **{"content-type": "application/json", "user-agent": USER_AGENT})
+        self.timeout = timeout
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self._ssl_context: Any = None
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        if self.socket_path is not None:
+            return UnixHTTPConnection(self.socket_path, self.timeout)
+        if self.scheme == "http":
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        if self._ssl_context is None:
+            import ssl
+            self._ssl_context = ssl.create_default_context()
+        return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self._ssl_context)
+
+    def _checkout(self) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def _checkin(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._idle.append(conn)
+
+    def _request(self, path: str, body: Dict[str, Any]) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        payload = json.dumps(body).encode("utf-8")
+        while True:
+            conn, reused = self._checkout()
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                    trace.mark("connect")
+                conn.request("POST", self.prefix + path, body=payload, headers=self.headers)
+                response = conn.getresponse()
+                trace.mark("response_headers")
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                conn.close()
+                if reused:
+                    # The server dropped an idle keep-alive connection; retry on a fresh one
+                    continue
+                raise TransportConnectionError(e) from e
+            except OSError as e:
+                # Refused connections, DNS failures, timeouts and TLS errors alike
+                conn.close()
+                raise TransportConnectionError(e) from e
+            except BaseException:
+                conn.close()
+                raise
+            if response.status >= 400:
+                data = response.read()
+                conn.close()
+                raise TransportError(
+                    response.status, _error_message(data), {k.lower(): v for k, v in response.getheaders()}
+                )
+            return conn, response
+
+    def post_json(self, path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """POST a JSON body and return the decoded JSON response."""
+        conn, response = self._request(path, body)
+        try:
+            data = response.read()
+        except OSError as e:
+            conn.close()
+            raise TransportConnectionError(e) from e
+        except BaseException:
+            conn.close()
+            raise
+        self._checkin(conn)
+        return json.loads(data)
+
+    def stream_events(self, path: str, body: Dict[str, Any]) -> Iterator[Tuple[str, str]]:
+        """POST a JSON body and yield (event, data) pairs from the SSE response."""
+        conn, response = self._request(path, body)
+        finished = False
+        try:
+            event, data = "", []
+            while True:
+                try:
+                    line = response.readline()
+                except OSError as e:
+                    raise TransportConnectionError(e) from e
+                if not line:
+                    break
+                line = line.decode("utf-8").rstrip("\r\n")
+                if not line:
+                    if data:
+                        yield event, "\n".join(data)
+                    event, data = "", []
+                elif line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    data.append(line[5:].lstrip())
+            finished = True
+        finally:
+            # A half-read response cannot be reused, so only finished streams go back to the pool
+            if finished and response.isclosed():
+                self._checkin(conn)
+            else:
+                conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def _error_message(data: bytes) -> str:
+    try:
+        error = json.loads(data).get("error")
+    except (ValueError, AttributeError):
+        return data.decode("utf-8", "replace")[:200]
+    if isinstance(error, dict):
+        return error.get("message") or json.dumps(error)
+    return str(error)
+
+
+class AnthropicTransport(HTTPTransport):
+    """Anthropic Messages API over HTTPTransport."""
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, timeout: float = 60.0):
+        super().__init__(
+            base_url or ANTHROPIC_BASE_URL,
+            {"x-api-key": api_key, "anthropic-version": ANTHROPIC_VERSION},
+            timeout,
+        )
+
+    def generate(self, request: Dict[str, Any], usage: Optional[Dict[str, Any]] = None) -> str:
+        """Send a Messages API request body and return the response text.
+
+        usage, if given, is updated with the token counts the API reports.
+        """
+        response = self.post_json("/v1/messages", request)
+        if usage is not None:
+            usage.update(response.get("usage") or {})
+        return "".join(block.get("text", "") for block in response.get("content", []))
+
+    def generate_stream(self, request: Dict[str, Any], usage: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Send a Messages API request body and yield the streamed text.
+
+        usage, if given, is updated with the token counts as they arrive.
+        """
+        for event, data in self.stream_events("/v1/messages", dict(request, stream=True)):
+            payload = json.loads(data)
+            kind = payload.get("type", event)
+            if usage is not None:
+                # Input tokens come with message_start, the final output count with message_delta
+                usage.update((payload.get("message") or payload).get("usage") or {})
+            if kind == "content_block_delta":
+                text = payload.get("delta", {}).get("text")
+                if text:
+                    yield text
+            elif kind == "error":
+                error = payload.get("error", {})
+                status = 529 if error.get("type") == "overloaded_error" else 500
+                raise TransportError(status, error.get("message", data))
+
+
+class OpenAITransport(HTTPTransport):
+    """OpenAI chat-completions API over HTTPTransport."""
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, timeout: float = 60.0):
+        super().__init__(base_url or OPENAI_BASE_URL, {"authorization": f"Bearer {api_key}"}, timeout)
+
+    def generate(self, request: Dict[str, Any], usage: Optional[Dict[str, Any]] = None) -> str:
+        """Send a chat-completions request body and return the response text.
+
+        usage, if given, is updated with the token counts the API reports.
+        """
+        response = self.post_json("/chat/completions", request)
+        if usage is not None:
+            usage.update(response.get("usage") or {})
+        return response["choices"][0]["message"]["content"] or ""
+
+    def generate_stream(self, request: Dict[str, Any], usage: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Send a chat-completions request body and yield the streamed text.
+
+        usage, if given, is updated from the usage chunk that ends the stream
+        when the request asks for one (stream_options.include_usage).
+        """
+        for _, data in self.stream_events("/chat/completions", dict(request, stream=True)):
+            if data == "[DONE]":
+                # Keep reading to the end of the body so the connection can be reused
+                continue
+            payload = json.loads(data)
+            if "error" in payload:
+                raise TransportError(500, _error_message(data.encode("utf-8")))
+            if usage is not None and payload.get("usage"):
+                usage.update(payload["usage"])
+            choices = payload.get("choices") or []
+            if choices:
+                text = (choices[0].get("delta") or {}).get("content")
+                if text:
+                    yield text
@@ -0,0 +1,112 @@
+"""Tests for batch mode."""
+import asyncio
+import io
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from autocmd_cli.batch import BatchRunner, BatchSummary
+from autocmd_cli.llm_providers import LLMProvider
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class _FakeProvider(LLMProvider):
+    """Async provider that echoes prompts after a per-prompt delay."""
+
+    active = 0
+    peak = 0
+
+    def default_model(self):
+        return "fake-model"
+
+    @classmethod
+    def env_var_name(cls):
+        return "FAKE_API_KEY"
+
+    def generate(self, prompt, max_tokens=200, system=None):
+        raise NotImplementedError
+
+    def generate_stream(self, prompt, max_tokens=200, system=None):
+        raise NotImplementedError
+
+    async def _agenerate(self, prompt, max_tokens, system=None):
+        cls = type(self)
+        cls.active += 1
+        cls.peak = max(cls.peak, cls.active)
+        try:
+            if prompt == "throttle" and not getattr(self, "throttled", False):
+                self.throttled = True
+                raise RateLimited("rate limited")
+            if prompt == "fail":
+                raise RuntimeError("provider exploded")
+            await asyncio.sleep(0.05 if prompt == "slow" else 0.001)
+            return f"```bash\necho {prompt}\n```"
+        finally:
+            cls.active -= 1
+
+
+def _run(lines, **kwargs):
+    _FakeProvider.active = _FakeProvider.peak = 0
+    runner = BatchRunner(
+        lambda name, model: _FakeProvider("key", model),
+        "fake",
+        lambda prompt: prompt,
+        lambda response: response.strip("`\n").replace("bash\n", ""),
+        backoff=0.001,
+        **kwargs,
+    )
+    results = []
+    source = io.StringIO("".join(line + "\n" for line in lines))
+    summary = asyncio.run(runner.run(source, results.append))
+    return results, summary
+
+
+def test_results_in_input_order():
+    """Test that ordered mode writes results in input order."""
+    lines = [json.dumps("slow")] + [json.dumps({"prompt": f"p{i}", "id": i}) for i in range(20)]
+    results, summary = _run(lines, concurrency=4)
+    assert [r["index"] for r in results] == list(range(21))
+    assert results[0]["command"] == "echo slow"
+    assert results[1]["id"] == 0
+    assert summary.total == 21 and summary.succeeded == 21
+    assert _FakeProvider.peak <= 4
+
+
+def test_unordered_writes_as_completed():
+    """Test that unordered mode does not hold results behind a slow item."""
+    lines = [json.dumps("slow"), json.dumps("fast")]
+    results, _ = _run(lines, concurrency=2, ordered=False)
+    assert [r["prompt"] for r in results] == ["fast", "slow"]
+
+
+def test_per_item_errors_and_retries():
+    """Test that bad lines and provider errors fail only their own item."""
+    lines = ["not json", json.dumps("fail"), json.dumps("throttle"), json.dumps({"nope": 1})]
+    results, summary = _run(lines)
+    assert "Invalid input line" in results[0]["error"]
+    assert results[1]["error"] == "provider exploded"
+    assert results[2]["command"] == "echo throttle"
+    assert results[2]["attempts"] == 2
+    assert "Invalid input line" in results[3]["error"]
+    assert summary.failed == 3 and summary.retries == 1
+
+
+def test_summary_latency_histogram_is_fixed_size():
+    """Test that the summary keeps latency percentiles in fixed buckets, however many items ran."""
+    summary = BatchSummary()
+    size = len(summary.latency_hist)
+    for i in range(10000):
+        summary.add_latency(120.0 if i % 20 else 2500.0)
+    summary.total = summary.succeeded = 10000
+    summary.elapsed = 10.0
+    assert len(summary.latency_hist) == size
+    assert summary.format() == (
+        "10000 prompts, 10000 ok, 0 failed, 0 retries in 10.0s (1000.0 prompts/s), latency p50 <=150ms p95 <=150ms"
+    )
+    summary.add_latency(2500.0)
+    assert summary.format().endswith("p95 <=3000ms")
@@ -0,0 +1,94 @@
+"""Tests for the on-disk response cache."""
+import os
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import autocmd_cli as autocmd
+from autocmd_cli.cache import ResponseCache, make_key
+
+
+def test_make_key_normalizes_whitespace():
+    """Test that whitespace differences share a cache key."""
+    a = make_key("list  files\n", "anthropic", "m", "/bin/zsh")
+    b = make_key("list files", "anthropic", "m", "/bin/zsh")
+    assert a == b
+    assert a != make_key("list files", "groq", "m", "/bin/zsh")
+    assert a != make_key("list files", "anthropic", "m", "/bin/bash")
+
+
+def test_cache_roundtrip_and_ttl(tmp_path):
+    """Test that entries are returned until they expire."""
+    cache = ResponseCache(tmp_path / "cache.db", ttl=60)
+    assert cache.get("k") is None
+    cache.put("k", "ls -la")
+    assert cache.get("k") == "ls -la"
+
+    with patch("autocmd_cli.cache.time.time", return_value=time.time() + 120):
+        assert cache.get("k") is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Test that the size limit evicts the least recently used entry."""
+    cache = ResponseCache(tmp_path / "cache.db", max_entries=2)
+    cache.put("a", "cmd a")
+    time.sleep(0.01)
+    cache.put("b", "cmd b")
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.put("c", "cmd c")
+    assert cache.get("b") is None
+    assert cache.get("a") == "cmd a"
+    assert cache.get("c") == "cmd c"
+
+
+def test_pop_flags_from_joined_argument():
+    """Test that flags are peeled off the wrapper's single joined argument."""
+    flags, args = autocmd.pop_flags(["--no-cache list files"], ("--no-cache",))
+    assert flags == {"--no-cache"}
+    assert args == ["list files"]
+
+    flags, args = autocmd.pop_flags(["--no-cache", "list files"], ("--no-cache",))
+    assert flags == {"--no-cache"}
+    assert args == ["list files"]
+
+
+def test_main_cache_hit_skips_provider(tmp_path, capsys):
+    """Test that a cache hit prints the command without building a provider."""
+    cache = ResponseCache(tmp_path / "cache.db")
+    key = make_key("list files by size", "anthropic", "claude-haiku-4-5-20251001", "/bin/zsh")
+    cache.put(key, "ls -S")
+
+    env = {"SHELL": "/bin/zsh", "AUTOCMD_PROVIDER": "anthropic", "ANTHROPIC_API_KEY": "x"}
+    with patch.dict(os.environ, env), \
+            patch.object(autocmd, "get_config_dir", return_value=tmp_path), \
+            patch.object(autocmd, "is_shell_setup", return_value=True), \
+            patch.object(autocmd, "get_provider") as get_provider, \
+            patch.object(sys, "argv", ["autocmd", "list files by size"]):
+        os.environ.pop("AUTOCMD_MODEL", None)
+        autocmd.main()
+
+    get_provider.assert_not_called()
+    assert capsys.readouterr().out == "ls -S\n"
+
+
+def test_cache_is_per_directory_with_context(tmp_path):
+    """Test that with context on, a command cached in one directory is not served in another."""
+    (tmp_path / "settings").write_text("context=true\n")
+    other = tmp_path / "other"
+    other.mkdir()
+    cache = ResponseCache(tmp_path / "cache.db")
+    key = make_key("list files by size", "anthropic", "claude-haiku-4-5-20251001", f"/bin/zsh:{tmp_path}")
+    cache.put(key, "ls -S")
+
+    env = {"SHELL": "/bin/zsh", "AUTOCMD_PROVIDER": "anthropic", "ANTHROPIC_API_KEY": "x"}
+    with patch.dict(os.environ, env), patch.object(autocmd, "get_config_dir", return_value=tmp_path):
+        os.environ.pop("AUTOCMD_MODEL", None)
+        assert autocmd.cache_scope("/bin/zsh", str(tmp_path)) == f"/bin/zsh:{tmp_path}"
+        assert autocmd.lookup_cache("list files by size", "anthropic", None, f"/bin/zsh:{tmp_path}")[1] == "ls -S"
+        assert autocmd.lookup_cache("list files by size", "anthropic", None,
+                                    autocmd.cache_scope("/bin/zsh", str(other)))[1] is None
@@ -0,0 +1,118 @@
+"""Tests for recording and replaying provider streams."""
+import os
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import autocmd_cli as autocmd
+from autocmd_cli.cassette import Cassette, RecordingProvider, ReplayError, ReplayProvider
+from autocmd_cli.llm_providers import LLMProvider
+
+FIXTURE = Path(__file__).parent / "cassettes" / "list_files.jsonl"
+
+
+class FakeProvider(LLMProvider):
+    def __init__(self, chunks, delay=0.0, error=None):
+        self.chunks = chunks
+        self.delay = delay
+        self.error = error
+        super().__init__("key", None)
+
+    def default_model(self):
+        return "fake-model"
+
+    @classmethod
+    def env_var_name(cls):
+        return "FAKE_API_KEY"
+
+    def generate(self, prompt, max_tokens=200, system=None):
+        return "".join(self.generate_stream(prompt, max_tokens, system))
+
+    def generate_stream(self, prompt, max_tokens=200, system=None):
+        for chunk in self.chunks:
+            time.sleep(self.delay)
+            yield chunk
+        if self.error:
+            raise self.error
+
+
+def replay_time(provider, prompt, system=None):
+    start = time.monotonic()
+    text = "".join(provider.generate_stream(prompt, 64, system))
+    return text, time.monotonic() - start
+
+
+def test_record_then_replay_at_speed(tmp_path):
+    """Test that a recorded stream replays with its text and timing, scaled by speed."""
+    path = tmp_path / "c.jsonl"
+    recorder = RecordingProvider(FakeProvider(["ls", " -la", " /tmp"], delay=0.02), path)
+    assert "".join(recorder.generate_stream("list tmp", 64, "be brief")) == "ls -la /tmp"
+
+    (interaction,) = next(iter(Cassette(path).load().values()))
+    assert [text for _, text in interaction["chunks"]] == ["ls", " -la", " /tmp"]
+    assert all(delay >= 15 for delay, _ in interaction["chunks"])
+    assert interaction["model"] == "fake-model" and interaction["max_tokens"] == 64
+
+    text, recorded = replay_time(ReplayProvider(path, speed=1), "list tmp", "be brief")
+    assert text == "ls -la /tmp"
+    assert recorded >= 0.055
+    _, faster = replay_time(ReplayProvider(path, speed=10), "list tmp", "be brief")
+    assert faster < recorded / 3
+    _, instant = replay_time(ReplayProvider(path, speed=0), "list tmp", "be brief")
+    assert instant < 0.01
+
+
+def test_replay_matching(tmp_path):
+    """Test that replay matches on prompt and instructions, cycles repeats and rejects unknown prompts."""
+    path = tmp_path / "c.jsonl"
+    RecordingProvider(FakeProvider(["one"]), path).generate("p", system="s")
+    RecordingProvider(FakeProvider(["two"]), path).generate("p", system="s")
+    RecordingProvider(FakeProvider(["other"]), path).generate("p", system="t")
+
+    replay = ReplayProvider(path, speed=0)
+    assert [replay.generate("p", system="s") for _ in range(3)] == ["one", "two", "one"]
+    assert replay.generate("p", system="t") == "other"
+    # Changed instructions fall back to any recording of the prompt
+    assert replay.generate("p", system="new") in ("one", "two", "other")
+    with pytest.raises(LookupError):
+        replay.generate("unknown", system="s")
+
+
+def test_replay_raises_recorded_error(tmp_path):
+    """Test that a failed stream replays its chunks, then its error with the status code."""
+    error = RuntimeError("overloaded")
+    error.status_code = 529
+    path = tmp_path / "c.jsonl"
+    recorder = RecordingProvider(FakeProvider(["ls"], error=error), path)
+    with pytest.raises(RuntimeError):
+        list(recorder.generate_stream("p"))
+
+    received = []
+    with pytest.raises(ReplayError) as raised:
+        for chunk in ReplayProvider(path, speed=0).generate_stream("p"):
+            received.append(chunk)
+    assert received == ["ls"]
+    assert raised.value.status_code == 529 and str(raised.value) == "overloaded"
+
+
+def test_main_replays_fixture_without_network(tmp_path, capsys):
+    """Test the full pipeline against a recorded stream, with a bound on autocmd's own overhead."""
+    env = {"SHELL": "/bin/zsh", "AUTOCMD_PROVIDER": "anthropic", "ANTHROPIC_API_KEY": "x",
+           "AUTOCMD_CASSETTE": str(FIXTURE), "AUTOCMD_CASSETTE_SPEED": "0"}
+    with patch.dict(os.environ, env), \
+            patch.object(autocmd, "get_config_dir", return_value=tmp_path), \
+            patch.object(autocmd, "is_shell_setup", return_value=True), \
+            patch.object(autocmd, "get_provider", side_effect=AssertionError("no live provider")):
+        start = time.monotonic()
+        with patch.object(sys, "argv", ["autocmd", "--no-cache", "list python files changed since the readme"]):
+            autocmd.main()
+        elapsed = time.monotonic() - start
+
+    assert capsys.readouterr().out == "find . -type f -newer README.md -name '*.py' -exec ls -la {} +\n"
+    # Parsing, rendering and bookkeeping with no network wait; about 10 ms here
+    assert elapsed < 0.5
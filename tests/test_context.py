@@ -0,0 +1,112 @@
+"""Tests for the working-directory context collector."""
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from autocmd_cli import build_prompt
+from autocmd_cli.context import FINISH_WAIT, STATUS_WAIT, ContextCollector, summarize_status
+
+
+def test_listing_cached_until_directory_changes(tmp_path):
+    """Test that the listing is reused across runs and refreshed when files are added."""
+    work = tmp_path / "work"
+    (work / "src").mkdir(parents=True)
+    (work / "Makefile").touch()
+    (work / ".env").touch()
+    cache = tmp_path / "context.json"
+
+    collector = ContextCollector(cache, budget_ms=1000)
+    context = collector.collect(str(work))
+    collector.finish()
+    assert context.splitlines()[:2] == [f"Working directory: {work}", "Files (2): Makefile src/"]
+
+    (work / "Makefile").write_text("all:")  # Contents only: the directory is unchanged
+    assert "Files (2): Makefile src/" in ContextCollector(cache, budget_ms=1000).collect(str(work))
+
+    (work / "setup.py").touch()
+    os.utime(work, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert "Files (3): Makefile setup.py src/" in ContextCollector(cache, budget_ms=1000).collect(str(work))
+
+
+def test_git_status_cached_for_next_request(tmp_path):
+    """Test that the branch is read directly and git status arrives from the background run."""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    subprocess.run(["git", "init", "-q", "-b", "feature", str(repo)], check=True)
+    (repo / "notes.txt").touch()
+    cache = tmp_path / "context.json"
+
+    collector = ContextCollector(cache, budget_ms=1000)
+    assert "Git: branch feature\n" in collector.collect(str(repo))
+    collector._status[2].wait()
+    collector.finish()
+
+    context = ContextCollector(cache, budget_ms=1000).collect(str(repo))
+    assert "Git: branch feature; status: 1 untracked: notes.txt" in context
+
+
+def test_large_git_status_is_drained_and_cached(tmp_path):
+    """Test that a status bigger than the pipe buffer still finishes and is cached."""
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    subprocess.run(["git", "init", "-q", "-b", "main", str(repo)], check=True)
+    for i in range(2000):
+        (repo / f"untracked_file_with_a_long_name_{i:04d}.txt").touch()
+    cache = tmp_path / "context.json"
+
+    collector = ContextCollector(cache, budget_ms=1000)
+    collector.collect(str(repo))
+    # Standing in for the time a request is in flight, which git status normally gets too
+    collector.finish(wait=STATUS_WAIT)
+
+    context = ContextCollector(cache, budget_ms=1000).collect(str(repo))
+    assert "status: 2000 untracked:" in context
+
+
+def test_finish_does_not_wait_out_a_slow_git_status(tmp_path):
+    """Test that finish() gives a slow status only a moment, since the shell is waiting for autocmd to exit."""
+    collector = ContextCollector(tmp_path / "context.json", budget_ms=1000)
+    process = subprocess.Popen(["sleep", "5"], stdout=subprocess.PIPE, text=True)
+    collector._status = (str(tmp_path), [None, None], process, time.monotonic())
+    start = time.monotonic()
+    collector.finish()
+    assert time.monotonic() - start < FINISH_WAIT + 0.2
+    assert process.poll() is not None
+
+
+def test_tools_stop_at_deadline(tmp_path):
+    """Test that PATH directories past the deadline are not listed."""
+    (tmp_path / "jq").touch()
+    collector = ContextCollector(None)
+    with patch.dict(os.environ, {"PATH": str(tmp_path)}):
+        assert collector._tools(time.monotonic() - 1) == ""
+        assert collector._tools(time.monotonic() + 1) == "Tools: jq"
+
+
+def test_context_fits_character_budget(tmp_path):
+    """Test that the context is cut to max_chars at a word boundary."""
+    for i in range(30):
+        (tmp_path / f"file_{i:02d}.txt").touch()
+    context = ContextCollector(None, budget_ms=1000, max_chars=120).collect(str(tmp_path))
+    assert len(context) <= 120
+    assert context.endswith(" ...")
+    assert "Files (30): file_00.txt" in context
+
+
+def test_summarize_status():
+    """Test the one-line summary of git status --porcelain."""
+    assert summarize_status("") == "clean"
+    assert summarize_status("M  a.py\n M b.py\nMM c.py\n?? d/\n") == (
+        "2 staged, 2 modified, 1 untracked: a.py b.py c.py d/"
+    )
+
+
+def test_prompt_includes_context():
+    """Test that context goes ahead of the request in the user message."""
+    assert build_prompt("run tests") == "Request: run tests"
+    assert build_prompt("run tests", "Files (1): Makefile") == "Context:\nFiles (1): Makefile\n\nRequest: run tests"
@@ -0,0 +1,214 @@
+"""Tests for the resident daemon protocol."""
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from unittest.mock import MagicMock, patch
+
+import autocmd_cli as autocmd
+from autocmd_cli import client, daemon
+
+
+def _start(socket_path, handler):
+    server = daemon.create_server(socket_path, handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_connect_without_daemon(tmp_path):
+    """Test that connect returns None when nothing is listening."""
+    assert daemon.connect(tmp_path / "daemon.sock") is None
+
+
+def test_stream_round_trip(tmp_path):
+    """Test that tokens stream before the final command."""
+    def handler(request, send, cancelled):
+        for token in ["ls ", "-la"]:
+            send({"token": token})
+        send({"command": request["prompt"].upper()})
+
+    socket_path = tmp_path / "daemon.sock"
+    server = _start(socket_path, handler)
+    try:
+        client = daemon.DaemonClient(daemon.connect(socket_path))
+        tokens = list(client.stream({"prompt": "ls -la"}))
+        assert tokens == ["ls ", "-la"]
+        assert client.command == "LS -LA"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_disconnect_cancels_request(tmp_path):
+    """Test that closing the client connection sets the cancelled flag."""
+    seen = threading.Event()
+
+    def handler(request, send, cancelled):
+        send({"token": "partial"})
+        if cancelled.wait(2):
+            seen.set()
+
+    socket_path = tmp_path / "daemon.sock"
+    server = _start(socket_path, handler)
+    try:
+        client = daemon.DaemonClient(daemon.connect(socket_path))
+        tokens = client.stream({"prompt": "x"})
+        assert next(tokens) == "partial"
+        tokens.close()
+        assert seen.wait(2)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_error_is_raised_on_client(tmp_path):
+    """Test that daemon-side errors surface as exceptions on the client."""
+    def handler(request, send, cancelled):
+        raise ValueError("boom")
+
+    socket_path = tmp_path / "daemon.sock"
+    server = _start(socket_path, handler)
+    try:
+        client = daemon.DaemonClient(daemon.connect(socket_path))
+        try:
+            list(client.stream({"prompt": "x"}))
+            assert False, "expected RuntimeError"
+        except RuntimeError as e:
+            assert "boom" in str(e)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _run_client(socket_path, prompt, **env):
+    client = Path(daemon.__file__).parent / "client.py"
+    return subprocess.run(
+        [sys.executable, "-S", str(client), str(socket_path), prompt],
+        capture_output=True, text=True, timeout=10, env=dict(os.environ, **env),
+    )
+
+
+def test_client_script_without_daemon_asks_for_fallback(tmp_path):
+    """Test that the shell client exits with EX_TEMPFAIL when no daemon is answering."""
+    result = _run_client(tmp_path / "daemon.sock", "list files")
+    assert result.returncode == client.EX_TEMPFAIL
+    assert result.stdout == ""
+
+
+def test_client_script_prints_command_and_sends_overrides(tmp_path):
+    """Test that the shell client prints the daemon's command and forwards provider and model."""
+    requests = []
+
+    def handler(request, send, cancelled):
+        requests.append(request)
+        send({"token": "ls"})
+        send({"command": "ls -la"})
+
+    socket_path = tmp_path / "daemon.sock"
+    server = _start(socket_path, handler)
+    try:
+        result = _run_client(socket_path, "list files", AUTOCMD_PROVIDER="openai", AUTOCMD_MODEL="gpt-4o")
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert result.returncode == 0
+    assert result.stdout == "ls -la\n"
+    assert requests[0]["prompt"] == "list files"
+    assert (requests[0]["provider"], requests[0]["model"]) == ("openai", "gpt-4o")
+
+
+def test_handler_honours_client_provider_and_model(tmp_path):
+    """Test that a request's provider and model override the daemon's own configuration."""
+    provider = MagicMock()
+    provider.generate_stream.return_value = iter(["echo hi"])
+    env = {"AUTOCMD_PROVIDER": "anthropic", "AUTOCMD_MODEL": "claude-x", "OPENAI_API_KEY": "x"}
+    with patch.dict(os.environ, env), \
+            patch.object(autocmd, "get_config_dir", return_value=tmp_path), \
+            patch.object(autocmd, "create_provider", return_value=provider) as create_provider:
+        handle, close = autocmd.create_request_handler()
+        sent = []
+        handle({"prompt": "say hi", "no_cache": True, "provider": "openai", "model": "gpt-4o"},
+               sent.append, threading.Event())
+        close()
+    create_provider.assert_called_once_with("openai", "gpt-4o")
+    assert sent[-1]["command"] == "echo hi"
+
+
+def _wrapper(tmp_path, shell_type, autocmd_path):
+    rc_file = tmp_path / f".{shell_type}rc"
+    with patch.object(autocmd, "get_config_dir", return_value=tmp_path / "config"), \
+            patch.object(autocmd, "detect_shell", return_value=(shell_type, rc_file)), \
+            patch.object(autocmd.shutil, "which", return_value=str(autocmd_path)), \
+            patch("builtins.input", side_effect=["y", "n"]):
+        autocmd.setup_shell_integration()
+    return rc_file
+
+
+def test_wrapper_falls_back_when_no_daemon(tmp_path):
+    """Test that the bash wrapper runs the one-shot command when the daemon isn't there."""
+    fake = tmp_path / "autocmd"
+    fake.write_text("#!/bin/sh\necho \"echo $1\"\n")
+    fake.chmod(0o755)
+    rc_file = _wrapper(tmp_path, "bash", fake)
+    result = subprocess.run(
+        ["bash", "-c", f'source {rc_file}; autocmd "hello there"; echo "$READLINE_LINE"'],
+        capture_output=True, text=True, timeout=10,
+    )
+    assert result.stdout.strip().splitlines()[-1] == "echo hello there"
+
+
+def test_zsh_wrapper_avoids_special_parameters(tmp_path):
+    """Test that the zsh wrapper's locals don't shadow zsh's read-only special parameters."""
+    content = _wrapper(tmp_path, "zsh", tmp_path / "autocmd").read_text()
+    local_names = {
+        word.split("=")[0] for line in content.splitlines() if line.strip().startswith("local ")
+        for word in line.split()[1:]
+    }
+    assert not local_names & {"status", "pipestatus", "argv", "path", "options", "ERRNO"}
+
+
+def test_handler_answers_from_local_patterns_and_prefetch(tmp_path):
+    """Test that the daemon answers formulaic and prefetched prompts without a provider."""
+    (tmp_path / "settings").write_text("prefetch=true\nsimilar=false\n")
+    from autocmd_cli.prefetch import PrefetchSpool
+    spool = PrefetchSpool(tmp_path / "prefetch.json")
+    spool.claim("count lines of python code", "/bin/zsh", "/repo", speculative=True)
+    spool.complete("count lines of python code", "/bin/zsh", "/repo", "wc -l **/*.py", speculative=True)
+
+    env = {"AUTOCMD_PROVIDER": "anthropic", "ANTHROPIC_API_KEY": "x"}
+    with patch.dict(os.environ, env), \
+            patch.object(autocmd, "get_config_dir", return_value=tmp_path), \
+            patch.object(autocmd, "create_provider") as create_provider:
+        handle, close = autocmd.create_request_handler()
+        sent = []
+        handle({"prompt": "show disk usage", "shell": "/bin/zsh", "cwd": "/repo"}, sent.append, threading.Event())
+        handle({"prompt": "count lines of python code", "shell": "/bin/zsh", "cwd": "/repo"},
+               sent.append, threading.Event())
+        close()
+    create_provider.assert_not_called()
+    assert sent == [{"command": "df -h"}, {"command": "wc -l **/*.py"}]
+
+
+def test_serve_binds_before_ready(tmp_path):
+    """Test that the ready callback runs with the socket already accepting connections."""
+    socket_path = tmp_path / "daemon.sock"
+    seen = []
+
+    def ready():
+        sock = daemon.connect(socket_path)
+        seen.append(sock is not None)
+        sock.close()
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    previous = signal.getsignal(signal.SIGTERM)
+    try:
+        daemon.serve(socket_path, lambda request, send, cancelled: None, ready)
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+    assert seen == [True]
@@ -0,0 +1,102 @@
+"""Tests for the command history log."""
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import autocmd_cli as autocmd
+from autocmd_cli.history import History, tokens
+
+
+def test_search_matches_all_words_by_prefix(tmp_path):
+    """Test that every query word must match, as a prefix, newest entries first."""
+    history = History(tmp_path / "history.db")
+    assert history.search("rsync") == []
+    history.add("sync photos to the nas", "rsync -av ~/Photos nas:/photos", "anthropic", "haiku", 812.5)
+    history.add("copy logs to backup server", "rsync -az /var/log backup:/logs", "groq", "llama")
+    history.add("show disk usage", "df -h", "anthropic", "haiku")
+
+    assert [e.command for e in history.search("rsync")] == [
+        "rsync -az /var/log backup:/logs", "rsync -av ~/Photos nas:/photos",
+    ]
+    assert [e.command for e in history.search("RSY photo")] == ["rsync -av ~/Photos nas:/photos"]
+    assert history.search("rsync disk") == []
+    assert history.search("scp") == []
+    assert [e.command for e in history.search("", limit=2)] == ["df -h", "rsync -az /var/log backup:/logs"]
+
+    entry = history.search("nas")[0]
+    assert (entry.prompt, entry.provider, entry.model, entry.latency_ms) == (
+        "sync photos to the nas", "anthropic", "haiku", 812.5,
+    )
+
+
+def test_search_lists_each_entry_once(tmp_path):
+    """Test that an entry with several words matching a prefix is returned, and counted against limit, once."""
+    history = History(tmp_path / "history.db")
+    history.add("undo last git commit", "git reset --soft HEAD~1", "anthropic", "haiku")
+    history.add("open the github page", "gh browse", "anthropic", "haiku")
+    history.add("push to github", "git push origin HEAD", "anthropic", "haiku")
+
+    assert [e.command for e in history.search("git")] == [
+        "git push origin HEAD", "gh browse", "git reset --soft HEAD~1",
+    ]
+    assert [e.command for e in history.search("git", limit=2)] == ["git push origin HEAD", "gh browse"]
+    assert [e.command for e in history.search("git HEAD")] == ["git push origin HEAD", "git reset --soft HEAD~1"]
+
+
+def test_common_words_stop_at_the_limit(tmp_path):
+    """Test that common words walk entries newest first with no sort, and agree with the rare-word plan."""
+    history = History(tmp_path / "history.db")
+    conn = history._connect()
+    conn.execute("BEGIN")
+    for i in range(2000):
+        words = f"git commit w{i} {'rare' if i % 500 == 0 else ''}"
+        conn.execute("INSERT INTO entries VALUES (?, 0, ?, 'x', 'p', 'm', NULL, 'bash', '/')", (i + 1, words))
+        conn.executemany("INSERT INTO terms VALUES (?, ?)", [(term, i + 1) for term in tokens(f"{words} x")])
+        conn.executemany(
+            "INSERT INTO words VALUES (?, 1) ON CONFLICT (word) DO UPDATE SET entries = entries + 1",
+            [(term,) for term in tokens(f"{words} x")],
+        )
+    conn.execute("COMMIT")
+
+    for query in (["git"], ["git", "commit"], ["w", "git"]):
+        sql, params = history._query(conn, query, 5)
+        assert sql.startswith("SELECT e.* FROM entries e")
+        plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        assert "TEMP B-TREE" not in plan
+    conn.close()
+
+    assert [e.id for e in history.search("git commit", limit=3)] == [2000, 1999, 1998]
+    assert [e.id for e in history.search("w1", limit=3)] == [2000, 1999, 1998]
+    assert [e.id for e in history.search("rare git")] == [1501, 1001, 501, 1]
+    assert [e.id for e in history.search("git rare", limit=2)] == [1501, 1001]
+    assert [e.id for e in history.search("rare w5")] == [501]
+
+
+def test_main_records_and_shows_history(tmp_path, capsys):
+    """Test that generated commands are logged and found again with --history."""
+    env = {"SHELL": "/bin/zsh", "AUTOCMD_PROVIDER": "anthropic", "ANTHROPIC_API_KEY": "x"}
+    with patch.dict(os.environ, env), \
+            patch.object(autocmd, "get_config_dir", return_value=tmp_path), \
+            patch.object(autocmd, "is_shell_setup", return_value=True), \
+            patch.object(autocmd, "get_provider") as get_provider:
+        provider = get_provider.return_value
+        provider.model = "claude-haiku-4-5-20251001"
+        provider.generate_stream.return_value = iter(["rsync -av src/ dst/"])
+        with patch.object(sys, "argv", ["autocmd", "mirror src into dst"]):
+            autocmd.main()
+        assert capsys.readouterr().out == "rsync -av src/ dst/\n"
+
+        with patch.object(sys, "argv", ["autocmd", "--history", "mirror", "--limit", "5"]):
+            try:
+                autocmd.main()
+            except SystemExit as e:
+                assert e.code == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].endswith("  rsync -av src/ dst/")
+    assert lines[1].endswith("  # mirror src into dst")
+    entry = History(tmp_path / "history.db").search("mirror")[0]
+    assert (entry.provider, entry.shell, entry.cwd) == ("anthropic", "/bin/zsh", os.getcwd())
@@ -0,0 +1,168 @@
+"""Tests for the LLM provider layer."""
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from autocmd_cli.llm_providers import AnthropicProvider, GroqProvider, LLMProvider, OpenAIProvider
+
+
+def test_clients_shared_per_endpoint_and_key():
+    """Test that providers with the same endpoint and key share one client."""
+    a = GroqProvider("key-1")
+    b = GroqProvider("key-1", model="other-model")
+    c = GroqProvider("key-2")
+    d = OpenAIProvider("key-1")
+    try:
+        assert a.client is b.client
+        assert a.client is not c.client
+        assert a.client is not d.client
+    finally:
+        for provider in (a, b, c, d):
+            provider.close()
+
+
+def test_client_closed_when_last_provider_releases():
+    """Test that the pooled client is only closed after its last user."""
+    fake_client = MagicMock()
+    with patch.object(AnthropicProvider, "_create_client", return_value=fake_client):
+        a = AnthropicProvider("key")
+        b = AnthropicProvider("key")
+        assert a.client is fake_client
+        assert b.client is fake_client
+
+        a.close()
+        fake_client.close.assert_not_called()
+        b.close()
+        fake_client.close.assert_called_once()
+
+
+def test_context_manager_closes_client():
+    """Test that leaving the context manager releases the client."""
+    fake_client = MagicMock()
+    with patch.object(AnthropicProvider, "_create_client", return_value=fake_client):
+        with AnthropicProvider("key") as provider:
+            assert provider.client is fake_client
+        fake_client.close.assert_called_once()
+
+
+def test_prepare_builds_client_and_tolerates_failure():
+    """Test that prepare creates the client up front, and leaves a failure to the request."""
+    fake_client = MagicMock()
+    with patch.object(AnthropicProvider, "_create_client", return_value=fake_client) as create:
+        provider = AnthropicProvider("key")
+        provider.prepare()
+        create.assert_called_once()
+        assert provider._client is fake_client
+        provider.close()
+    with patch.object(AnthropicProvider, "_create_client", side_effect=ImportError("anthropic")):
+        provider = AnthropicProvider("key")
+        provider.prepare()
+        assert provider._client is None
+    _SlowProvider().prepare()
+
+
+class _SlowProvider(LLMProvider):
+    """Provider with canned sync responses, exercising the thread fallbacks."""
+
+    def __init__(self, delay=0.0):
+        super().__init__("key")
+        self.delay = delay
+
+    def default_model(self):
+        return "slow"
+
+    @classmethod
+    def env_var_name(cls):
+        return "SLOW_API_KEY"
+
+    def generate(self, prompt, max_tokens=200, system=None):
+        time.sleep(self.delay)
+        return prompt.upper()
+
+    def generate_stream(self, prompt, max_tokens=200, system=None):
+        for word in prompt.split():
+            time.sleep(self.delay)
+            yield word
+
+
+def test_provider_without_client_names_itself():
+    """Test that asking a provider that implements generate itself for a client says which provider it is."""
+    async def async_client():
+        return provider.async_client
+
+    provider = _SlowProvider()
+    for get_client in (lambda: provider.client, lambda: asyncio.run(async_client())):
+        try:
+            get_client()
+        except NotImplementedError as e:
+            assert "_SlowProvider has no" in str(e)
+        else:
+            raise AssertionError("a provider without an SDK client returned one")
+
+
+
+def test_agenerate_runs_concurrently():
+    """Test that many async generations overlap instead of running serially."""
+    provider = _SlowProvider(delay=0.1)
+
+    async def run():
+        return await asyncio.gather(*(provider.agenerate(f"ls {i}") for i in range(10)))
+
+    start = time.monotonic()
+    results = asyncio.run(run())
+    assert results == [f"LS {i}" for i in range(10)]
+    assert time.monotonic() - start < 0.5
+
+
+def test_agenerate_stream_yields_chunks():
+    """Test that async streaming yields every chunk in order."""
+    provider = _SlowProvider()
+
+    async def run():
+        return [text async for text in provider.agenerate_stream("git status --short")]
+
+    assert asyncio.run(run()) == ["git", "status", "--short"]
+
+
+def test_agenerate_stream_timeout():
+    """Test that the stream timeout bounds the whole stream."""
+    provider = _SlowProvider(delay=0.2)
+
+    async def run():
+        return [text async for text in provider.agenerate_stream("a b c d", timeout=0.3)]
+
+    try:
+        asyncio.run(run())
+        assert False, "expected TimeoutError"
+    except asyncio.TimeoutError:
+        pass
+
+
+def test_async_clients_use_async_sdk():
+    """Test that the async client is built from the async SDK classes."""
+    import anthropic
+    import openai
+
+    async def run():
+        a = AnthropicProvider("key")
+        g = GroqProvider("key")
+        async with a, g:
+            assert isinstance(a.async_client, anthropic.AsyncAnthropic)
+            assert isinstance(g.async_client, openai.AsyncOpenAI)
+            assert str(g.async_client.base_url).startswith("https://api.groq.com")
+
+    asyncio.run(run())
+
+
+def test_base_url_env_override():
+    """Test that <PROVIDER>_BASE_URL redirects a provider, e.g. to a mock server."""
+    with patch.dict(os.environ, {"GROQ_BASE_URL": "http://127.0.0.1:9/v1"}):
+        assert GroqProvider("k").base_url == "http://127.0.0.1:9/v1"
+    with patch.dict(os.environ, {}, clear=True):
+        assert GroqProvider("k").base_url == "https://api.groq.com/openai/v1"
+    assert GroqProvider.base_url_env_var() == "GROQ_BASE_URL"
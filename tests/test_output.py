@@ -0,0 +1,75 @@
+"""Tests for incremental command parsing."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from autocmd_cli.output import CommandParser, budget_max_tokens, parse_command
+
+
+def _stream(chunks):
+    parser = CommandParser()
+    echoed = "".join(parser.consume(iter(chunks)))
+    return parser, echoed
+
+
+def test_stops_after_single_line_command():
+    """Test that a newline after a one-line command ends the stream."""
+    parser, echoed = _stream(["ls -la", "\n", "This lists all files."])
+    assert parser.done
+    assert parser.command == "ls -la"
+    assert echoed == "ls -la"
+
+
+def test_stops_at_closing_fence():
+    """Test that fenced output ends at its closing fence."""
+    parser, _ = _stream(["```bash\n", "du -sh *", "\n```\n", "Explanation"])
+    assert parser.done
+    assert parser.command == "du -sh *"
+
+
+def test_multiline_constructs_continue():
+    """Test that loops, quotes, heredocs and continuations are not cut short."""
+    cases = [
+        ["for f in *.log; do\n", "  gzip $f\n", "done\n", "extra"],
+        ["git commit -m 'do the\n", "thing'\n", "extra"],
+        ["cat <<EOF > notes\n", "hi\n", "EOF\n", "extra"],
+        ["find . -name '*.py' | \\\n", "xargs wc -l\n", "extra"],
+        ["if [ -f a ]; then\n", "  cat a\n", "elif [ -f b ]; then\n", "  cat b\n", "else\n", "  echo none\n",
+         "fi\n", "extra"],
+    ]
+    for chunks in cases:
+        parser, _ = _stream(chunks)
+        assert parser.done
+        assert parser.command == "".join(chunks[:-1]).strip()
+
+
+def test_keyword_arguments_do_not_open_blocks():
+    """Test that words like dd's if= are not mistaken for the start of a block."""
+    parser, _ = _stream(["dd if=/dev/zero of=disk.img bs=1M count=10\n", "extra"])
+    assert parser.done
+    assert parser.command == "dd if=/dev/zero of=disk.img bs=1M count=10"
+
+
+def test_consume_closes_upstream():
+    """Test that stopping early closes the provider stream."""
+    closed = []
+
+    def upstream():
+        try:
+            yield "pwd\n"
+            yield "never read"
+        finally:
+            closed.append(True)
+
+    parser = CommandParser()
+    assert list(parser.consume(upstream())) == ["pwd"]
+    assert closed == [True]
+
+
+def test_parse_command_and_budget():
+    """Test non-streamed parsing and the adaptive token budget."""
+    assert parse_command("```bash\nls -la") == "ls -la"
+    assert parse_command("echo done\n\nThat prints done.") == "echo done"
+    assert budget_max_tokens("list files") == 64 + len("list files") // 2
+    assert budget_max_tokens("x" * 10000) == 400
@@ -0,0 +1,69 @@
+"""Tests for the local pattern engine."""
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import autocmd_cli as autocmd
+from autocmd_cli.patterns import create_engine, load_patterns
+from autocmd_cli.stats import StatsStore
+
+
+def test_builtin_patterns_fill_arguments():
+    """Test that built-in templates are filled from the prompt."""
+    engine = create_engine()
+    assert engine.resolve("Show disk usage").command == "df -h"
+    assert engine.resolve("kill process on port 8080").command == "lsof -ti tcp:8080 | xargs kill"
+    assert engine.resolve("untar backup.tar.gz").command == "tar -xf backup.tar.gz"
+    assert engine.resolve("find all .py files").command == "find . -name '*.py'"
+    assert engine.resolve("list files here").command == "ls"
+    assert engine.resolve("list all files").command == "ls -a"
+
+
+def test_arguments_are_shell_quoted():
+    """Test that captured paths cannot inject shell syntax."""
+    command = create_engine().resolve("count lines in a;rm$x.txt").command
+    assert command == "wc -l 'a;rm$x.txt'"
+
+
+def test_partial_matches_fall_through():
+    """Test that prompts with anything beyond the pattern go to the provider."""
+    engine = create_engine()
+    assert engine.resolve("show disk usage sorted by size for each mount") is None
+    assert engine.resolve("find all python files") is None
+
+
+def test_user_patterns_take_precedence(tmp_path, capsys):
+    """Test that user patterns are checked first and bad lines are skipped."""
+    path = tmp_path / "patterns"
+    path.write_text(
+        "# team shortcuts\n"
+        "deploy (?P<env>staging|prod) => make deploy ENV={env}\n"
+        "show disk usage => duf\n"
+        "broken (  => nope\n"
+    )
+    assert len(load_patterns(path)) == 2
+    assert "patterns:4" in capsys.readouterr().err
+
+    engine = create_engine(path)
+    assert engine.resolve("deploy prod").command == "make deploy ENV=prod"
+    assert engine.resolve("show disk usage").command == "duf"
+
+
+def test_main_answers_locally_and_counts_hits(tmp_path, capsys):
+    """Test that a pattern hit skips the provider and is counted in stats."""
+    env = {"SHELL": "/bin/zsh", "AUTOCMD_PROVIDER": "anthropic", "ANTHROPIC_API_KEY": "x"}
+    with patch.dict(os.environ, env), \
+            patch.object(autocmd, "get_config_dir", return_value=tmp_path), \
+            patch.object(autocmd, "is_shell_setup", return_value=True), \
+            patch.object(autocmd, "get_provider") as get_provider, \
+            patch.object(sys, "argv", ["autocmd", "show disk usage"]):
+        autocmd.main()
+
+    get_provider.assert_not_called()
+    assert capsys.readouterr().out == "df -h\n"
+    summary = StatsStore(tmp_path / "stats.json").local_summary()
+    assert summary["requests"] == 1
+    assert summary["hits"] == 1
@@ -0,0 +1,187 @@
+"""Tests for speculative prefetch while a prompt is typed."""
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import autocmd_cli as autocmd
+from autocmd_cli.prefetch import BudgetExceeded, PrefetchSpool, prompts_match
+
+
+class FakeProvider:
+    model = "fake-model"
+    transport = "http"
+    reports_usage = True
+
+    def __init__(self):
+        self.prompts = []
+
+    def prepare(self):
+        pass
+
+    def generate_stream(self, prompt, max_tokens=200, system=None, usage=None):
+        self.prompts.append(prompt)
+        yield "du -sh * | sort -h"
+        usage.update({"input_tokens": 300, "output_tokens": 7})
+
+
+def _dead_pid() -> int:
+    process = subprocess.Popen(["true"])
+    process.wait()
+    return process.pid
+
+
+def test_prompts_match_after_normalising():
+    """Test that a prefetched prompt answers rewordings but never a different number."""
+    assert prompts_match("show disk usage", "Show  disk usage?")
+    assert prompts_match("show disk usage", "show the disk usage")
+    assert not prompts_match("kill process on port 3000", "kill process on port 300")
+    assert not prompts_match("find large files", "find large fil")
+
+
+def test_wait_takes_finished_entry_and_drops_dead_claims(tmp_path):
+    """Test that a claim left by a killed prefetch is dropped and a finished one is taken with its details."""
+    spool = PrefetchSpool(tmp_path / "prefetch.json")
+    (tmp_path / "prefetch.json").write_text(json.dumps({"entries": [{
+        "prompt": "show disk usage", "shell": "/bin/zsh", "cwd": "/repo", "pid": _dead_pid(),
+        "created": time.time(), "command": None,
+    }]}))
+
+    start = time.monotonic()
+    assert spool.wait("show disk usage", "/bin/zsh", "/repo", timeout=5) is None
+    assert time.monotonic() - start < 1
+    spool.complete("show disk usage", "/bin/zsh", "/repo", "du -sh .", provider="groq", latency_ms=80.0)
+
+    entry = spool.wait("show the disk usage.", "/bin/zsh", "/repo")
+    assert entry["command"] == "du -sh ." and entry["provider"] == "groq"
+    assert spool.claim("show disk usage", "/bin/bash", "/repo") is None
+
+
+def test_completing_a_prompt_keeps_other_processes_claims(tmp_path):
+    """Test that finishing one prompt leaves another process's claim in place, so its prompt isn't generated twice."""
+    code = f"""
+import sys, time
+sys.path.insert(0, {str(Path(__file__).parent.parent / "src")!r})
+from pathlib import Path
+from autocmd_cli.prefetch import PrefetchSpool
+PrefetchSpool(Path({str(tmp_path / "prefetch.json")!r})).claim("list files", "/bin/zsh", "/repo")
+print("claimed", flush=True)
+time.sleep(30)
+"""
+    other = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, text=True)
+    try:
+        assert other.stdout.readline() == "claimed\n"
+        spool = PrefetchSpool(tmp_path / "prefetch.json")
+        spool.claim("show disk usage", "/bin/zsh", "/repo", speculative=True)
+        spool.complete("show disk usage", "/bin/zsh", "/repo", "du -sh .", speculative=True)
+        spool.claim("count lines of code", "/bin/zsh", "/repo")
+        spool.complete("count lines of code", "/bin/zsh", "/repo", None)
+
+        entry = spool.claim("list files", "/bin/zsh", "/repo")
+        assert entry is not None and entry["pid"] == other.pid and entry["command"] is None
+    finally:
+        other.kill()
+        other.wait()
+
+
+def test_setup_adds_widget_to_existing_wrapper(tmp_path):
+    """Test that enabling prefetch on a shell that already has the wrapper installs the widget once."""
+    rc_file = tmp_path / ".zshrc"
+    rc_file.write_text("# autocmd\nautocmd() {\n    true\n}\n")
+    with patch.object(autocmd, "get_config_dir", return_value=tmp_path / "config"), \
+            patch.object(autocmd, "detect_shell", return_value=("zsh", rc_file)), \
+            patch("builtins.input", return_value="y"):
+        assert autocmd.setup_shell_integration()
+        assert autocmd.setup_shell_integration()
+        assert autocmd.get_setting("prefetch") == "true"
+    content = rc_file.read_text()
+    assert content.count("autocmd() {") == 1
+    assert content.count(autocmd.PREFETCH_END) == 1
+
+
+def test_speculative_claims_respect_rate_and_token_budget(tmp_path):
+    """Test that speculative generations stop at the per-minute rate and the daily token budget."""
+    spool = PrefetchSpool(tmp_path / "prefetch.json", per_minute=2, daily_tokens=1000)
+    spool.claim("list python files", "/bin/zsh", "/repo", speculative=True)
+    spool.complete("list python files", "/bin/zsh", "/repo", "ls *.py", tokens=400, speculative=True)
+    spool.claim("count lines of code", "/bin/zsh", "/repo", speculative=True)
+    with pytest.raises(BudgetExceeded):
+        spool.claim("show open ports", "/bin/zsh", "/repo", speculative=True)
+    # An answered prompt is not a new generation
+    assert spool.claim("list python files", "/bin/zsh", "/repo", speculative=True)["command"] == "ls *.py"
+
+    spool = PrefetchSpool(tmp_path / "prefetch.json", per_minute=100, daily_tokens=1000)
+    spool.complete("count lines of code", "/bin/zsh", "/repo", None, tokens=700, speculative=True)
+    with pytest.raises(BudgetExceeded):
+        spool.claim("show open ports", "/bin/zsh", "/repo", speculative=True)
+
+
+def test_main_injects_prefetched_command_without_calling_provider(tmp_path, capsys):
+    """Test that --prefetch generates in the background and the submitted prompt takes its command."""
+    (tmp_path / "settings").write_text("prefetch=true\nsimilar=false\n")
+    provider = FakeProvider()
+    env = {"SHELL": "/bin/zsh", "AUTOCMD_PROVIDER": "anthropic", "ANTHROPIC_API_KEY": "x"}
+    handler = signal.getsignal(signal.SIGTERM)
+    try:
+        with patch.dict(os.environ, env), \
+                patch.object(autocmd, "get_config_dir", return_value=tmp_path), \
+                patch.object(autocmd, "is_shell_setup", return_value=True), \
+                patch.object(autocmd, "create_provider", return_value=provider) as create:
+            with patch.object(sys, "argv", ["autocmd", "--prefetch", "show the biggest directories here"]):
+                with pytest.raises(SystemExit):
+                    autocmd.main()
+            assert create.call_count == 1
+
+            with patch.object(sys, "argv", ["autocmd", "show the biggest directories here."]):
+                autocmd.main()
+            assert create.call_count == 1
+    finally:
+        signal.signal(signal.SIGTERM, handler)
+
+    assert capsys.readouterr().out.strip() == "du -sh * | sort -h"
+    spool = json.loads((tmp_path / "prefetch.json").read_text())
+    assert spool["tokens"] == 307
+    with patch.object(autocmd, "get_config_dir", return_value=tmp_path):
+        [entry] = autocmd.get_history().search("biggest")
+    assert (entry.prompt, entry.provider, entry.model) == ("show the biggest directories here.", "anthropic", "fake-model")
+    stats = json.loads((tmp_path / "stats.json").read_text())
+    assert stats["_served"] == {"speculative": 1, "prefetch": 1}
+
+
+@pytest.mark.skipif(shutil.which("bash") is None, reason="needs bash")
+def test_bash_widget_debounces_and_reset_removes_it(tmp_path):
+    """Test that the bash widget prefetches only the prompt typing paused on, and --reset removes it."""
+    log = tmp_path / "log"
+    fake = tmp_path / "autocmd"
+    fake.write_text(f'#!/bin/sh\necho "$@" >> {log}\n')
+    fake.chmod(0o755)
+    widget = autocmd.prefetch_widget("bash", str(fake), debounce_ms=200)
+    script = widget + """
+type_line() { READLINE_LINE="$1"; READLINE_POINT=${#READLINE_LINE}; }
+type_line 'autocmd "find large'; _autocmd_prefetch_space
+type_line 'autocmd "find large files'; _autocmd_prefetch_space
+_autocmd_prefetch_quote
+sleep 0.5
+type_line 'autocmd "ls'; _autocmd_prefetch_quote
+sleep 0.4
+"""
+    result = subprocess.run(["bash", "-c", script], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert log.read_text() == "--prefetch find large files\n"
+
+    rc_file = tmp_path / ".bashrc"
+    rc_file.write_text("alias ll='ls -l'\n\n# autocmd\nautocmd() {\n    true\n}\n" + widget + "export EDITOR=vim\n")
+    with patch.object(autocmd, "get_config_dir", return_value=tmp_path / "config"), \
+            patch.object(autocmd, "detect_shell", return_value=("bash", rc_file)):
+        autocmd.reset_autocmd()
+    assert "autocmd" not in rc_file.read_text()
+    assert "export EDITOR=vim" in rc_file.read_text()
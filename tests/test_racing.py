@@ -0,0 +1,154 @@
+"""Tests for hedged requests across providers."""
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from autocmd_cli.llm_providers import LLMProvider
+from autocmd_cli.racing import RacingProvider
+
+
+class _TimedProvider(LLMProvider):
+    """Streams canned tokens after a first-token delay."""
+
+    def __init__(self, name, first_token_delay, tokens=("ls", " -la"), error=None):
+        super().__init__("key", name)
+        self.first_token_delay = first_token_delay
+        self.tokens = tokens
+        self.error = error
+        self.started = threading.Event()
+        self.closed = threading.Event()
+
+    def default_model(self):
+        return "timed"
+
+    @classmethod
+    def env_var_name(cls):
+        return "TIMED_API_KEY"
+
+    def generate(self, prompt, max_tokens=200, system=None):
+        return "".join(self.generate_stream(prompt, max_tokens))
+
+    def generate_stream(self, prompt, max_tokens=200, system=None):
+        self.started.set()
+        try:
+            time.sleep(self.first_token_delay)
+            if self.error:
+                raise self.error
+            for token in self.tokens:
+                yield token
+                time.sleep(0.01)
+        finally:
+            self.closed.set()
+
+
+def test_fastest_provider_wins():
+    """Test that output comes from the provider with the first token."""
+    slow = _TimedProvider("slow", 0.3, tokens=("slow",))
+    fast = _TimedProvider("fast", 0.01)
+    racer = RacingProvider([slow, fast])
+    usage = {}
+    assert racer.generate("list", usage=usage) == "ls -la"
+    assert racer.winner_of(usage) is fast
+    # The loser is cancelled at its first chunk
+    assert slow.closed.wait(1)
+
+
+class _CountingProvider(_TimedProvider):
+    """A timed provider that reports one output token per streamed token."""
+
+    reports_usage = True
+
+    def generate_stream(self, prompt, max_tokens=200, system=None, usage=None):
+        for token in super().generate_stream(prompt, max_tokens, system):
+            yield token
+            usage["output_tokens"] = usage.get("output_tokens", 0) + 1
+
+
+def test_usage_comes_from_the_winner():
+    """Test that the race reports the token counts of the provider it streamed from."""
+    slow = _CountingProvider("slow", 0.3, tokens=("a", "b", "c"))
+    fast = _CountingProvider("fast", 0.01)
+    plain = _TimedProvider("plain", 0.5)
+    usage = {}
+    assert RacingProvider([slow, fast, plain]).generate("list", usage=usage) == "ls -la"
+    assert usage == {"output_tokens": 2, "winner": 1}
+
+
+def test_concurrent_races_each_get_their_own_winner():
+    """Test that two calls in flight on one racing provider are credited to the provider each streamed from."""
+    first = _TimedProvider("first", 0.01)
+    racer = RacingProvider([first, _TimedProvider("second", 0.01)], hedge_delay=5.0)
+    outer = {}
+    stream = racer.generate_stream("list", usage=outer)
+    assert next(stream) == "ls"
+    # Meanwhile the first provider stalls, and a second call is won by the backup
+    first.first_token_delay = 1.0
+    racer.hedge_delay = 0.05
+    inner = {}
+    assert racer.generate("list", usage=inner) == "ls -la"
+    assert list(stream) == [" -la"]
+    assert racer.winner_of(inner) is racer.providers[1]
+    assert racer.winner_of(outer) is first
+    assert racer.winner_of({}) is None
+
+
+def test_hedge_waits_before_starting_backup():
+    """Test that a hedged provider is only started after the delay."""
+    primary = _TimedProvider("primary", 0.01)
+    backup = _TimedProvider("backup", 0.01)
+    racer = RacingProvider([primary, backup], hedge_delay=0.5)
+    usage = {}
+    assert racer.generate("list", usage=usage) == "ls -la"
+    assert racer.winner_of(usage) is primary
+    assert not backup.started.is_set()
+
+
+def test_hedge_fires_when_primary_stalls():
+    """Test that a stalled primary triggers the backup after the delay."""
+    primary = _TimedProvider("primary", 1.0, tokens=("late",))
+    backup = _TimedProvider("backup", 0.01)
+    racer = RacingProvider([primary, backup], hedge_delay=0.05)
+    start = time.monotonic()
+    usage = {}
+    assert racer.generate("list", usage=usage) == "ls -la"
+    assert racer.winner_of(usage) is backup
+    assert time.monotonic() - start < 0.5
+
+
+def test_errors_fall_through_to_other_providers():
+    """Test that a failing provider does not fail the race."""
+    broken = _TimedProvider("broken", 0.0, error=RuntimeError("boom"))
+    backup = _TimedProvider("backup", 0.01)
+    racer = RacingProvider([broken, backup], hedge_delay=5.0)
+    start = time.monotonic()
+    assert racer.generate("list") == "ls -la"
+    assert time.monotonic() - start < 1.0
+
+    racer = RacingProvider([_TimedProvider("a", 0.0, error=RuntimeError("boom"))])
+    try:
+        racer.generate("list")
+        assert False, "expected RuntimeError"
+    except RuntimeError as e:
+        assert str(e) == "boom"
+
+
+def test_create_race_provider_from_environment():
+    """Test that the 'race' provider is built from the configured members."""
+    import os
+    from unittest.mock import patch
+    import autocmd_cli as autocmd
+
+    env = {
+        "AUTOCMD_RACE_PROVIDERS": "groq, anthropic:claude-x",
+        "AUTOCMD_RACE_DELAY_MS": "150",
+        "GROQ_API_KEY": "g",
+        "ANTHROPIC_API_KEY": "a",
+    }
+    with patch.dict(os.environ, env):
+        racer = autocmd.create_provider("race")
+    assert isinstance(racer, RacingProvider)
+    assert [p.model for p in racer.providers] == ["llama-3.3-70b-versatile", "claude-x"]
+    assert racer.hedge_delay == 0.15
@@ -0,0 +1,120 @@
+"""Tests for the provider registry and entry-point providers."""
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from autocmd_cli import registry
+
+SRC = str(Path(__file__).parent.parent / "src")
+
+
+def _plugin(root: Path, name: str, entry_points: str, modules: dict) -> None:
+    """Install a fake distribution with autocmd.providers entry points under root."""
+    dist_info = root / f"{name}-1.0.dist-info"
+    dist_info.mkdir(parents=True)
+    (dist_info / "METADATA").write_text(f"Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n")
+    (dist_info / "entry_points.txt").write_text(f"[autocmd.providers]\n{entry_points}")
+    for module, source in modules.items():
+        (root / f"{module}.py").write_text(textwrap.dedent(source))
+
+
+def _run(code: str, path: Path, env: dict = None) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(path), SRC]), **(env or {}))
+    return subprocess.run([sys.executable, "-c", textwrap.dedent(code)], capture_output=True, text=True, env=env)
+
+
+def test_builtin_specs_match_their_classes():
+    """Test that the metadata kept for built-in providers is what their classes report."""
+    for name, spec in registry.BUILTIN_PROVIDERS.items():
+        cls = registry.load_class(name)
+        provider = cls(api_key="x")
+        assert cls.spec is spec
+        assert spec.env_var == cls.env_var_name()
+        assert spec.base_url_env_var == cls.base_url_env_var()
+        assert spec.default_model == provider.default_model()
+        assert spec.api_key_required == cls.api_key_required
+        assert registry.name_of(provider) == name
+
+
+def test_entry_point_provider_is_imported_only_when_selected(tmp_path):
+    """Test that plugin providers are listed from their specs and imported on first use."""
+    _plugin(tmp_path, "acme_gateway", "gateway = acme_spec:GATEWAY\nbroken = acme_missing:SPEC\n", {
+        "acme_spec": """
+            from autocmd_cli.registry import ProviderSpec
+            GATEWAY = ProviderSpec("gateway", "acme_impl:GatewayProvider", "ACME_API_KEY", "acme-fast",
+                                   "ACME_BASE_URL")
+        """,
+        "acme_impl": """
+            from autocmd_cli.llm_providers import OpenAICompatibleProvider
+            class GatewayProvider(OpenAICompatibleProvider):
+                def default_model(self):
+                    return "acme-fast"
+                @classmethod
+                def env_var_name(cls):
+                    return "ACME_API_KEY"
+        """,
+    })
+    result = _run("""
+        import sys
+        import autocmd_cli
+        from autocmd_cli import registry
+        autocmd_cli.get_provider("anthropic", api_key="x")
+        assert "importlib.metadata" not in sys.modules
+        assert registry.names()[-1] == "gateway"
+        assert registry.get("gateway").default_model == "acme-fast"
+        assert "acme_impl" not in sys.modules
+        provider = autocmd_cli.get_provider("gateway")
+        assert type(provider).__name__ == "GatewayProvider" and provider.model == "acme-fast"
+        assert autocmd_cli.provider_label(provider) == ("gateway", "acme-fast")
+    """, tmp_path, {"ACME_API_KEY": "k"})
+    assert result.returncode == 0, result.stderr
+    assert "skipping provider 'broken'" in result.stderr
+
+
+def test_startup_imports_stay_flat_as_plugins_grow(tmp_path):
+    """Test that a request to a built-in provider imports the same modules however many plugins are installed."""
+    code = """
+        import sys
+        import autocmd_cli
+        autocmd_cli.lookup_cache("list files", "anthropic", None, "/bin/zsh")
+        autocmd_cli.create_provider("anthropic")
+        print("\\n".join(sorted(sys.modules)))
+    """
+    env = {"ANTHROPIC_API_KEY": "x", "HOME": str(tmp_path / "home"), "AUTOCMD_PROVIDER": "anthropic"}
+    baseline = _run(code, tmp_path / "none", env)
+    assert baseline.returncode == 0, baseline.stderr
+
+    plugins = tmp_path / "plugins"
+    for i in range(50):
+        # Importing any of these would fail the run
+        _plugin(plugins, f"gateway{i}", f"gateway{i} = gateway{i}_spec:SPEC\n",
+                {f"gateway{i}_spec": "raise RuntimeError('imported at startup')"})
+    with_plugins = _run(code, plugins, env)
+    assert with_plugins.returncode == 0, with_plugins.stderr
+    assert with_plugins.stdout == baseline.stdout
+    assert "importlib.metadata" not in baseline.stdout.split()
+
+
+def test_providers_mapping_loads_classes_lazily():
+    """Test that PROVIDERS still maps names to classes, through the registry."""
+    from autocmd_cli.llm_providers import PROVIDERS, OpenAIProvider
+    assert list(PROVIDERS)[:len(registry.BUILTIN_PROVIDERS)] == list(registry.BUILTIN_PROVIDERS)
+    assert "openai" in PROVIDERS and "nope" not in PROVIDERS
+    assert PROVIDERS["openai"] is OpenAIProvider
+    assert PROVIDERS["openai"]("x").default_model() == "gpt-4o-mini"
+
+
+def test_package_import_leaves_optional_modes_unloaded(tmp_path):
+    """Test that importing the package loads none of the modules only some flags need."""
+    result = _run("""
+        import sys
+        import autocmd_cli
+        modes = ("batch", "client", "daemon", "stdio", "cassette", "context", "prefetch")
+        print(" ".join(m for m in modes if f"autocmd_cli.{m}" in sys.modules))
+    """, tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ""
@@ -0,0 +1,87 @@
+"""Tests for the streamed-output renderer."""
+import io
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from autocmd_cli.render import StreamRenderer, char_width
+
+
+class _Terminal(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def isatty(self):
+        return True
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _rows(text, width):
+    renderer = StreamRenderer(io.StringIO(), width=width)
+    renderer.write(text)
+    return renderer.rows, renderer.col
+
+
+def test_tokens_coalesced_into_frames():
+    """Test that fast tokens are drawn in frames at the refresh rate, not one write each."""
+    terminal, clock = _Terminal(), _Clock()
+    renderer = StreamRenderer(terminal, fps=10, clock=clock, width=80)
+    for i in range(100):
+        clock.now = i * 0.01
+        renderer.write("x")
+    # The first token immediately, then one frame per 100ms
+    assert terminal.writes == 10
+    renderer.clear()
+    assert terminal.getvalue().startswith("x" * 100)
+    assert renderer.text() == "x" * 100
+
+
+def test_cursor_tracks_soft_wrapped_lines():
+    """Test that row counting follows the terminal's wrapping, not just newlines."""
+    assert _rows("x" * 10, 10) == (0, 10)  # Fills the row; the wrap is deferred
+    assert _rows("x" * 11, 10) == (1, 1)
+    assert _rows("x" * 10 + "\n", 10) == (1, 0)
+    assert _rows("x" * 25 + "\nab\n", 10) == (4, 0)
+    assert _rows("你好你", 5) == (1, 2)  # Wide characters don't split across rows
+    assert _rows("é" * 10, 10) == (0, 10)  # Combining accents take no cells
+    assert char_width("\t") == 0
+
+
+def test_clear_erases_exactly_what_was_drawn():
+    """Test that the clear moves up over every drawn row, wrapped ones included."""
+    terminal = _Terminal()
+    renderer = StreamRenderer(terminal, width=10)
+    for chunk in ["for f in *; do", "\n  echo $f", "\ndone"]:
+        renderer.write(chunk)
+    renderer.clear()
+    # "for f in *; do" wraps once, then two newlines
+    assert terminal.getvalue().endswith("\033[3A\r\033[J")
+
+    terminal = _Terminal()
+    renderer = StreamRenderer(terminal, width=10)
+    renderer.write("ls")
+    renderer.clear()
+    assert terminal.getvalue() == "ls\r\033[J"
+
+
+def test_plain_output_when_not_a_terminal():
+    """Test that a redirected stream gets the text and a newline, without escape sequences."""
+    stream = io.StringIO()
+    renderer = StreamRenderer(stream, clock=_Clock())
+    renderer.write("ls")
+    renderer.write(" -la")
+    renderer.clear()
+    assert stream.getvalue() == "ls -la\n"
@@ -0,0 +1,56 @@
+"""Tests for the cached settings store."""
+import sys
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import autocmd_cli as autocmd
+from autocmd_cli import settings
+
+
+def test_settings_parsed_once_until_file_changes(tmp_path):
+    """Test that the file is only re-parsed after it changes on disk."""
+    path = tmp_path / "settings"
+    path.write_text("provider=groq\nstreaming = false\n")
+    with patch.object(settings, "parse", wraps=settings.parse) as parse:
+        assert settings.load(path)["provider"] == "groq"
+        assert settings.load(path)["streaming"] == "false"
+        assert parse.call_count == 1
+
+        # Another terminal rewrites the file
+        settings.update(path, {"provider": "anthropic"})
+        assert settings.load(path)["provider"] == "anthropic"
+        assert settings.load(path)["streaming"] == "false"
+
+
+def test_update_removes_keys_and_writes_atomically(tmp_path):
+    """Test that None removes a key and no temporary files are left behind."""
+    path = tmp_path / "settings"
+    settings.update(path, {"a": "1", "b": "2"})
+    settings.update(path, {"a": None})
+    assert path.read_text() == "b=2"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["settings", "settings.lock"]
+
+
+def test_concurrent_updates_are_not_lost(tmp_path):
+    """Test that concurrent writers each keep their own key."""
+    path = tmp_path / "settings"
+    threads = [
+        threading.Thread(target=settings.update, args=(path, {f"key{i}": str(i)}))
+        for i in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert settings.load(path) == {f"key{i}": str(i) for i in range(20)}
+
+
+def test_get_and_set_setting(tmp_path):
+    """Test the CLI helpers on top of the store."""
+    with patch.object(autocmd, "get_config_dir", return_value=tmp_path):
+        assert autocmd.get_setting("model", "default") == "default"
+        autocmd.set_setting("model", "fast")
+        assert autocmd.get_setting("model") == "fast"
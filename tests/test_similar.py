@@ -0,0 +1,91 @@
+"""Tests for near-duplicate prompt reuse."""
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import autocmd_cli as autocmd
+from autocmd_cli.similar import SimilarityIndex, features, jaccard
+
+
+def test_paraphrases_share_features():
+    """Test that paraphrases reduce to the same canonical words."""
+    a, _ = features("find big files here")
+    b, _ = features("list largest files in this dir")
+    assert jaccard(a, b) == 1.0
+    assert jaccard(features("delete big files")[0], features("list big files")[0]) < 0.8
+
+
+def test_lookup_finds_paraphrase(tmp_path):
+    """Test that a paraphrase of an indexed prompt returns its command."""
+    index = SimilarityIndex(tmp_path / "similar.db")
+    assert index.lookup("find big files here", "/bin/zsh") is None
+    index.add("find big files here", "/bin/zsh", "du -ah . | sort -rh | head")
+    index.add("show git status", "/bin/zsh", "git status")
+
+    command, prompt, score = index.lookup("list the largest files in this directory", "/bin/zsh")
+    assert command == "du -ah . | sort -rh | head"
+    assert prompt == "find big files here"
+    assert score == 1.0
+    assert index.lookup("list the largest files in this directory", "/bin/bash") is None
+    assert index.lookup("undo my last commit", "/bin/zsh") is None
+
+
+def test_literals_must_match(tmp_path):
+    """Test that numbers and paths are never swapped for a different value."""
+    index = SimilarityIndex(tmp_path / "similar.db")
+    index.add("kill the process on port 3000", "bash", "kill $(lsof -t -i:3000)")
+    assert index.lookup("kill process on port 3000", "bash")[0] == "kill $(lsof -t -i:3000)"
+    assert index.lookup("kill process on port 8080", "bash") is None
+
+
+def test_direction_must_match(tmp_path):
+    """Test that swapping the source and destination of a move never reuses its command."""
+    index = SimilarityIndex(tmp_path / "similar.db")
+    index.add("move everything from project into backup", "bash", "mv project/* backup/")
+    assert index.lookup("move everything from project to backup", "bash")[0] == "mv project/* backup/"
+    assert index.lookup("move everything from backup into project", "bash") is None
+    assert index.lookup("move everything into backup from project", "bash")[0] == "mv project/* backup/"
+    index.add("delete logs older than a week except today", "bash", "find . -name '*.log' -mtime +7 -delete")
+    assert index.lookup("delete logs older than a week", "bash") is None
+
+
+def test_other_scopes_do_not_crowd_out_this_one(tmp_path):
+    """Test that the same prompt indexed in many other directories still finds the one for this directory."""
+    index = SimilarityIndex(tmp_path / "similar.db")
+    index.add("find big files here", "bash:/home/me/project", "du -ah . | sort -rh")
+    for i in range(40):
+        index.add("find big files here", f"bash:/srv/other{i}", "du -ah /srv | sort -rh")
+    assert index.lookup("list largest files in this dir", "bash:/home/me/project")[0] == "du -ah . | sort -rh"
+
+
+def test_daemon_handler_names_similar_prompt(tmp_path):
+    """Test that the daemon tells the client when it reuses a command from a similar prompt."""
+    SimilarityIndex(tmp_path / "similar.db").add("find big files here", "/bin/zsh", "du -ah . | sort -rh")
+    sent = []
+    env = {"AUTOCMD_PROVIDER": "anthropic", "ANTHROPIC_API_KEY": "x"}
+    with patch.dict(os.environ, env), patch.object(autocmd, "get_config_dir", return_value=tmp_path):
+        handle, close = autocmd.create_request_handler()
+        handle({"prompt": "list largest files in this dir", "shell": "/bin/zsh"}, sent.append, None)
+        close()
+    assert sent == [{"command": "du -ah . | sort -rh", "similar_to": "find big files here"}]
+
+
+def test_main_reuses_similar_command(tmp_path, capsys):
+    """Test that main answers a paraphrase from the index without a provider."""
+    SimilarityIndex(tmp_path / "similar.db").add("find big files here", "/bin/zsh", "du -ah . | sort -rh")
+
+    env = {"SHELL": "/bin/zsh", "AUTOCMD_PROVIDER": "anthropic", "ANTHROPIC_API_KEY": "x"}
+    with patch.dict(os.environ, env), \
+            patch.object(autocmd, "get_config_dir", return_value=tmp_path), \
+            patch.object(autocmd, "is_shell_setup", return_value=True), \
+            patch.object(autocmd, "get_provider") as get_provider, \
+            patch.object(sys, "argv", ["autocmd", "list largest files in this dir"]):
+        autocmd.main()
+
+    get_provider.assert_not_called()
+    captured = capsys.readouterr()
+    assert captured.out == "du -ah . | sort -rh\n"
+    assert '"find big files here" (similar)' in captured.err
@@ -0,0 +1,163 @@
+"""Tests for provider latency stats and 'auto' provider selection."""
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import autocmd_cli as autocmd
+from autocmd_cli.stats import MIN_BACKOFF, MIN_SAMPLES, StatsStore, histogram_percentile, served_counts
+
+
+def test_percentile_needs_enough_samples(tmp_path):
+    """Test that percentiles come from the histogram once there are enough samples."""
+    stats = StatsStore(tmp_path / "stats.json")
+    stats.record_success("groq", "m", ttft=0.08, total=0.3)
+    assert stats.percentile("groq", "m", 0.95) is None
+
+    for _ in range(MIN_SAMPLES - 2):
+        stats.record_success("groq", "m", ttft=0.08, total=0.3)
+    stats.record_success("groq", "m", ttft=1.2, total=1.5)
+    assert stats.percentile("groq", "m", 0.5) == 0.1
+    assert stats.percentile("groq", "m", 1.0) == 1.5
+
+
+def test_rate_limit_backs_off_exponentially(tmp_path):
+    """Test that repeated rate limits double the backoff."""
+    stats = StatsStore(tmp_path / "stats.json")
+    stats.record_error("groq", "m", rate_limited=True)
+    stats.record_error("groq", "m", rate_limited=True)
+    entry = stats.load()["groq/m"]
+    assert entry["backoff"] == MIN_BACKOFF * 2
+    assert entry["rate_limited_until"] > time.time() + MIN_BACKOFF
+
+    stats.record_error("groq", "m", rate_limited=True, retry_after=5)
+    assert stats.load()["groq/m"]["backoff"] == 5
+
+
+def test_choose_prefers_untried_then_fastest(tmp_path):
+    """Test that choose measures new providers first, then picks the fastest healthy one."""
+    stats = StatsStore(tmp_path / "stats.json")
+    candidates = [("anthropic", "a"), ("groq", "g"), ("openai", "o")]
+    stats.record_success("anthropic", "a", ttft=0.5, total=1.0)
+    stats.record_success("groq", "g", ttft=0.1, total=0.4)
+    assert stats.choose(candidates) == 2
+
+    stats.record_success("openai", "o", ttft=0.3, total=0.6)
+    assert stats.choose(candidates) == 1
+
+    stats.record_error("groq", "g", rate_limited=True)
+    assert stats.choose(candidates) == 2
+
+
+def test_choose_skips_candidate_with_only_errors(tmp_path):
+    """Test that a provider that has only failed loses to a healthy one, rate limited or not."""
+    stats = StatsStore(tmp_path / "stats.json")
+    candidates = [("anthropic", "a"), ("groq", "g")]
+    stats.record_success("groq", "g", ttft=0.4, total=0.8)
+    stats.record_error("anthropic", "a")
+    assert stats.choose(candidates) == 1
+
+    for _ in range(5):
+        stats.record_error("anthropic", "a", rate_limited=True)
+    assert stats.choose(candidates) == 1
+
+
+def test_create_auto_provider_uses_stats(tmp_path):
+    """Test that the 'auto' provider builds the candidate chosen from stats."""
+    StatsStore(tmp_path / "stats.json").record_success("groq", "g", ttft=0.9, total=1.0)
+    StatsStore(tmp_path / "stats.json").record_success("anthropic", "a", ttft=0.2, total=0.5)
+
+    env = {"AUTOCMD_AUTO_PROVIDERS": "groq:g,anthropic:a", "GROQ_API_KEY": "x", "ANTHROPIC_API_KEY": "y"}
+    with patch.dict(os.environ, env), patch.object(autocmd, "get_config_dir", return_value=tmp_path):
+        provider = autocmd.create_provider("auto")
+
+    assert isinstance(provider, autocmd.registry.load_class("anthropic"))
+    assert provider.model == "a"
+    assert autocmd.provider_label(provider) == ("anthropic", "a")
+
+
+def test_totals_and_prometheus_textfile(tmp_path):
+    """Test that tokens, latencies and hit sources are totalled and exported for node_exporter."""
+    textfile = tmp_path / "metrics" / "autocmd.prom"
+    stats = StatsStore(tmp_path / "stats.json", textfile)
+    # An entry written before latency totals and token counts were kept
+    (tmp_path / "stats.json").write_text(json.dumps({"groq/m": {
+        "requests": 1, "errors": 0, "ttft_ms": 90.0, "total_ms": 200.0, "error_rate": 0.0,
+        "ttft_hist": [0, 1] + [0] * 13, "backoff": 0.0, "rate_limited_until": 0.0,
+    }}))
+    stats.record_success("groq", "m", ttft=0.08, total=0.25, usage={"input_tokens": 400, "output_tokens": 9})
+    stats.record_success("groq", "m", ttft=0.12, total=0.5, usage={"input_tokens": 410, "output_tokens": 11})
+    stats.record_error("groq", "m")
+    stats.record_served("cache")
+    stats.record_served("cache")
+    stats.record_local("disk usage")
+    stats.record_local(None)
+
+    assert served_counts(stats.load()) == {"local": 1, "cache": 2, "similar": 0, "prefetch": 0, "provider": 3}
+    entry = stats.load()["groq/m"]
+    assert (entry["input_tokens"], entry["output_tokens"]) == (810, 20)
+    assert histogram_percentile(entry["total_hist"], 0.5) == 300
+    assert histogram_percentile(entry["total_hist"], 0.99) == 600
+
+    text = textfile.read_text()
+    assert textfile.stat().st_mode & 0o777 == 0o644
+    assert 'autocmd_provider_requests_total{provider="groq",model="m"} 4' in text
+    assert 'autocmd_provider_errors_total{provider="groq",model="m"} 1' in text
+    assert 'autocmd_input_tokens_total{provider="groq",model="m"} 810' in text
+    assert 'autocmd_ttft_seconds_bucket{provider="groq",model="m",le="0.1"} 2' in text
+    assert 'autocmd_ttft_seconds_bucket{provider="groq",model="m",le="+Inf"} 3' in text
+    assert 'autocmd_latency_seconds_sum{provider="groq",model="m"} 0.750000' in text
+    assert 'autocmd_latency_seconds_count{provider="groq",model="m"} 2' in text
+    assert 'autocmd_served_total{source="cache"} 2' in text
+    assert "# TYPE autocmd_ttft_seconds histogram" in text
+
+
+def test_main_counts_cache_hits_and_shows_stats(tmp_path, capsys):
+    """Test that --stats reports hit rates, tokens and percentiles recorded by earlier requests."""
+    StatsStore(tmp_path / "stats.json").record_success(
+        "anthropic", "claude-haiku-4-5-20251001", ttft=0.18, total=0.35, usage={"input_tokens": 500, "output_tokens": 12}
+    )
+    env = {"SHELL": "/bin/zsh", "AUTOCMD_PROVIDER": "anthropic", "ANTHROPIC_API_KEY": "x"}
+    with patch.dict(os.environ, env), \
+            patch.object(autocmd, "get_config_dir", return_value=tmp_path), \
+            patch.object(autocmd, "is_shell_setup", return_value=True), \
+            patch.object(autocmd, "lookup_cache", return_value=("key", "ls -la")):
+        with patch.object(sys, "argv", ["autocmd", "list files in detail"]):
+            autocmd.main()
+        with patch.object(sys, "argv", ["autocmd", "--stats"]):
+            try:
+                autocmd.main()
+            except SystemExit as e:
+                assert e.code == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "ls -la"
+    assert lines[1] == "Requests answered: 2 (local 0%, cache 50%, similar 0%, prefetch 0%, provider 50%)"
+    row = next(line for line in lines if line.startswith("anthropic/"))
+    assert row.split()[1:5] == ["1", "0", "500", "12"]
+    assert "200ms/200ms/200ms" in row and "400ms/400ms/400ms" in row
+
+
+def test_latency_excludes_client_setup(tmp_path, capsys):
+    """Test that importing the SDK and building the client is not counted as the provider's latency."""
+    env = {"SHELL": "/bin/zsh", "AUTOCMD_PROVIDER": "anthropic", "ANTHROPIC_API_KEY": "x"}
+    with patch.dict(os.environ, env), \
+            patch.object(autocmd, "get_config_dir", return_value=tmp_path), \
+            patch.object(autocmd, "is_shell_setup", return_value=True), \
+            patch.object(autocmd, "get_provider") as get_provider, \
+            patch.object(autocmd, "provider_label", return_value=("anthropic", "claude-haiku-4-5-20251001")):
+        provider = get_provider.return_value
+        provider.prepare.side_effect = lambda: time.sleep(0.3)
+        provider.generate_stream.return_value = iter(["ls -la"])
+        with patch.object(sys, "argv", ["autocmd", "list files in detail"]):
+            autocmd.main()
+
+    assert capsys.readouterr().out == "ls -la\n"
+    provider.prepare.assert_called_once()
+    entry = StatsStore(tmp_path / "stats.json").load()["anthropic/claude-haiku-4-5-20251001"]
+    assert entry["requests"] == 1
+    assert entry["total_sum_ms"] < 300
@@ -0,0 +1,140 @@
+"""Tests for the stdio JSON-RPC server."""
+import io
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from autocmd_cli import stdio
+
+
+class _Pipe(io.RawIOBase):
+    """A blocking byte pipe: the test writes requests, the server reads lines."""
+
+    def __init__(self):
+        self.r, self.w = os.pipe()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = os.read(self.r, len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def send(self, message):
+        os.write(self.w, (json.dumps(message) + "\n").encode())
+
+    def close_writer(self):
+        os.close(self.w)
+
+
+def _run(handler):
+    pipe, out = _Pipe(), io.BytesIO()
+    server = threading.Thread(target=stdio.serve, args=(io.BufferedReader(pipe), out, handler), daemon=True)
+    server.start()
+    return pipe, out, server
+
+
+def _messages(out):
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_concurrent_requests_stream_and_complete():
+    """Test that requests run concurrently, stream tokens by id and report timing."""
+    release = threading.Event()
+
+    def handler(request, send, cancelled):
+        if request["prompt"] == "slow":
+            release.wait(5)
+        for token in ["ls ", request["prompt"]]:
+            send({"token": token})
+        send({"command": "ls " + request["prompt"]})
+
+    pipe, out, server = _run(handler)
+    pipe.send({"jsonrpc": "2.0", "id": 1, "method": "generate", "params": {"prompt": "slow"}})
+    pipe.send({"jsonrpc": "2.0", "id": "b", "method": "generate", "params": {"prompt": "-la"}})
+    for _ in range(500):
+        if any(m.get("id") == "b" for m in _messages(out)):
+            break
+        time.sleep(0.01)
+    release.set()
+    pipe.send({"jsonrpc": "2.0", "id": 9, "method": "shutdown"})
+    server.join(5)
+    assert not server.is_alive()
+
+    messages = _messages(out)
+    results = [m for m in messages if "result" in m]
+    # The fast request finished while the slow one was still waiting
+    assert [m["id"] for m in results] == ["b", 1, 9]
+    assert results[0]["result"]["command"] == "ls -la"
+    assert set(results[0]["result"]["timing"]) == {"queued_ms", "first_token_ms", "total_ms"}
+    tokens = [m["params"]["text"] for m in messages if m.get("method") == "token" and m["params"]["id"] == 1]
+    assert tokens == ["ls ", "slow"]
+    assert all(m["jsonrpc"] == "2.0" for m in messages)
+
+
+def test_cancel_by_id():
+    """Test that a cancel notification stops the matching request only."""
+    started = threading.Event()
+
+    def handler(request, send, cancelled):
+        send({"token": "find"})
+        started.set()
+        cancelled.wait(5)
+        if not cancelled.is_set():
+            send({"command": "find ."})
+
+    pipe, out, server = _run(handler)
+    pipe.send({"jsonrpc": "2.0", "id": 7, "method": "generate", "params": {"prompt": "search"}})
+    started.wait(5)
+    pipe.send({"jsonrpc": "2.0", "method": "cancel", "params": {"id": 7}})
+    pipe.close_writer()
+    server.join(5)
+
+    final = _messages(out)[-1]
+    assert final["id"] == 7
+    assert final["error"]["code"] == stdio.REQUEST_CANCELLED
+
+
+def test_protocol_errors():
+    """Test the JSON-RPC errors for bad input, unknown methods and failing requests."""
+    def handler(request, send, cancelled):
+        raise RuntimeError("API key not found")
+
+    pipe, out, server = _run(handler)
+    os.write(pipe.w, b"{not json\n")
+    pipe.send({"jsonrpc": "2.0", "id": 1, "method": "explain", "params": {}})
+    pipe.send({"jsonrpc": "2.0", "id": 2, "method": "generate", "params": {}})
+    pipe.send({"jsonrpc": "2.0", "id": 3, "method": "generate", "params": {"prompt": "x"}})
+    pipe.close_writer()
+    server.join(5)
+
+    errors = {m["id"]: m["error"] for m in _messages(out)}
+    assert errors[None]["code"] == stdio.PARSE_ERROR
+    assert errors[1]["code"] == stdio.METHOD_NOT_FOUND
+    assert errors[2]["code"] == stdio.INVALID_PARAMS
+    assert errors[3] == {"code": stdio.SERVER_ERROR, "message": "API key not found"}
+
+
+def test_invalid_ids_are_rejected():
+    """Test that object, array and boolean ids are answered with an error instead of stopping the server."""
+    pipe, out, server = _run(lambda request, send, cancelled: send({"command": "ls"}))
+    pipe.send({"jsonrpc": "2.0", "method": "cancel", "params": {"id": {"a": 1}}})
+    pipe.send({"jsonrpc": "2.0", "method": "$/cancelRequest", "params": {"id": [1]}})
+    pipe.send({"jsonrpc": "2.0", "id": {"a": 1}, "method": "generate", "params": {"prompt": "x"}})
+    pipe.send({"jsonrpc": "2.0", "id": [2], "method": "generate", "params": {"prompt": "x"}})
+    pipe.send({"jsonrpc": "2.0", "id": True, "method": "generate", "params": {"prompt": "x"}})
+    pipe.send({"jsonrpc": "2.0", "id": "ok", "method": "generate", "params": {"prompt": "x"}})
+    pipe.close_writer()
+    server.join(5)
+    assert not server.is_alive()
+
+    messages = _messages(out)
+    errors = [m for m in messages if "error" in m]
+    assert [(m["id"], m["error"]["code"]) for m in errors] == [(None, stdio.INVALID_REQUEST)] * 3
+    assert [m["id"] for m in messages if "result" in m] == ["ok"]
@@ -0,0 +1,79 @@
+"""Tests for phase-level timing."""
+import json
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import autocmd_cli as autocmd
+from autocmd_cli import trace
+
+
+def test_marks_are_ignored_while_disabled():
+    """Test that marks cost nothing and record nothing until tracing is enabled."""
+    trace.reset()
+    trace.mark("dotenv")
+    trace.count("settings reads")
+    assert trace.phases() == []
+
+
+def test_jsonl_report(tmp_path):
+    """Test that AUTOCMD_TRACE=<path> appends one JSON line per run."""
+    log = tmp_path / "trace.jsonl"
+    trace.reset()
+    try:
+        with patch.dict(os.environ, {"AUTOCMD_TRACE": str(log)}):
+            trace.configure()
+        trace.mark("dotenv")
+        trace.mark("provider")
+        trace.count("settings reads")
+        trace.count("settings reads")
+        trace.annotate(provider="groq")
+        trace.report()
+    finally:
+        trace.reset()
+
+    record = json.loads(log.read_text())
+    names = [name for name, _ in record["phases"]]
+    assert names[-2:] == ["dotenv", "provider"]
+    assert record["counts"] == {"settings reads": 2}
+    assert record["provider"] == "groq"
+    assert record["total_ms"] >= sum(ms for _, ms in record["phases"]) - 0.1
+
+
+def test_timings_flag_prints_breakdown(tmp_path, capsys):
+    """Test that --timings prints the phases of a run to stderr."""
+    class FakeProvider(autocmd.LLMProvider):
+        def default_model(self):
+            return "fake"
+
+        @classmethod
+        def env_var_name(cls):
+            return "FAKE_API_KEY"
+
+        def generate(self, prompt, max_tokens=200, system=None):
+            return "ls"
+
+        def generate_stream(self, prompt, max_tokens=200, system=None):
+            yield "ls\n"
+
+    env = {"SHELL": "/bin/zsh", "AUTOCMD_PROVIDER": "anthropic"}
+    trace.reset()
+    try:
+        with patch.dict(os.environ, env), \
+                patch.object(autocmd, "get_config_dir", return_value=tmp_path), \
+                patch.object(autocmd, "is_shell_setup", return_value=True), \
+                patch.object(autocmd, "create_provider", return_value=FakeProvider("x")), \
+                patch.object(sys, "argv", ["autocmd", "--timings --no-cache list files"]):
+            os.environ.pop("AUTOCMD_TRACE", None)
+            autocmd.main()
+            trace.report()
+    finally:
+        trace.reset()
+
+    captured = capsys.readouterr()
+    assert captured.out == "ls\n"
+    for phase in ("imports", "dotenv", "provider", "first_token", "stream", "total"):
+        assert phase in captured.err
@@ -0,0 +1,294 @@
+"""Tests for the standard-library HTTP transport."""
+import json
+import socket
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import quote
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import autocmd_cli as autocmd
+from autocmd_cli.llm_providers import (
+    AnthropicProvider, GroqProvider, LocalProvider, get_provider, is_connection_error, is_rate_limit_error,
+    retry_after,
+)
+from autocmd_cli.transport import TransportConnectionError, TransportError
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+    connections = 0
+
+    def log_message(self, *args):
+        pass
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return "local"
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["content-length"])))
+        type(self).requests.append((self.path, dict(self.headers), body))
+        if body["model"] == "throttled":
+            data = json.dumps({"error": {"message": "slow down"}}).encode()
+            self.send_response(429)
+            self.send_header("retry-after", "7")
+            self.send_header("content-length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        words = ["ls", " -la"]
+        if not body.get("stream"):
+            if self.path.endswith("/messages"):
+                payload = {"content": [{"type": "text", "text": "".join(words)}],
+                           "usage": {"input_tokens": 12, "cache_read_input_tokens": 30, "output_tokens": 2}}
+            else:
+                payload = {"choices": [{"message": {"content": "".join(words)}}],
+                           "usage": {"prompt_tokens": 42, "completion_tokens": 2}}
+            data = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("content-length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("transfer-encoding", "chunked")
+        self.end_headers()
+        if self.path.endswith("/messages"):
+            usage = {"input_tokens": 12, "cache_read_input_tokens": 30, "output_tokens": 1}
+            events = [("message_start", {"type": "message_start", "message": {"usage": usage}})]
+            events += [("content_block_delta", {"type": "content_block_delta", "delta": {"type": "text_delta", "text": w}}) for w in words]
+            events += [("message_delta", {"type": "message_delta", "usage": {"output_tokens": 2}})]
+            events += [("message_stop", {"type": "message_stop"})]
+            chunks = [f"event: {e}\ndata: {json.dumps(d)}\n\n" for e, d in events]
+        else:
+            chunks = [f"data: {json.dumps({'choices': [{'delta': {'content': w}}]})}\n\n" for w in words]
+            if body.get("stream_options", {}).get("include_usage"):
+                usage = {"choices": [], "usage": {"prompt_tokens": 42, "completion_tokens": 2}}
+                chunks.append(f"data: {json.dumps(usage)}\n\n")
+            chunks.append("data: [DONE]\n\n")
+        for chunk in chunks:
+            data = chunk.encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def _serve():
+    _Handler.requests = []
+    _Handler.connections = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_anthropic_over_http_transport():
+    """Test Anthropic generate and streaming through the stdlib transport."""
+    server, url = _serve()
+    provider = AnthropicProvider("sk-test", base_url=url)
+    provider.transport = "http"
+    try:
+        usage = {}
+        assert provider.generate("list files", usage=usage) == "ls -la"
+        assert usage == {"input_tokens": 42, "output_tokens": 2}
+        usage = {}
+        assert list(provider.generate_stream("list files", usage=usage)) == ["ls", " -la"]
+        assert usage == {"input_tokens": 42, "output_tokens": 2}
+        path, headers, body = _Handler.requests[-1]
+        assert path == "/v1/messages"
+        assert headers["x-api-key"] == "sk-test"
+        assert body["messages"] == [{"role": "user", "content": "list files"}]
+        # The finished stream handed its connection back for reuse
+        assert len(provider.client._idle) == 1
+    finally:
+        provider.close()
+        server.shutdown()
+
+
+def test_interleaved_streams_keep_their_own_usage():
+    """Test that two requests in flight on one provider each get the counts for their own response."""
+    server, url = _serve()
+    provider = AnthropicProvider("sk-test", base_url=url)
+    provider.transport = "http"
+    try:
+        first_usage, second_usage = {}, {}
+        first = provider.generate_stream("list files", usage=first_usage)
+        assert next(first) == "ls"
+        assert list(provider.generate_stream("list files", usage=second_usage)) == ["ls", " -la"]
+        assert first_usage == {}
+        assert list(first) == [" -la"]
+        assert first_usage == second_usage == {"input_tokens": 42, "output_tokens": 2}
+    finally:
+        provider.close()
+        server.shutdown()
+
+
+def test_openai_compatible_over_http_transport():
+    """Test OpenAI-compatible streaming through the stdlib transport."""
+    server, url = _serve()
+    provider = GroqProvider("gsk-test")
+    provider.transport = "http"
+    provider.base_url = url + "/openai/v1"
+    try:
+        usage = {}
+        assert list(provider.generate_stream("list files", usage=usage)) == ["ls", " -la"]
+        assert usage == {"input_tokens": 42, "output_tokens": 2}
+        usage = {}
+        assert provider.generate("list files", usage=usage) == "ls -la"
+        assert usage == {"input_tokens": 42, "output_tokens": 2}
+        # Stopped before the final usage chunk: the counts are estimated from the text
+        usage = {}
+        stream = provider.generate_stream("list files", system="You write shell commands.", usage=usage)
+        assert next(stream) == "ls"
+        stream.close()
+        assert usage == {"input_tokens": 9, "output_tokens": 1}
+        path, headers, _ = _Handler.requests[-1]
+        assert path == "/openai/v1/chat/completions"
+        assert headers["authorization"] == "Bearer gsk-test"
+    finally:
+        provider.close()
+        server.shutdown()
+
+
+def test_http_errors_are_classified():
+    """Test that HTTP 429 surfaces as a rate limit with its Retry-After hint."""
+    server, url = _serve()
+    provider = GroqProvider("gsk-test", model="throttled")
+    provider.transport = "http"
+    provider.base_url = url
+    try:
+        list(provider.generate_stream("x"))
+        assert False, "expected TransportError"
+    except TransportError as e:
+        assert e.status_code == 429
+        assert is_rate_limit_error(e)
+        assert retry_after(e) == 7.0
+    finally:
+        provider.close()
+        server.shutdown()
+
+
+def _closed_port() -> int:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_unreachable_server_is_a_connection_error(tmp_path, capsys, monkeypatch):
+    """Test that a refused connection is a transport error that main reports as a network failure."""
+    url = f"http://127.0.0.1:{_closed_port()}"
+    provider = AnthropicProvider("sk-test")
+    provider.transport = "http"
+    provider.base_url = url
+    try:
+        list(provider.generate_stream("x"))
+        assert False, "expected TransportConnectionError"
+    except TransportConnectionError as e:
+        assert e.status_code is None
+        assert is_connection_error(e) and not is_rate_limit_error(e)
+    finally:
+        provider.close()
+
+    monkeypatch.setenv("AUTOCMD_PROVIDER", "anthropic")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "sk-test")
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", url)
+    monkeypatch.setenv("AUTOCMD_TRANSPORT", "http")
+    monkeypatch.setattr(autocmd, "get_config_dir", lambda: tmp_path)
+    monkeypatch.setattr(autocmd, "is_shell_setup", lambda: True)
+    monkeypatch.setattr(sys, "argv", ["autocmd", "--no-cache", "list files"])
+    try:
+        autocmd.main()
+        assert False, "expected SystemExit"
+    except SystemExit as e:
+        assert e.code == 1
+    assert "Network connection failed" in capsys.readouterr().err
+
+
+def test_system_prompt_sent_as_cacheable_prefix():
+    """Test that the fixed instructions go ahead of the request, marked for caching."""
+    server, url = _serve()
+    anthropic = AnthropicProvider("sk-test", base_url=url)
+    groq = GroqProvider("gsk-test")
+    anthropic.transport = groq.transport = "http"
+    groq.base_url = url + "/openai/v1"
+    try:
+        anthropic.generate("Request: list files", system="You are a shell assistant.")
+        body = _Handler.requests[-1][2]
+        assert body["system"] == [
+            {"type": "text", "text": "You are a shell assistant.", "cache_control": {"type": "ephemeral"}}
+        ]
+        assert body["messages"] == [{"role": "user", "content": "Request: list files"}]
+
+        list(groq.generate_stream("Request: list files", system="You are a shell assistant."))
+        body = _Handler.requests[-1][2]
+        assert body["messages"] == [
+            {"role": "system", "content": "You are a shell assistant."},
+            {"role": "user", "content": "Request: list files"},
+        ]
+    finally:
+        anthropic.close()
+        groq.close()
+        server.shutdown()
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def test_local_provider_over_unix_socket(tmp_path):
+    """Test that the local provider reuses one Unix socket connection and sends local limits."""
+    _Handler.requests = []
+    _Handler.connections = 0
+    socket_path = str(tmp_path / "llama.sock")
+    server = _UnixServer(socket_path, _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    provider = LocalProvider(base_url=f"http+unix://{quote(socket_path, safe='')}/v1")
+    provider.transport = "sdk"  # Ignored: local servers are always reached over the stdlib transport
+    try:
+        for _ in range(3):
+            assert "".join(provider.generate_stream("Request: list files", max_tokens=200)) == "ls -la"
+        assert _Handler.connections == 1
+        path, headers, body = _Handler.requests[-1]
+        assert path == "/v1/chat/completions"
+        assert headers["authorization"] == "Bearer local"
+        assert body["max_tokens"] == 96
+        assert body["cache_prompt"] is True
+        assert body["options"] == {"num_ctx": 2048, "num_predict": 96}
+    finally:
+        provider.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_local_provider_keeps_model_warm(monkeypatch):
+    """Test that an idle local provider pings the server until it is closed."""
+    monkeypatch.delenv("AUTOCMD_LOCAL_API_KEY", raising=False)
+    server, url = _serve()
+    monkeypatch.setenv("AUTOCMD_LOCAL_BASE_URL", url + "/v1")
+    provider = get_provider("local", transport="sdk")
+    assert provider.transport == "http"
+    try:
+        provider.keep_warm(0.05)
+        time.sleep(0.3)
+        pings = [body for _, _, body in _Handler.requests if body["max_tokens"] == 1]
+        assert len(pings) >= 2
+        assert _Handler.connections == 1
+    finally:
+        provider.close()
+    count = len(_Handler.requests)
+    time.sleep(0.15)
+    assert len(_Handler.requests) == count
+    server.shutdown()